@@ -0,0 +1,358 @@
+'''Headless benchmarks for the imaging and counting hot paths.
+
+Runs under the offscreen Qt platform on synthetic 12/24/60 MP frames.
+Every case runs in its own process, so its peak memory is its own.
+
+    python benchmarks/hotpaths.py                         # run everything
+    python benchmarks/hotpaths.py --sizes 24 --cases splitImage writeImage
+    python benchmarks/hotpaths.py --output results.json
+    python benchmarks/hotpaths.py --save-baseline         # refresh the stored baseline
+
+Results are compared against benchmarks/baseline.json, when it exists, and the
+exit code is 1 if any case is slower or uses more memory than the baseline
+allows (see --tolerance).
+'''
+
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / 'src' / 'main' / 'python'))
+
+DEFAULT_BASELINE = HERE / 'baseline.json'
+
+SPECIES = ['Eland', 'Gemsbok', 'Giraffe', 'Kudu', 'Oryx', 'Springbok', 'Warthog', 'Zebra']
+
+
+def peakMemory():
+    '''Peak resident memory of this process, in bytes'''
+    try:
+        import resource
+    except ImportError:
+        return _windowsPeakMemory()
+
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on linux, bytes on mac
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def _windowsPeakMemory():
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ('cb', wintypes.DWORD),
+            ('PageFaultCount', wintypes.DWORD),
+            ('PeakWorkingSetSize', ctypes.c_size_t),
+            ('WorkingSetSize', ctypes.c_size_t),
+            ('QuotaPeakPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaPeakNonPagedPoolUsage', ctypes.c_size_t),
+            ('QuotaNonPagedPoolUsage', ctypes.c_size_t),
+            ('PagefileUsage', ctypes.c_size_t),
+            ('PeakPagefileUsage', ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    handle = ctypes.windll.kernel32.GetCurrentProcess()
+    ctypes.windll.psapi.GetProcessMemoryInfo(handle, ctypes.byref(counters), counters.cb)
+    return counters.PeakWorkingSetSize
+
+
+def timeIt(fn, repeat, setup=None):
+    times = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    return times
+
+
+def makeCounts(files, speciesPerFile):
+    from QGameCountTracker import MultiGameCountTracker
+
+    counts = MultiGameCountTracker()
+    for n in range(files):
+        for species in SPECIES[:speciesPerFile]:
+            counts.add(f'DSC{n:05d}.JPG', species, n % 7 + 1, n % 3)
+    return counts
+
+
+# ---------------------------------------------------------------- cases
+# each case takes the run environment and returns a list of timings
+
+def benchSplitImage(env):
+    from QImageGrid import QImageGrid
+    grid = QImageGrid(env.imagePath)
+    return timeIt(grid._splitImage, env.repeat)
+
+
+def benchWriteImage(env):
+    from ImageEncoder import imageEncoder
+    from QImageGrid import QImageGrid
+    grid = QImageGrid(env.imagePath)
+
+    # writeImage only queues the encode, so time it until the file is written
+    def writeImage():
+        grid.writeImage()
+        imageEncoder.waitForDone()
+
+    return timeIt(writeImage, env.repeat)
+
+
+def benchFlattenImage(env):
+    from PyQt5.QtCore import QRectF
+    from PyQt5.QtGui import QImage, QPen
+    from QImagePainter import QImagePainter
+
+    painter = QImagePainter()
+    image = QImage(str(env.imagePath))
+    width, height = image.width(), image.height()
+
+    def setup():
+        painter.setMainImage(image)
+        items = [
+            painter.scene.addEllipse(QRectF(width * x / 10, height * y / 10, 200, 150), QPen())
+            for x in range(1, 10, 3) for y in range(1, 10, 3)
+        ]
+        painter.addDrawnItems(items)
+
+    return timeIt(painter.flattenImage, env.repeat, setup)
+
+
+def benchSetMainPixmap(env):
+    from PyQt5.QtGui import QPixmap
+    from QImagePainter import QImagePainter
+
+    painter = QImagePainter()
+    painter.resize(1600, 1000)
+    pixmap = QPixmap(str(env.imagePath))
+    return timeIt(lambda: painter.setMainPixmap(pixmap), env.repeat)
+
+
+def benchFocusNavigation(env):
+    from QImageGrid import QImageGridViewer
+
+    viewer = QImageGridViewer()
+    viewer.openFiles([env.imagePath] * env.grids)
+
+    grid = viewer.imageGrids.getFocusedGrid()
+    steps = env.grids * grid.rows * grid.cols - 1
+
+    def walk():
+        for _ in range(steps):
+            viewer.moveFocusNext()
+
+    return timeIt(walk, env.repeat, viewer.focusFirstGrid)
+
+
+def benchTrackerTotals(env):
+    counts = makeCounts(env.countFiles, env.speciesPerFile)
+    return timeIt(counts.totals, env.repeat)
+
+
+def benchTrackerSerialize(env):
+    from QGameCountTracker import QGameCountTracker
+    tracker = QGameCountTracker()
+    tracker.counts = makeCounts(env.countFiles, env.speciesPerFile)
+    return timeIt(tracker.serialize, env.repeat)
+
+
+def benchTrackerDump(env):
+    from QGameCountTracker import QGameCountTracker
+    tracker = QGameCountTracker()
+    tracker.counts = makeCounts(env.countFiles, env.speciesPerFile)
+    tracker.JSONDumpFile = env.workDir / 'counts.json'
+    return timeIt(tracker.dump, env.repeat)
+
+
+# name: (function, uses an image)
+CASES = {
+    'splitImage': (benchSplitImage, True),
+    'writeImage': (benchWriteImage, True),
+    'flattenImage': (benchFlattenImage, True),
+    'setMainPixmap': (benchSetMainPixmap, True),
+    'focusNavigation': (benchFocusNavigation, True),
+    'trackerTotals': (benchTrackerTotals, False),
+    'trackerSerialize': (benchTrackerSerialize, False),
+    'trackerDump': (benchTrackerDump, False),
+}
+
+
+def runCase(args):
+    '''Runs a single case in this process and prints its result as JSON'''
+    from PyQt5.QtWidgets import QApplication
+
+    # kept on the function, an unreferenced application is deleted straight away
+    runCase.app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    args.workDir = Path(args.work_dir)
+    args.imagePath = args.workDir / f'synthetic_{args.size}MP.jpg' if args.size else None
+    args.countFiles = args.count_files
+    args.speciesPerFile = args.species_per_file
+
+    fn, _ = CASES[args.run_case]
+
+    setupPeak = peakMemory()
+    times = fn(args)
+    peak = peakMemory()
+
+    print(json.dumps({
+        'case': args.run_case,
+        'megapixels': args.size,
+        'repeat': args.repeat,
+        'times': times,
+        'min': min(times),
+        'median': statistics.median(times),
+        'peakMemory': peak,
+        'memoryDelta': peak - setupPeak,
+    }))
+
+
+def resultKey(case, size):
+    return f'{case}@{size}MP' if size else case
+
+
+def prepareImages(sizes, workDir):
+    from PyQt5.QtGui import QGuiApplication
+    from synthetic import writeSyntheticImage
+
+    prepareImages.app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+    for size in sizes:
+        path = workDir / f'synthetic_{size}MP.jpg'
+        if not path.exists():
+            print(f'generating {path.name}', file=sys.stderr)
+            writeSyntheticImage(path, size, seed=size)
+
+
+def runAll(args):
+    workDir = Path(args.work_dir) if args.work_dir else Path(tempfile.mkdtemp(prefix='gamecounter-bench-'))
+    workDir.mkdir(parents=True, exist_ok=True)
+
+    cases = args.cases or list(CASES)
+    if any(CASES[case][1] for case in cases):
+        prepareImages(args.sizes, workDir)
+
+    results = {}
+    for case in cases:
+        sizes = args.sizes if CASES[case][1] else [None]
+        for size in sizes:
+            cmd = [
+                sys.executable, __file__, '--run-case', case,
+                '--work-dir', str(workDir), '--repeat', str(args.repeat),
+                '--grids', str(args.grids), '--count-files', str(args.count_files),
+                '--species-per-file', str(args.species_per_file),
+            ]
+            if size:
+                cmd += ['--size', str(size)]
+
+            key = resultKey(case, size)
+            print(f'running {key}', file=sys.stderr)
+            proc = subprocess.run(cmd, stdout=subprocess.PIPE, universal_newlines=True)
+            if proc.returncode != 0:
+                results[key] = {'case': case, 'megapixels': size, 'error': proc.returncode}
+            else:
+                results[key] = json.loads(proc.stdout.strip().splitlines()[-1])
+
+    from PyQt5.QtCore import QT_VERSION_STR
+    return {
+        'machine': platform.platform(),
+        'processor': platform.processor(),
+        'python': platform.python_version(),
+        'qt': QT_VERSION_STR,
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'results': results,
+    }
+
+
+def compareToBaseline(report, baseline, tolerance):
+    '''Returns a list of (key, message) for every regression'''
+    regressions = []
+    for key, result in report['results'].items():
+        base = baseline['results'].get(key)
+        if base is None or 'error' in base:
+            continue
+        if 'error' in result:
+            regressions.append((key, f'failed with exit code {result["error"]}'))
+            continue
+        if result['median'] > base['median'] * tolerance:
+            regressions.append((key, f'median {result["median"]:.4f}s vs baseline {base["median"]:.4f}s'))
+        if result['memoryDelta'] > base['memoryDelta'] * tolerance + 8 * 1024**2:
+            regressions.append((key, f'memory {result["memoryDelta"] / 1024**2:.1f}MB vs baseline {base["memoryDelta"] / 1024**2:.1f}MB'))
+    return regressions
+
+
+def summarize(report):
+    s = f'{"case":<28}{"median (ms)":>14}{"min (ms)":>12}{"peak (MB)":>12}{"delta (MB)":>12}\n'
+    for key, r in report['results'].items():
+        if 'error' in r:
+            s += f'{key:<28}{"failed":>14}\n'
+        else:
+            s += (f'{key:<28}{1000 * r["median"]:>14.2f}{1000 * r["min"]:>12.2f}'
+                  f'{r["peakMemory"] / 1024**2:>12.1f}{r["memoryDelta"] / 1024**2:>12.1f}\n')
+    return s
+
+
+def parseArgs(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--cases', nargs='+', choices=list(CASES), help='cases to run (default: all)')
+    parser.add_argument('--sizes', nargs='+', type=int, default=[12, 24, 60], help='image sizes in megapixels')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--grids', type=int, default=5, help='number of grids for focus navigation')
+    parser.add_argument('--count-files', type=int, default=1000, help='files in the synthetic counts')
+    parser.add_argument('--species-per-file', type=int, default=4)
+    parser.add_argument('--work-dir', help='where synthetic images are written (default: a temp dir)')
+    parser.add_argument('--output', help='write the results as JSON to this file')
+    parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='baseline results to compare against')
+    parser.add_argument('--save-baseline', action='store_true', help='store these results as the baseline')
+    parser.add_argument('--tolerance', type=float, default=1.25, help='allowed ratio to the baseline')
+    parser.add_argument('--size', type=int, help=argparse.SUPPRESS)
+    parser.add_argument('--run-case', choices=list(CASES), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parseArgs(argv)
+
+    if args.run_case:
+        runCase(args)
+        return 0
+
+    report = runAll(args)
+    print(summarize(report))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+
+    baselinePath = Path(args.baseline)
+    if args.save_baseline:
+        baselinePath.write_text(json.dumps(report, indent=2))
+        print(f'baseline saved to {baselinePath}')
+        return 0
+
+    if not baselinePath.exists():
+        print(f'no baseline at {baselinePath}, skipping comparison')
+        return 0
+
+    regressions = compareToBaseline(report, json.loads(baselinePath.read_text()), args.tolerance)
+    for key, message in regressions:
+        print(f'REGRESSION {key}: {message}')
+    return 1 if regressions else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,191 @@
+'''Long-running headless stress scenario over a synthetic transect.
+
+    python benchmarks/stress.py --transect /tmp/transect --frames 300 --megapixels 24
+
+Generates the transect if needed, opens it through QGameCounter.openPaths,
+walks every tile with moveFocusNext, draws on and saves every few tiles,
+and reports latency percentiles per operation and memory growth over time.
+'''
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+HERE = Path(__file__).resolve().parent
+sys.path.insert(0, str(HERE.parent / 'src' / 'main' / 'python'))
+
+from hotpaths import peakMemory
+
+
+def currentMemory():
+    '''Resident memory of this process in bytes, or the peak where unavailable'''
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        return peakMemory()
+
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    index = min(len(values) - 1, max(0, round(p / 100 * (len(values) - 1))))
+    return values[index]
+
+
+class Recorder:
+    '''Collects per operation latencies and a memory time series'''
+
+    def __init__(self):
+        self.start = time.perf_counter()
+        self.latencies = {}
+        self.memory = []
+
+    def time(self, name, fn, *args):
+        from PyQt5.QtWidgets import QApplication
+
+        t = time.perf_counter()
+        result = fn(*args)
+        # include the repaints and queued work the operation caused
+        QApplication.processEvents()
+        self.latencies.setdefault(name, []).append(time.perf_counter() - t)
+        return result
+
+    def sampleMemory(self, step):
+        from QMemoryAccounting import memoryAccounting
+        self.memory.append({
+            'time': time.perf_counter() - self.start,
+            'step': step,
+            'rss': currentMemory(),
+            'accounted': memoryAccounting.total(),
+        })
+
+    def report(self):
+        operations = {}
+        for name, times in self.latencies.items():
+            operations[name] = {
+                'count': len(times),
+                'p50': percentile(times, 50),
+                'p90': percentile(times, 90),
+                'p99': percentile(times, 99),
+                'max': max(times),
+                'total': sum(times),
+            }
+
+        first, last = self.memory[0], self.memory[-1]
+        return {
+            'operations': operations,
+            'memory': self.memory,
+            'memoryGrowth': last['rss'] - first['rss'],
+            'peakMemory': peakMemory(),
+            'duration': time.perf_counter() - self.start,
+        }
+
+
+def drawOval(painter, step):
+    from PyQt5.QtCore import QRectF
+    from QImageHistory import DrawItemCommand
+
+    rect = painter.mainPixmapItem.boundingRect()
+    x = rect.width() * ((step * 37) % 80 + 10) / 100
+    y = rect.height() * ((step * 53) % 80 + 10) / 100
+    item = painter.scene.addEllipse(QRectF(x, y, 150, 120), painter._pen)
+    painter.history.push(DrawItemCommand(painter, item, 'Draw Oval'))
+
+
+def runScenario(args):
+    from PyQt5.QtCore import QSettings
+    from PyQt5.QtWidgets import QApplication
+    from synthetic import generateTransect
+
+    # kept on the function, an unreferenced application is deleted straight away
+    runScenario.app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    # keep the user's real settings out of it
+    QSettings.setDefaultFormat(QSettings.IniFormat)
+    QSettings.setPath(QSettings.IniFormat, QSettings.UserScope, tempfile.mkdtemp(prefix='gamecounter-settings-'))
+
+    transect = Path(args.transect)
+    generateTransect(transect, args.frames, args.megapixels, args.inked, seed=args.seed)
+    filePaths = sorted(p for p in transect.iterdir() if p.suffix.lower() in ('.jpg', '.jpeg', '.png'))
+    filePaths.append(transect / 'counts.json')
+
+    from QGameCounter import QGameCounter
+
+    recorder = Recorder()
+    recorder.sampleMemory(0)
+
+    window = QGameCounter()
+    window.imageGridViewer.rows = args.rows
+    window.imageGridViewer.cols = args.cols
+    window.resize(1600, 1000)
+    window.show()
+
+    recorder.time('open', window.openPaths, filePaths)
+    recorder.sampleMemory(0)
+
+    viewer = window.imageGridViewer
+    tiles = viewer.count() * args.rows * args.cols
+
+    for step in range(1, tiles):
+        recorder.time('focus next', viewer.moveFocusNext)
+
+        if step % args.draw_every == 0:
+            for _ in range(args.ovals):
+                recorder.time('draw', drawOval, window.imagePainter, step)
+            recorder.time('save', window.save)
+
+        if step % args.sample_every == 0:
+            recorder.sampleMemory(step)
+            print(f'{step}/{tiles} tiles', file=sys.stderr)
+
+    recorder.sampleMemory(tiles)
+
+    report = recorder.report()
+    report['tiles'] = tiles
+    report['frames'] = viewer.count()
+    return report
+
+
+def summarize(report):
+    s = f'{report["frames"]} frames, {report["tiles"]} tiles in {report["duration"]:.1f}s\n'
+    s += f'{"operation":<14}{"count":>8}{"p50 (ms)":>12}{"p90 (ms)":>12}{"p99 (ms)":>12}{"max (ms)":>12}\n'
+    for name, op in report['operations'].items():
+        s += (f'{name:<14}{op["count"]:>8}{1000 * op["p50"]:>12.2f}{1000 * op["p90"]:>12.2f}'
+              f'{1000 * op["p99"]:>12.2f}{1000 * op["max"]:>12.2f}\n')
+    s += f'memory growth {report["memoryGrowth"] / 1024**2:.1f} MB, peak {report["peakMemory"] / 1024**2:.1f} MB\n'
+    return s
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--transect', default=str(Path(tempfile.gettempdir()) / 'gamecounter-transect'))
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--megapixels', type=int, default=24)
+    parser.add_argument('--inked', type=float, default=0.1)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--rows', type=int, default=2)
+    parser.add_argument('--cols', type=int, default=2)
+    parser.add_argument('--draw-every', type=int, default=5, help='draw and save on every Nth tile')
+    parser.add_argument('--ovals', type=int, default=3, help='ovals drawn each time')
+    parser.add_argument('--sample-every', type=int, default=20, help='sample memory every N tiles')
+    parser.add_argument('--output', help='write the report as JSON to this file')
+    args = parser.parse_args(argv)
+
+    report = runScenario(args)
+    print(summarize(report))
+
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, indent=2))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
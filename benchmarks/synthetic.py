@@ -0,0 +1,167 @@
+'''Synthetic aerial-like images and transects for benchmarking and stress testing.
+
+    python benchmarks/synthetic.py OUTDIR --frames 300 --megapixels 24 --inked 0.1
+
+writes DSC00000.JPG ... into OUTDIR, an _Inked sibling for a fraction of
+them, and a counts.json in the tracker's format.
+'''
+
+import argparse
+import json
+import os
+import random
+import sys
+from pathlib import Path
+
+from PyQt5.QtCore import Qt, QRectF
+from PyQt5.QtGui import QImage, QPainter, QColor
+
+# (width, height) of common camera resolutions, keyed by megapixels
+SIZES = {
+    12: (4000, 3000),
+    24: (6000, 4000),
+    60: (9504, 6336),
+}
+
+GROUND_COLORS = ['#c2a878', '#b39b6b', '#a58d5f', '#8c7a55', '#9aa06a']
+
+
+def makeSyntheticImage(width, height, seed=0, blobs=2000):
+    '''Sand colored image with scattered bushes and animal-sized blobs.
+
+    The texture keeps JPEG sizes and decode times close to real frames.
+    A QGuiApplication must exist.
+    '''
+    rng = random.Random(seed)
+
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(rng.choice(GROUND_COLORS)))
+
+    painter = QPainter(image)
+    painter.setPen(Qt.NoPen)
+
+    # large patches of ground color
+    for _ in range(blobs // 10):
+        painter.setBrush(QColor(rng.choice(GROUND_COLORS)))
+        w = rng.uniform(0.05, 0.3) * width
+        h = rng.uniform(0.05, 0.3) * height
+        painter.drawEllipse(QRectF(rng.uniform(-w, width), rng.uniform(-h, height), w, h))
+
+    # bushes and animals
+    for _ in range(blobs):
+        painter.setBrush(QColor(rng.randint(20, 90), rng.randint(30, 90), rng.randint(10, 60)))
+        size = rng.uniform(0.002, 0.01) * width
+        painter.drawEllipse(QRectF(rng.uniform(0, width), rng.uniform(0, height), size, size * rng.uniform(0.5, 1.5)))
+
+    painter.end()
+    return image
+
+
+def writeSyntheticImage(path, megapixels=24, seed=0, quality=90):
+    width, height = SIZES[megapixels]
+    image = makeSyntheticImage(width, height, seed)
+    image.save(str(path), quality=quality)
+    return path
+
+
+SPECIES = ['Eland', 'Gemsbok', 'Giraffe', 'Kudu', 'Springbok', 'Steenbok', 'Warthog', 'Zebra']
+
+
+def frameName(n):
+    return f'DSC{n:05d}.JPG'
+
+
+def inkImage(image, seed=0, marks=12):
+    '''Copy of the image with ovals drawn on it, like an annotated frame'''
+    from PyQt5.QtGui import QPen
+
+    rng = random.Random(seed)
+    inked = image.copy()
+    painter = QPainter(inked)
+    painter.setPen(QPen(QColor('#3296e6'), 30))
+    for _ in range(marks):
+        size = rng.uniform(0.02, 0.06) * inked.width()
+        painter.drawEllipse(QRectF(rng.uniform(0, inked.width()), rng.uniform(0, inked.height()), size, size))
+    painter.end()
+    return inked
+
+
+def makeCounts(fileNames, speciesPerFile=3, seed=0):
+    '''Counts in the same JSON layout QGameCountTracker dumps'''
+    rng = random.Random(seed)
+    counts = {}
+    for fileName in fileNames:
+        animals = []
+        for species in rng.sample(SPECIES, speciesPerFile):
+            count = rng.randint(1, 30)
+            repeats = rng.randint(0, count // 3)
+            animals.append({'Species': species, 'Count': count, 'Repeats': repeats, 'New': count - repeats})
+        counts[fileName] = animals
+    return counts
+
+
+def generateTransect(directory, frames=200, megapixels=24, inkedFraction=0.1,
+                     countFiles=None, speciesPerFile=3, seed=0, quality=90):
+    '''Writes a synthetic transect and returns the paths of the base frames.
+
+    Existing frames are kept, so re-running only fills in what is missing.
+    A QGuiApplication must exist.
+    '''
+    directory = Path(directory)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    rng = random.Random(seed)
+    width, height = SIZES[megapixels]
+
+    paths = []
+    for n in range(frames):
+        path = directory / frameName(n)
+        paths.append(path)
+
+        inked = rng.random() < inkedFraction
+        inkedPath = path.parent / f'{path.stem}_Inked{path.suffix}'
+
+        if path.exists() and (inkedPath.exists() or not inked):
+            continue
+
+        print(f'writing {path.name}', file=sys.stderr)
+        image = makeSyntheticImage(width, height, seed + n)
+        image.save(str(path), quality=quality)
+        if inked:
+            inkImage(image, seed + n).save(str(inkedPath), quality=quality)
+
+    if countFiles is None:
+        countFiles = frames
+    fileNames = [frameName(n) for n in range(min(countFiles, frames))]
+    fileNames += [frameName(n) for n in range(frames, countFiles)]
+
+    with open(directory / 'counts.json', 'w') as f:
+        json.dump(makeCounts(fileNames, speciesPerFile, seed), f, indent=2, sort_keys=True)
+
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--frames', type=int, default=200)
+    parser.add_argument('--megapixels', type=int, choices=sorted(SIZES), default=24)
+    parser.add_argument('--inked', type=float, default=0.1, help='fraction of frames with an _Inked sibling')
+    parser.add_argument('--count-files', type=int, help='entries in counts.json (default: one per frame)')
+    parser.add_argument('--species-per-file', type=int, default=3)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--quality', type=int, default=90, help='JPEG quality')
+    args = parser.parse_args(argv)
+
+    os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+    from PyQt5.QtGui import QGuiApplication
+    # kept on the function, an unreferenced application is deleted straight away
+    main.app = QGuiApplication.instance() or QGuiApplication(sys.argv[:1])
+
+    generateTransect(args.directory, args.frames, args.megapixels, args.inked,
+                     args.count_files, args.species_per_file, args.seed, args.quality)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,111 @@
+'''Cheap vectorized detector of candidate animals in a tile.
+
+Animals in aerial frames show up as small blobs standing out from the
+ground around them. The tile is reduced to a downsampled grayscale image,
+each pixel is compared with the mean of its neighbourhood, and cells with
+enough strongly contrasting pixels are grouped into candidate boxes.
+
+It is meant to rank tiles for review, not to count: a high score means
+"look here first", a zero score means nothing stood out.
+'''
+
+from collections import namedtuple
+
+import numpy as np
+
+# score is the strongest local contrast found, in multiples of the tile's
+# typical contrast. boxes are (x, y, width, height) in tile pixels
+Candidates = namedtuple('Candidates', 'score boxes')
+
+downsample = 4
+neighbourhood = 15  # pixels of the downsampled image
+threshold = 4.0     # contrast, in multiples of the median, of a strong pixel
+cellSize = 16       # pixels of the downsampled image
+minDensity = 0.02   # fraction of strong pixels in a candidate cell
+
+
+def luminance(array):
+    '''Grayscale of a uint8 (h, w) or (h, w, channels) array, as float32.
+
+    Averages the colour channels, so it doesn't depend on their order.
+    '''
+    if array.ndim == 2:
+        return array.astype(np.float32)
+    return array[..., :3].mean(axis=2, dtype=np.float32)
+
+
+def blockMean(image, factor):
+    height = image.shape[0] // factor * factor
+    width = image.shape[1] // factor * factor
+    blocks = image[:height, :width].reshape(height // factor, factor, width // factor, factor)
+    return blocks.mean(axis=(1, 3))
+
+
+def boxFilter(image, radius):
+    '''Mean over a (2 * radius + 1) square around each pixel, using an integral image'''
+    size = 2 * radius + 1
+    padded = np.pad(image, radius, mode='edge')
+
+    integral = np.zeros((padded.shape[0] + 1, padded.shape[1] + 1), dtype=np.float64)
+    integral[1:, 1:] = padded.cumsum(axis=0).cumsum(axis=1)
+
+    total = integral[size:, size:] - integral[:-size, size:] - integral[size:, :-size] + integral[:-size, :-size]
+    return (total / (size * size)).astype(np.float32)
+
+
+def _cells(values, reduce):
+    '''Reduces a 2D array over cellSize squares, padding the edges'''
+    rows = -(-values.shape[0] // cellSize)
+    cols = -(-values.shape[1] // cellSize)
+    padded = np.zeros((rows * cellSize, cols * cellSize), dtype=values.dtype)
+    padded[:values.shape[0], :values.shape[1]] = values
+    return reduce(padded.reshape(rows, cellSize, cols, cellSize), axis=(1, 3))
+
+
+def _groups(mask):
+    '''Yields lists of (row, col) of 8-connected True cells'''
+    remaining = set(zip(*np.nonzero(mask)))
+    while remaining:
+        stack = [remaining.pop()]
+        group = []
+        while stack:
+            row, col = stack.pop()
+            group.append((row, col))
+            for dr in (-1, 0, 1):
+                for dc in (-1, 0, 1):
+                    neighbour = (row + dr, col + dc)
+                    if neighbour in remaining:
+                        remaining.remove(neighbour)
+                        stack.append(neighbour)
+        yield group
+
+
+def detect(array):
+    '''Finds candidate animals in a uint8 tile array, see ImageBuffer.imageToArray'''
+    height, width = array.shape[:2]
+
+    gray = blockMean(luminance(array), downsample)
+    if min(gray.shape) <= neighbourhood:
+        return Candidates(0.0, [])
+
+    contrast = np.abs(gray - boxFilter(gray, neighbourhood // 2))
+    contrast /= max(float(np.median(contrast)), 1.0)
+
+    density = _cells((contrast > threshold).astype(np.float32), np.mean)
+    peak = _cells(contrast, np.max)
+
+    score = 0.0
+    boxes = []
+    scale = cellSize * downsample
+    for group in _groups(density > minDensity):
+        rows = [row for row, _ in group]
+        cols = [col for _, col in group]
+
+        x = int(min(cols)) * scale
+        y = int(min(rows)) * scale
+        right = min((int(max(cols)) + 1) * scale, width)
+        bottom = min((int(max(rows)) + 1) * scale, height)
+        boxes.append((x, y, right - x, bottom - y))
+        score = max(score, float(max(peak[row, col] for row, col in group)))
+
+    return Candidates(score, boxes)
@@ -0,0 +1,174 @@
+'''Decodes images in a pool of worker processes, past the GIL and a single core.
+
+Each worker decodes a frame with QImage and writes its raw pixels to a file
+of its own in a scratch folder, in /dev/shm where there is one so it never
+touches the disk. The GUI maps that file copy-on-write and wraps the pixels
+as a QImage without copying them (see RawTileStore.mapImage).
+
+The mapped image is handed out as a DecodedImage, which is only valid until
+its release(). Receivers copy what they keep, e.g. by splitting it into
+tiles. Releasing closes the mapping before removing the file, which Windows
+requires, and whatever is left in the scratch folder goes on shutdown().
+
+Python 3.6 has no multiprocessing.shared_memory, the mapped file stands in
+for it. The pool is started with the first image, so it costs nothing at
+startup. Its processes are spawned rather than forked, forking a process
+already running Qt's threads isn't safe.
+'''
+
+import mmap
+import multiprocessing
+import os
+import shutil
+import tempfile
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QImage
+
+import RawTileStore
+import TileCache
+from Tracing import span
+
+maxProcesses = 16
+
+def _initWorker():
+    # image format plugins are found through the application
+    from PyQt5.QtCore import QCoreApplication
+    if QCoreApplication.instance() is None:
+        _initWorker.app = QCoreApplication([])
+
+
+def decodeToFile(imgPath, scratchDir):
+    '''Runs in a worker process. Returns (imgPath, descriptor of the pixels or None)'''
+    image = QImage(imgPath)
+    if image.isNull():
+        return imgPath, None
+
+    # a color table wouldn't travel with the pixels, and analysis reads colors
+    image = TileCache.toPixelFormat(image)
+
+    fd, fp = tempfile.mkstemp(suffix='.raw', dir=scratchDir)
+    with os.fdopen(fd, 'wb') as f:
+        f.write(image.constBits().asstring(image.byteCount()))
+
+    return imgPath, {
+        'file': fp,
+        'width': image.width(),
+        'height': image.height(),
+        'bytesPerLine': image.bytesPerLine(),
+        'format': int(image.format()),
+    }
+
+
+def _scratchRoot():
+    return '/dev/shm' if os.path.isdir('/dev/shm') else None
+
+
+class DecodedImage:
+    '''An image over a worker's scratch file, valid until release()'''
+
+    def __init__(self, descriptor):
+        self.file = descriptor['file']
+        with open(self.file, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+
+        self.image = RawTileStore.mapImage(
+            self._map, 0,
+            descriptor['width'], descriptor['height'], descriptor['bytesPerLine'],
+            QImage.Format(descriptor['format']),
+        )
+
+    def release(self):
+        '''Closes the mapping and removes the file. Copies of the image made before stay valid'''
+        if self._map is None:
+            return
+
+        # the image's buffer is what holds the mapping open
+        self.image = QImage()
+        try:
+            self._map.close()
+        except BufferError:
+            # still referenced elsewhere, left to the garbage collector
+            pass
+        self._map = None
+
+        try:
+            os.remove(self.file)
+        except OSError:
+            # still mapped on Windows, it goes with the scratch folder
+            pass
+
+
+class QDecodeService(QObject):
+
+    # signals
+    imageDecoded = pyqtSignal(object, object) # image path, DecodedImage (None if it can't be read)
+
+    # results arrive on the pool's own thread
+    _resultReady = pyqtSignal(object)
+
+    def __init__(self, processes=None, parent=None):
+        super().__init__(parent)
+
+        self.processes = processes or min(maxProcesses, os.cpu_count() or 1)
+
+        self._pool = None
+        self._scratchDir = None
+        self._pending = set()
+
+        self._resultReady.connect(self._wrapResult)
+
+    def isParallel(self):
+        return self.processes > 1
+
+    def isPending(self, imgPath):
+        return str(imgPath) in self._pending
+
+    def _start(self):
+        self._scratchDir = tempfile.mkdtemp(prefix='gamecounter-decode-', dir=_scratchRoot())
+        self._pool = multiprocessing.get_context('spawn').Pool(self.processes, _initWorker)
+
+    def decode(self, imgPath):
+        '''Decodes the image at imgPath in the pool, imageDecoded is emitted with it'''
+        imgPath = str(imgPath)
+        if imgPath in self._pending:
+            return
+        if self._pool is None:
+            self._start()
+
+        self._pending.add(imgPath)
+        self._pool.apply_async(
+            decodeToFile, (imgPath, self._scratchDir),
+            callback=self._resultReady.emit,
+            error_callback=lambda error: self._resultReady.emit((imgPath, None)),
+        )
+
+    @pyqtSlot(object)
+    def _wrapResult(self, result):
+        imgPath, descriptor = result
+        self._pending.discard(imgPath)
+
+        decoded = None
+        if descriptor is not None:
+            try:
+                with span('map decoded', path=imgPath):
+                    decoded = DecodedImage(descriptor)
+            except (OSError, ValueError):
+                pass
+
+        try:
+            self.imageDecoded.emit(Path(imgPath), decoded)
+        finally:
+            # receivers have copied what they keep
+            if decoded is not None:
+                decoded.release()
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+        if self._scratchDir is not None:
+            shutil.rmtree(self._scratchDir, ignore_errors=True)
+            self._scratchDir = None
+        self._pending.clear()
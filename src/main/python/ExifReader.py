@@ -0,0 +1,221 @@
+'''Reads image dimensions and EXIF metadata from file headers, without decoding pixels.
+
+Only the start of the file is read: for a JPEG, the segments up to the
+start of the scan; for a PNG, the IHDR chunk. Everything is optional, a
+field that can't be found is None. JPEGs may also embed a small thumbnail,
+see readThumbnail.
+'''
+
+import struct
+from datetime import datetime
+
+# stop looking for headers past this many bytes
+maxHeaderBytes = 1024 * 1024
+
+fields = ('width', 'height', 'captureTime', 'latitude', 'longitude', 'altitude', 'make', 'model')
+
+_typeSizes = {1: 1, 2: 1, 3: 2, 4: 4, 5: 8, 7: 1, 9: 4, 10: 8}
+
+# IFD0
+_make = 0x010F
+_model = 0x0110
+_dateTime = 0x0132
+_exifPointer = 0x8769
+_gpsPointer = 0x8825
+
+# IFD1
+_thumbnailOffset = 0x0201
+_thumbnailLength = 0x0202
+
+# Exif IFD
+_dateTimeOriginal = 0x9003
+_pixelWidth = 0xA002
+_pixelHeight = 0xA003
+
+# GPS IFD
+_latitudeRef, _latitude, _longitudeRef, _longitude, _altitudeRef, _altitude = range(1, 7)
+
+
+def readMetadata(fp):
+    '''Returns a dict of the fields above for the image at fp'''
+    metadata = dict.fromkeys(fields)
+
+    with open(str(fp), 'rb') as f:
+        head = f.read(maxHeaderBytes)
+
+    if head.startswith(b'\xff\xd8'):
+        _readJPEG(head, metadata)
+    elif head.startswith(b'\x89PNG\r\n\x1a\n') and head[12:16] == b'IHDR':
+        metadata['width'], metadata['height'] = struct.unpack('>II', head[16:24])
+
+    return metadata
+
+
+def _segments(data):
+    '''Yields (marker, segment) of the JPEG in data up to the start of the scan'''
+    pos = 2
+    while pos + 4 <= len(data):
+        if data[pos] != 0xFF:
+            return
+        marker = data[pos + 1]
+
+        # padding and markers without a length
+        if marker == 0xFF:
+            pos += 1
+            continue
+        if 0xD0 <= marker <= 0xD9 or marker == 0x01:
+            pos += 2
+            continue
+
+        # start of scan, the pixels follow
+        if marker == 0xDA:
+            return
+
+        length, = struct.unpack('>H', data[pos + 2:pos + 4])
+        yield marker, data[pos + 4:pos + 2 + length]
+        pos += 2 + length
+
+
+def _readJPEG(data, metadata):
+    for marker, segment in _segments(data):
+        if marker == 0xE1 and segment.startswith(b'Exif\x00\x00'):
+            try:
+                _readTIFF(segment[6:], metadata)
+            except (struct.error, IndexError, ValueError, KeyError):
+                # keep what was found before the damage
+                pass
+
+        # start of frame, except DHT, JPG and DAC which share the range
+        elif 0xC0 <= marker <= 0xCF and marker not in (0xC4, 0xC8, 0xCC) and len(segment) >= 5:
+            metadata['height'], metadata['width'] = struct.unpack('>HH', segment[1:5])
+
+
+def readThumbnail(fp):
+    '''Returns the JPEG bytes of the thumbnail embedded in the EXIF of the image at fp, or None'''
+    with open(str(fp), 'rb') as f:
+        head = f.read(maxHeaderBytes)
+    if not head.startswith(b'\xff\xd8'):
+        return None
+
+    for marker, segment in _segments(head):
+        if marker == 0xE1 and segment.startswith(b'Exif\x00\x00'):
+            try:
+                return _readThumbnail(segment[6:])
+            except (struct.error, IndexError, ValueError, KeyError):
+                return None
+    return None
+
+
+def _readThumbnail(tiff):
+    order = {b'II': '<', b'MM': '>'}[tiff[:2]]
+    ifd0, = struct.unpack(order + 'I', tiff[4:8])
+
+    # the thumbnail is described by the second directory, IFD1
+    count, = struct.unpack(order + 'H', tiff[ifd0:ifd0 + 2])
+    end = ifd0 + 2 + 12 * count
+    ifd1, = struct.unpack(order + 'I', tiff[end:end + 4])
+    if ifd1 == 0:
+        return None
+
+    tags = _readIFD(tiff, order, ifd1)
+    if _thumbnailOffset not in tags or _thumbnailLength not in tags:
+        return None
+
+    start, length = tags[_thumbnailOffset][0], tags[_thumbnailLength][0]
+    thumbnail = tiff[start:start + length]
+    return thumbnail if len(thumbnail) == length and thumbnail.startswith(b'\xff\xd8') else None
+
+
+def _readTIFF(tiff, metadata):
+    order = {b'II': '<', b'MM': '>'}[tiff[:2]]
+    ifd0, = struct.unpack(order + 'I', tiff[4:8])
+
+    tags = _readIFD(tiff, order, ifd0)
+    exif = _readIFD(tiff, order, tags[_exifPointer][0]) if _exifPointer in tags else {}
+    gps = _readIFD(tiff, order, tags[_gpsPointer][0]) if _gpsPointer in tags else {}
+
+    metadata['make'] = _text(tags.get(_make))
+    metadata['model'] = _text(tags.get(_model))
+    metadata['captureTime'] = _time(exif.get(_dateTimeOriginal)) or _time(tags.get(_dateTime))
+
+    # the frame's own dimensions win over what EXIF says
+    if metadata['width'] is None and _pixelWidth in exif:
+        metadata['width'] = exif[_pixelWidth][0]
+        metadata['height'] = exif.get(_pixelHeight, [None])[0]
+
+    if _latitude in gps and _longitude in gps:
+        metadata['latitude'] = _degrees(gps[_latitude], _text(gps.get(_latitudeRef)) == 'S')
+        metadata['longitude'] = _degrees(gps[_longitude], _text(gps.get(_longitudeRef)) == 'W')
+    if _altitude in gps:
+        belowSeaLevel = gps.get(_altitudeRef, [0])[0] == 1
+        metadata['altitude'] = -gps[_altitude][0] if belowSeaLevel else gps[_altitude][0]
+
+
+def _readIFD(tiff, order, offset):
+    '''Returns {tag: values} of one image file directory'''
+    count, = struct.unpack(order + 'H', tiff[offset:offset + 2])
+    tags = {}
+
+    for n in range(count):
+        entry = offset + 2 + 12 * n
+        if entry + 12 > len(tiff):
+            # a truncated directory keeps the entries before the cut
+            break
+        tag, kind, items = struct.unpack(order + 'HHI', tiff[entry:entry + 8])
+        size = _typeSizes.get(kind)
+        if size is None:
+            continue
+
+        # values that fit in 4 bytes are stored in place of their offset
+        if size * items <= 4:
+            start = entry + 8
+        else:
+            start, = struct.unpack(order + 'I', tiff[entry + 8:entry + 12])
+        if start + size * items > len(tiff):
+            continue
+        raw = tiff[start:start + size * items]
+
+        tags[tag] = _values(raw, order, kind, items)
+
+    return tags
+
+
+def _values(raw, order, kind, items):
+    if kind in (1, 7):
+        return list(raw)
+    if kind == 2:
+        return raw
+    if kind == 3:
+        return list(struct.unpack(order + 'H' * items, raw))
+    if kind == 4:
+        return list(struct.unpack(order + 'I' * items, raw))
+    if kind == 9:
+        return list(struct.unpack(order + 'i' * items, raw))
+
+    pairs = struct.unpack(order + ('II' if kind == 5 else 'ii') * items, raw)
+    return [n / d if d else 0.0 for n, d in zip(pairs[::2], pairs[1::2])]
+
+
+def _text(values):
+    # only ASCII entries (kind 2) are kept as bytes, see _values
+    if not isinstance(values, bytes):
+        return None
+    text = bytes(values).split(b'\x00')[0].decode('ascii', 'replace').strip()
+    return text or None
+
+
+def _time(values):
+    '''EXIF "YYYY:MM:DD HH:MM:SS" as an ISO 8601 string'''
+    text = _text(values)
+    if text is None:
+        return None
+    try:
+        return datetime.strptime(text, '%Y:%m:%d %H:%M:%S').isoformat()
+    except ValueError:
+        return None
+
+
+def _degrees(values, negative):
+    degrees, minutes, seconds = (list(values) + [0.0, 0.0, 0.0])[:3]
+    value = degrees + minutes / 60 + seconds / 3600
+    return -value if negative else value
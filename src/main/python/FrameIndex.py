@@ -0,0 +1,196 @@
+'''Index of frame perceptual hashes, to catch duplicate frames.
+
+Copies of the same frame, e.g. from an SD card offloaded twice, are opened
+under different names and would be counted twice. Each frame's dHash (see
+PerceptualHash.py) is computed on the thread pool from its cached or EXIF
+thumbnail as soon as its grid is added, so copies are flagged while frames
+are still opened lazily, and from its tiles once it loads if it has no
+thumbnail. Hashes are looked up in a BK-tree of the frames seen so far.
+
+Hashes are kept in phash.json in the tile cache folder of each transect,
+so reopened frames are indexed without being hashed again.
+'''
+
+import json
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QThreadPool, pyqtSignal, pyqtSlot
+
+import TileCache
+from PerceptualHash import BKTree
+from QWorker import Worker
+from Tracing import span
+
+indexName = 'phash.json'
+
+
+def computeHash(imgPath, tileArrays):
+    from PerceptualHash import dhash
+
+    with span('perceptual hash', path=imgPath):
+        return imgPath, dhash(tileArrays)
+
+
+def computeThumbnailHash(imgPath):
+    '''Hash of the frame's thumbnail, None if it has none'''
+    thumbnail = TileCache.readAnyThumbnail(imgPath)
+    if thumbnail is None:
+        return imgPath, None
+
+    from ImageBuffer import imageToArray
+    return computeHash(imgPath, [[imageToArray(TileCache.toPixelFormat(thumbnail))]])
+
+
+def _indexFile(imgPath):
+    return Path(imgPath).parent / TileCache.cacheDirName / indexName
+
+
+class QFrameIndex(QObject):
+
+    # signals
+    duplicateFound = pyqtSignal(object, object) # image path, path of the frame it duplicates
+
+    # differing bits under which two frames are taken to be the same
+    maxDistance = 6
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        # image path -> hash
+        self._hashes = {}
+        self._tree = BKTree()
+        # image path -> path of the earlier frame it duplicates
+        self._duplicates = {}
+        self._pending = set()
+
+        # index file -> {file name: {'stamp': ..., 'hash': ...}}
+        self._diskIndexes = {}
+
+        self.threadPool = QThreadPool.globalInstance()
+
+    def gridAdded(self, grid):
+        imgPath = str(grid.imgPath)
+        if imgPath in self._hashes or imgPath in self._pending:
+            return
+
+        h = self._loadFromDisk(imgPath)
+        if h is not None:
+            self._addHash(imgPath, h)
+            return
+
+        self._pending.add(imgPath)
+        worker = Worker(computeThumbnailHash, imgPath)
+        worker.signals.result.connect(lambda result, grid=grid: self._thumbnailHashed(grid, result))
+        worker.signals.error.connect(
+            lambda error, grid=grid, imgPath=imgPath: self._thumbnailHashed(grid, (imgPath, None)))
+        self.threadPool.start(worker)
+
+    def gridLoaded(self, grid):
+        imgPath = str(grid.imgPath)
+        if imgPath in self._hashes or imgPath in self._pending:
+            return
+
+        self._pending.add(imgPath)
+        worker = Worker(computeHash, imgPath, grid.tileArrays())
+        worker.signals.result.connect(self._hashComputed)
+        worker.signals.error.connect(lambda error, imgPath=imgPath: self._pending.discard(imgPath))
+        self.threadPool.start(worker)
+
+    def _thumbnailHashed(self, grid, result):
+        imgPath, h = result
+        if imgPath not in self._pending:
+            # removed while it was being hashed
+            return
+
+        if h is not None:
+            self._hashComputed(result)
+            return
+
+        # no thumbnail, so hash the tiles; if the grid loaded meanwhile its
+        # gridLoaded was skipped while this was pending
+        self._pending.discard(imgPath)
+        if grid.isLoaded():
+            self.gridLoaded(grid)
+
+    @pyqtSlot(object)
+    def _hashComputed(self, result):
+        imgPath, h = result
+        if imgPath not in self._pending:
+            # removed while it was being hashed
+            return
+
+        self._pending.discard(imgPath)
+        self._saveToDisk(imgPath, h)
+        self._addHash(imgPath, h)
+
+    def _addHash(self, imgPath, h):
+        # the tree keeps removed frames, so skip those
+        matches = [path for _, path in self._tree.search(h, self.maxDistance) if path in self._hashes]
+
+        self._hashes[imgPath] = h
+        self._tree.add(h, imgPath)
+
+        if matches:
+            self._duplicates[imgPath] = matches[0]
+            self.duplicateFound.emit(imgPath, matches[0])
+
+    def forgetGrid(self, grid):
+        imgPath = str(grid.imgPath)
+        self._hashes.pop(imgPath, None)
+        self._pending.discard(imgPath)
+        self._duplicates = {
+            path: original for path, original in self._duplicates.items()
+            if imgPath not in (path, original)
+        }
+
+    def hash(self, imgPath):
+        return self._hashes.get(str(imgPath))
+
+    def duplicateOf(self, imgPath):
+        '''The earlier frame imgPath looks like a copy of, or None'''
+        return self._duplicates.get(str(imgPath))
+
+    def duplicates(self):
+        '''{image path: path of the frame it duplicates}'''
+        return dict(self._duplicates)
+
+    def similar(self, imgPath, maxDistance=None):
+        '''Returns [(distance, path)] of the other open frames close to imgPath, closest first'''
+        h = self.hash(imgPath)
+        if h is None:
+            return []
+        if maxDistance is None:
+            maxDistance = self.maxDistance
+        return [
+            (distance, path) for distance, path in self._tree.search(h, maxDistance)
+            if path != str(imgPath) and path in self._hashes
+        ]
+
+    def _diskIndex(self, imgPath):
+        fp = _indexFile(imgPath)
+        if fp not in self._diskIndexes:
+            try:
+                with open(fp) as f:
+                    self._diskIndexes[fp] = json.load(f)
+            except (OSError, ValueError):
+                self._diskIndexes[fp] = {}
+        return fp, self._diskIndexes[fp]
+
+    def _loadFromDisk(self, imgPath):
+        _, entries = self._diskIndex(imgPath)
+        entry = entries.get(Path(imgPath).name)
+        if entry is None or entry['stamp'] != TileCache.fileStamp(imgPath):
+            return None
+        return entry['hash']
+
+    def _saveToDisk(self, imgPath, h):
+        fp, entries = self._diskIndex(imgPath)
+        entries[Path(imgPath).name] = {'stamp': TileCache.fileStamp(imgPath), 'hash': h}
+
+        try:
+            fp.parent.mkdir(parents=True, exist_ok=True)
+            with open(fp, 'w') as f:
+                json.dump(entries, f)
+        except OSError:
+            # a read only survey is still indexed for this session
+            pass
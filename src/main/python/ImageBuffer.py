@@ -0,0 +1,134 @@
+'''Views QImage pixels as NumPy arrays, and wraps arrays as QImages, without copying.
+
+    array = imageToArray(label.image)          # read only view
+    array = imageToArray(image, writable=True) # detaches a shared image first
+    image = arrayToImage(array)
+
+Arrays from imageToArray keep their image alive, including any slices or
+views taken from them. A QImage from arrayToImage borrows the array's
+memory: keep the array alive as long as the image (or any shallow copy of
+it) is in use, or call image.copy() to give it its own pixels.
+
+Channel order is the in-memory byte order. For the 32-bit RGB formats that
+is B, G, R, A on little endian machines (see channelOrder).
+'''
+
+import sys
+
+import numpy as np
+from PyQt5.QtGui import QImage
+
+# format -> pixel bytes, array channels (None for 2D arrays)
+_layouts = {
+    QImage.Format_RGB32: (4, 4),
+    QImage.Format_ARGB32: (4, 4),
+    QImage.Format_ARGB32_Premultiplied: (4, 4),
+    QImage.Format_RGBX8888: (4, 4),
+    QImage.Format_RGBA8888: (4, 4),
+    QImage.Format_RGBA8888_Premultiplied: (4, 4),
+    QImage.Format_RGB888: (3, 3),
+    QImage.Format_Indexed8: (1, None),
+    QImage.Format_Alpha8: (1, None),
+    QImage.Format_Grayscale8: (1, None),
+}
+
+
+def channelOrder(fmt):
+    '''Names of the channels along the last axis of an array of this format'''
+    if fmt in (QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied):
+        return 'BGRA' if sys.byteorder == 'little' else 'ARGB'
+    if fmt in (QImage.Format_RGBX8888, QImage.Format_RGBA8888, QImage.Format_RGBA8888_Premultiplied):
+        return 'RGBA'
+    if fmt == QImage.Format_RGB888:
+        return 'RGB'
+    return ''
+
+
+def isSupported(image):
+    return image.format() in _layouts
+
+
+class _ImageView:
+    '''Owns the image an array views, exposing its pixels to NumPy'''
+
+    def __init__(self, image, writable):
+        pixelBytes, channels = _layouts[image.format()]
+        height, width = image.height(), image.width()
+
+        # bits() detaches a shared image so writes don't reach its copies
+        ptr = image.bits() if writable else image.constBits()
+
+        if channels is None:
+            shape = (height, width)
+            strides = (image.bytesPerLine(), 1)
+        else:
+            shape = (height, width, channels)
+            strides = (image.bytesPerLine(), pixelBytes, 1)
+
+        self.image = image
+        self.__array_interface__ = {
+            'shape': shape,
+            'typestr': '|u1',
+            'data': (int(ptr), not writable),
+            'strides': strides,
+            'version': 3,
+        }
+
+
+def imageToArray(image, writable=False):
+    '''Returns a uint8 array viewing the pixels of image.
+
+    The array is (height, width) for 8-bit formats and (height, width,
+    channels) otherwise, strided over the image's padded scan lines.
+    Raises ValueError for formats without a byte per channel; convert the
+    image with convertToFormat first.
+    '''
+    if image.isNull():
+        raise ValueError('Cannot view a null image')
+    if image.format() not in _layouts:
+        raise ValueError(f'Unsupported image format {image.format()}, convert it to Format_RGB32 first')
+
+    return np.asarray(_ImageView(image, writable))
+
+
+def _defaultFormat(array):
+    if array.ndim == 2:
+        return QImage.Format_Grayscale8
+    channels = array.shape[2]
+    if channels == 3:
+        return QImage.Format_RGB888
+    if channels == 4:
+        return QImage.Format_ARGB32
+    raise ValueError(f'Cannot make an image from {channels} channels')
+
+
+def arrayToImage(array, fmt=None):
+    '''Returns a QImage over the memory of a uint8 array, without copying.
+
+    array is (height, width) or (height, width, channels) with contiguous
+    pixels; rows may be padded. fmt defaults to Grayscale8, RGB888 or ARGB32
+    by the number of channels.
+    '''
+    if array.dtype != np.uint8:
+        raise ValueError(f'Expected a uint8 array, not {array.dtype}')
+    if array.ndim not in (2, 3):
+        raise ValueError(f'Expected a 2 or 3 dimensional array, not {array.ndim}')
+
+    if fmt is None:
+        fmt = _defaultFormat(array)
+
+    pixelBytes, channels = _layouts[fmt]
+    pixelShape = () if channels is None else (channels,)
+    if array.shape[2:] != pixelShape:
+        raise ValueError(f'Array shape {array.shape} does not match the image format')
+
+    # pixels must be packed, only the row stride is free
+    if array.strides[1:] != ((pixelBytes, 1) if channels else (1,)):
+        raise ValueError('Array pixels are not contiguous, use np.ascontiguousarray first')
+
+    height, width = array.shape[:2]
+    image = QImage(array.ctypes.data, width, height, array.strides[0], fmt)
+
+    # the image has no claim on the memory, this keeps it for its wrapper at least
+    image._array = array
+    return image
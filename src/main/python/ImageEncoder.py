@@ -0,0 +1,227 @@
+'''Encodes and writes images on a pool of threads.
+
+Inked frames and exports are saved through imageEncoder rather than with
+QImage.save on the GUI thread. The output format of exports is
+configurable: the source image's own format, JPEG at a set quality, PNG at
+a set compression level, or lossless WebP where Qt has the plugin for it.
+Inked frames are always written in their source's format, at the set
+quality.
+
+Each file is written under a temporary name and moved into place, and
+saves of the same path are written in the order they were asked for. The
+bytes written and the time spent are kept for report().
+'''
+
+import math
+import os
+import time
+from pathlib import Path
+
+from PyQt5.QtCore import QCoreApplication, QObject, QThreadPool, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QImage, QImageWriter, QPainter
+
+from QMemoryAccounting import formatBytes
+from QWorker import Worker
+from Tracing import span
+
+# 'Source' keeps the format of the file being written
+formats = ('Source', 'JPEG', 'PNG', 'WEBP')
+
+suffixes = {'JPEG': '.jpg', 'PNG': '.png', 'WEBP': '.webp'}
+
+
+def supportedFormats():
+    '''The formats of the list above this Qt can write'''
+    writable = {bytes(fmt).decode().upper() for fmt in QImageWriter.supportedImageFormats()}
+    return [fmt for fmt in formats if fmt == 'Source' or fmt in writable]
+
+
+def formatForPath(fp):
+    suffix = Path(fp).suffix.lower().lstrip('.')
+    return 'JPEG' if suffix in ('jpg', 'jpeg') else suffix.upper()
+
+
+def pngQuality(level):
+    '''The QImageWriter quality Qt's PNG writer turns into compression level (0 to 9)'''
+    # Qt takes level = (100 - quality) * 9 // 91, this is the highest quality giving level
+    return 100 - math.ceil(level * 91 / 9)
+
+
+def mergeTiles(tiles):
+    '''Draws a rows x cols list of lists of equally sized tiles into one image'''
+    if len(tiles) == 1 and len(tiles[0]) == 1:
+        return tiles[0][0]
+
+    # assumes all images are the same size within a grid
+    width = tiles[0][0].width()
+    height = tiles[0][0].height()
+
+    mergedImage = QImage(width * len(tiles[0]), height * len(tiles), QImage.Format_RGB32)
+    painter = QPainter(mergedImage)
+
+    for row, imgRow in enumerate(tiles):
+        for col, image in enumerate(imgRow):
+            painter.drawImage(col * width, row * height, image)
+
+    painter.end()
+    return mergedImage
+
+
+def encodeImage(source, fp, fmt, quality):
+    '''Runs on the pool. source is a QImage, a list of lists of tiles, or the path of an image to read.
+    Returns (fp, bytes written, seconds taken, error or None)'''
+    t = time.perf_counter()
+    tmp = fp.with_name(f'.{fp.name}.tmp')
+
+    try:
+        with span('encode', path=str(fp), format=fmt):
+            if isinstance(source, QImage):
+                image = source
+            elif isinstance(source, list):
+                image = mergeTiles(source)
+            else:
+                image = QImage(str(source))
+                if image.isNull():
+                    raise OSError(f'Cannot read {source}')
+
+            writer = QImageWriter(str(tmp), fmt.encode())
+            writer.setQuality(quality)
+            if not writer.write(image):
+                raise OSError(writer.errorString())
+            os.replace(str(tmp), str(fp))
+
+    except Exception as error:
+        # reported back rather than raised, the pool has nowhere to raise to
+        try:
+            os.remove(str(tmp))
+        except OSError:
+            pass
+        return fp, 0, time.perf_counter() - t, str(error)
+
+    return fp, fp.stat().st_size, time.perf_counter() - t, None
+
+
+class QImageEncoder(QObject):
+
+    # signals
+    imageWritten = pyqtSignal(object, int) # path, bytes written
+    writeFailed = pyqtSignal(object, str) # path, error
+    allWritten = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+
+        self.format = 'Source'
+        self.jpegQuality = 95
+        self.pngCompression = 6
+
+        # made on first use, once there is an application to run it
+        self.threadPool = None
+
+        # paths being written, and the latest save waiting for each of them
+        self._writing = set()
+        self._waiting = {}
+
+        self._images = 0
+        self._bytes = 0
+        self._failed = 0
+        self._busySeconds = 0.0
+        self._busySince = None
+
+    def quality(self, fmt):
+        '''The QImageWriter quality for a format'''
+        if fmt == 'JPEG':
+            return self.jpegQuality
+        if fmt == 'PNG':
+            return pngQuality(self.pngCompression)
+        if fmt == 'WEBP':
+            # 100 is lossless
+            return 100
+        return -1
+
+    def outputFormat(self, fp):
+        return formatForPath(fp) if self.format == 'Source' else self.format
+
+    def outputPath(self, fp):
+        '''fp with the suffix of the output format'''
+        fp = Path(fp)
+        return fp if self.format == 'Source' else fp.with_suffix(suffixes[self.format])
+
+    def save(self, source, fp, fmt=None):
+        '''Encodes source (see encodeImage) to fp in the background, in fmt or the output format'''
+        fp = Path(fp)
+        job = (source, fp, fmt or self.outputFormat(fp))
+
+        if self._busySince is None:
+            self._busySince = time.perf_counter()
+
+        # only the latest of several saves of a path needs writing
+        if fp in self._writing:
+            self._waiting[fp] = job
+        else:
+            self._start(job)
+
+    def _start(self, job):
+        source, fp, fmt = job
+        if self.threadPool is None:
+            self.threadPool = QThreadPool(self)
+            self.threadPool.setMaxThreadCount(os.cpu_count() or 1)
+
+        self._writing.add(fp)
+        worker = Worker(encodeImage, source, fp, fmt, self.quality(fmt))
+        worker.signals.result.connect(self._written)
+        self.threadPool.start(worker)
+
+    @pyqtSlot(object)
+    def _written(self, result):
+        fp, nbytes, seconds, error = result
+        self._writing.discard(fp)
+
+        if error is None:
+            self._images += 1
+            self._bytes += nbytes
+            self.imageWritten.emit(fp, nbytes)
+        else:
+            self._failed += 1
+            self.writeFailed.emit(fp, error)
+
+        if fp in self._waiting:
+            self._start(self._waiting.pop(fp))
+        elif not self._writing:
+            self._busySeconds += time.perf_counter() - self._busySince
+            self._busySince = None
+            self.allWritten.emit()
+
+    def isBusy(self):
+        return bool(self._writing)
+
+    def waitForDone(self):
+        '''Blocks until everything asked for is written, e.g. before quitting'''
+        while self._writing:
+            self.threadPool.waitForDone()
+            # deliver the results, which may start waiting saves
+            QCoreApplication.processEvents()
+
+    def report(self):
+        '''Images and bytes written so far, and the rate they were written at'''
+        seconds = self._busySeconds
+        if self._busySince is not None:
+            seconds += time.perf_counter() - self._busySince
+
+        text = f'{self._images} images, {formatBytes(self._bytes)} in {seconds:.1f} s'
+        if seconds > 0:
+            text += f' ({self._images / seconds:.1f} images/s, {formatBytes(self._bytes / seconds)}/s)'
+        if self._failed:
+            text += f', {self._failed} failed'
+        return text
+
+    def resetReport(self):
+        self._images = 0
+        self._bytes = 0
+        self._failed = 0
+        self._busySeconds = 0.0
+        if self._busySince is not None:
+            self._busySince = time.perf_counter()
+
+
+imageEncoder = QImageEncoder()
@@ -0,0 +1,220 @@
+'''Background estimation of the overlap between consecutive transect frames.
+
+When a grid is loaded a small grayscale signature of its image is made on
+the thread pool, and once a neighbouring frame has one too the offset
+between them is found by phase correlation (see PhaseCorrelation.py).
+
+Offsets are cached per image pair, in memory and in overlaps.json in the
+tile cache folder, and are dropped when either image changes.
+'''
+
+import json
+from collections import OrderedDict
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QThreadPool, QRect, pyqtSignal, pyqtSlot
+
+import TileCache
+from QWorker import Worker
+from Tracing import span
+
+cacheName = 'overlaps.json'
+
+# signatures kept around for frames loaded later. one evicted before its
+# pairs are estimated is made again from its grid when it is needed
+maxSignatures = 8
+
+
+def computeSignature(imgPath, tileArrays):
+    # imported here so numpy loads with the first frame, not at startup
+    import PhaseCorrelation
+
+    with span('overlap signature', path=imgPath):
+        return imgPath, PhaseCorrelation.signature(tileArrays)
+
+
+def computeOffset(pair, a, b):
+    import PhaseCorrelation
+
+    with span('phase correlation', previous=pair[0], current=pair[1]):
+        return pair, PhaseCorrelation.estimateOffset(a, b)
+
+
+def _cacheFile(imgPath):
+    return Path(imgPath).parent / TileCache.cacheDirName / cacheName
+
+
+def _cacheKey(pair):
+    return '|'.join(Path(fp).name for fp in pair)
+
+
+class QOverlapEstimator(QObject):
+
+    # signals
+    overlapEstimated = pyqtSignal(object) # (previous image path, image path)
+
+    def __init__(self, imageGrids, parent=None):
+        super().__init__(parent)
+
+        self.imageGrids = imageGrids
+
+        # image path -> signature, most recently made last
+        self._signatures = OrderedDict()
+        # image path -> (width, height)
+        self._sizes = {}
+        # (previous path, path) -> (dx, dy, confidence) or None if they don't overlap
+        self._offsets = {}
+        # image paths whose signatures, and pairs whose offsets, are being made
+        self._pendingSignatures = set()
+        self._pendingPairs = set()
+
+        # cache file -> its entries
+        self._diskCaches = {}
+
+        self.threadPool = QThreadPool.globalInstance()
+
+    def pairs(self, imgPath):
+        '''The (previous, current) image path pairs imgPath is part of'''
+        paths = [str(grid.imgPath) for grid in self.imageGrids.grids()]
+        try:
+            index = paths.index(imgPath)
+        except ValueError:
+            return []
+
+        pairs = []
+        if index > 0:
+            pairs.append((paths[index - 1], imgPath))
+        if index < len(paths) - 1:
+            pairs.append((imgPath, paths[index + 1]))
+        return pairs
+
+    def gridLoaded(self, grid):
+        imgPath = str(grid.imgPath)
+        self._sizes[imgPath] = self._gridImageSize(grid)
+
+        pairs = self.pairs(imgPath)
+        if all(self.isEstimated(pair) for pair in pairs):
+            return
+        if imgPath in self._signatures:
+            self._estimatePairs(pairs)
+        else:
+            self._makeSignature(grid)
+
+    def _makeSignature(self, grid):
+        imgPath = str(grid.imgPath)
+        if imgPath in self._pendingSignatures:
+            return
+
+        self._pendingSignatures.add(imgPath)
+        worker = Worker(computeSignature, imgPath, grid.tileArrays())
+        worker.signals.result.connect(self._signatureMade)
+        self.threadPool.start(worker)
+
+    def _loadedGrid(self, imgPath):
+        for grid in self.imageGrids.grids():
+            if str(grid.imgPath) == imgPath:
+                return grid if grid.isLoaded() else None
+        return None
+
+    def _gridImageSize(self, grid):
+        arrays = grid.tileArrays()
+        height = sum(row[0].shape[0] for row in arrays)
+        width = sum(array.shape[1] for array in arrays[0])
+        return width, height
+
+    @pyqtSlot(object)
+    def _signatureMade(self, result):
+        imgPath, signature = result
+        self._pendingSignatures.discard(imgPath)
+
+        self._signatures[imgPath] = signature
+        while len(self._signatures) > maxSignatures:
+            # oldest first, but those with pairs left to estimate last
+            done = [fp for fp in self._signatures if all(self.isEstimated(pair) for pair in self.pairs(fp))]
+            del self._signatures[done[0] if done else next(iter(self._signatures))]
+
+        self._estimatePairs(self.pairs(imgPath))
+
+    def _estimatePairs(self, pairs):
+        for pair in pairs:
+            if self.isEstimated(pair) or pair in self._pendingPairs:
+                continue
+
+            missing = [fp for fp in pair if fp not in self._signatures]
+            if missing:
+                # evicted, or never made if the frame loaded first. frames
+                # not loaded yet make theirs when they are
+                for fp in missing:
+                    grid = self._loadedGrid(fp)
+                    if grid is not None:
+                        self._makeSignature(grid)
+                continue
+
+            self._pendingPairs.add(pair)
+            worker = Worker(computeOffset, pair, self._signatures[pair[0]], self._signatures[pair[1]])
+            worker.signals.result.connect(self._offsetEstimated)
+            self.threadPool.start(worker)
+
+    @pyqtSlot(object)
+    def _offsetEstimated(self, result):
+        pair, offset = result
+        self._pendingPairs.discard(pair)
+        self._offsets[pair] = offset
+        self._saveToDisk(pair, offset)
+        self.overlapEstimated.emit(pair)
+
+    def isEstimated(self, pair):
+        return pair in self._offsets or self._loadFromDisk(pair)
+
+    def offset(self, pair):
+        '''Returns (dx, dy, confidence) of the second image relative to the first,
+        None if they don't overlap or it isn't known yet'''
+        if self.isEstimated(pair):
+            return self._offsets[pair]
+        return None
+
+    def overlapRect(self, previousPath, imgPath):
+        '''The part of the image at imgPath also seen in the previous frame, or None'''
+        offset = self.offset((previousPath, imgPath))
+        size = self._sizes.get(imgPath)
+        if offset is None or size is None:
+            return None
+
+        dx, dy, _ = offset
+        rect = QRect(0, 0, *size)
+        overlap = rect.translated(dx, dy) & rect
+        return None if overlap.isEmpty() else overlap
+
+    def _diskCache(self, imgPath):
+        fp = _cacheFile(imgPath)
+        if fp not in self._diskCaches:
+            try:
+                with open(fp) as f:
+                    self._diskCaches[fp] = json.load(f)
+            except (OSError, ValueError):
+                self._diskCaches[fp] = {}
+        return fp, self._diskCaches[fp]
+
+    def _loadFromDisk(self, pair):
+        _, entries = self._diskCache(pair[1])
+        entry = entries.get(_cacheKey(pair))
+        if entry is None or entry['stamps'] != [TileCache.fileStamp(pair[0]), TileCache.fileStamp(pair[1])]:
+            return False
+
+        self._offsets[pair] = None if entry['offset'] is None else tuple(entry['offset'])
+        return True
+
+    def _saveToDisk(self, pair, offset):
+        fp, entries = self._diskCache(pair[1])
+        entries[_cacheKey(pair)] = {
+            'stamps': [TileCache.fileStamp(pair[0]), TileCache.fileStamp(pair[1])],
+            'offset': None if offset is None else list(offset),
+        }
+
+        try:
+            fp.parent.mkdir(parents=True, exist_ok=True)
+            with open(fp, 'w') as f:
+                json.dump(entries, f)
+        except OSError:
+            # a read only survey still gets offsets for this session
+            pass
@@ -0,0 +1,79 @@
+'''Perceptual hashes of frames, and a BK-tree to find near duplicates quickly.
+
+The hash is a 64 bit difference hash (dHash) of a thumbnail: whether each
+of 8 x 9 block means is brighter than its neighbour to the right. Copies
+of a frame, re-encoded or not, land within a few bits of each other.
+'''
+
+
+def hamming(a, b):
+    return bin(a ^ b).count('1')
+
+
+def dhash(tileArrays):
+    '''64 bit difference hash of an image from its rows x cols tile arrays'''
+    # imported here so numpy loads with the first frame, not at startup
+    import numpy as np
+    from PhaseCorrelation import signature
+
+    thumbnail = signature(tileArrays)
+    blocks = np.array([
+        [block.mean() for block in np.array_split(row, 9, axis=1)]
+        for row in np.array_split(thumbnail, 8, axis=0)
+    ])
+
+    bits = (blocks[:, 1:] > blocks[:, :-1]).flatten()
+    return sum(1 << i for i, bit in enumerate(bits) if bit)
+
+
+class BKTree:
+    '''Metric tree over hashes, for lookups within a Hamming distance.
+
+    Each node's children are keyed by their distance to it, so a search
+    only descends into children whose key is within maxDistance of the
+    query's distance to the node.
+    '''
+
+    def __init__(self):
+        # node: [hash, items, {distance: node}]
+        self._root = None
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def add(self, h, item):
+        self._size += 1
+        if self._root is None:
+            self._root = [h, [item], {}]
+            return
+
+        node = self._root
+        while True:
+            distance = hamming(h, node[0])
+            if distance == 0:
+                node[1].append(item)
+                return
+
+            child = node[2].get(distance)
+            if child is None:
+                node[2][distance] = [h, [item], {}]
+                return
+            node = child
+
+    def search(self, h, maxDistance):
+        '''Returns [(distance, item)] for hashes within maxDistance of h, closest first'''
+        found = []
+        stack = [self._root] if self._root is not None else []
+
+        while stack:
+            node = stack.pop()
+            distance = hamming(h, node[0])
+            if distance <= maxDistance:
+                found.extend((distance, item) for item in node[1])
+
+            for childDistance, child in node[2].items():
+                if distance - maxDistance <= childDistance <= distance + maxDistance:
+                    stack.append(child)
+
+        return sorted(found, key=lambda f: f[0])
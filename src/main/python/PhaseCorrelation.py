@@ -0,0 +1,63 @@
+'''Translation between two overlapping frames by phase correlation.
+
+Frames are compared as small grayscale signatures, so an estimate costs a
+couple of FFTs of a few hundred pixels a side. Offsets are only as precise
+as the downsampling, which is plenty for outlining the overlap.
+'''
+
+import numpy as np
+
+from CandidateDetector import blockMean, luminance
+
+downsample = 16
+
+# correlation peak below which the frames are taken not to overlap
+minConfidence = 0.05
+
+
+def signature(tileArrays):
+    '''Downsampled grayscale of a whole image from its rows x cols tile arrays'''
+    rows = [np.hstack([blockMean(luminance(array), downsample) for array in arrayRow]) for arrayRow in tileArrays]
+    width = min(row.shape[1] for row in rows)
+    return np.vstack([row[:, :width] for row in rows])
+
+
+def phaseCorrelate(a, b):
+    '''Returns (dx, dy, confidence) such that b(y, x) matches a(y - dy, x - dx).
+
+    Offsets are in signature pixels. confidence is the height of the
+    normalized correlation peak, from 0 to 1.
+    '''
+    height = min(a.shape[0], b.shape[0])
+    width = min(a.shape[1], b.shape[1])
+    a = a[:height, :width]
+    b = b[:height, :width]
+
+    # taper the edges so the image borders don't correlate with each other
+    window = np.outer(np.hanning(height), np.hanning(width))
+    fa = np.fft.rfft2((a - a.mean()) * window)
+    fb = np.fft.rfft2((b - b.mean()) * window)
+
+    cross = fb * np.conj(fa)
+    cross /= np.maximum(np.abs(cross), 1e-9)
+    correlation = np.fft.irfft2(cross, s=(height, width))
+
+    dy, dx = np.unravel_index(np.argmax(correlation), correlation.shape)
+    confidence = float(correlation[dy, dx])
+
+    # shifts past halfway wrap around to negative ones
+    if dy > height // 2:
+        dy -= height
+    if dx > width // 2:
+        dx -= width
+
+    return int(dx), int(dy), confidence
+
+
+def estimateOffset(a, b):
+    '''Returns the (dx, dy, confidence) of b relative to a in full image pixels,
+    or None if they don't appear to overlap'''
+    dx, dy, confidence = phaseCorrelate(a, b)
+    if confidence < minConfidence:
+        return None
+    return dx * downsample, dy * downsample, confidence
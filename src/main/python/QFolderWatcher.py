@@ -0,0 +1,153 @@
+'''Watches a transect folder for images arriving while annotators work.
+
+Filesystem notifications are debounced, and a file is only picked up once
+its size has stopped changing, so images still being copied off the drone
+are left alone. New images are decoded on the thread pool and handed back
+in file name order.
+'''
+
+from pathlib import Path
+
+from PyQt5.QtCore import QObject, QFileSystemWatcher, QThreadPool, QTimer, pyqtSignal, pyqtSlot
+from PyQt5.QtGui import QImage
+
+from QImageGrid import inkPath, isInked, removePathInk
+from QWorker import Worker
+from Tracing import span
+
+imageSuffixes = ('.png', '.jpeg', '.jpg', '.bmp', '.gif')
+
+
+def decodeImage(imgPath):
+    with span('decode', path=str(imgPath)):
+        return imgPath, QImage(str(imgPath))
+
+
+class QFolderWatcher(QObject):
+
+    # signals
+    imageReady = pyqtSignal(object, object, QImage) # image path, base path or None, image
+
+    # time (ms) to wait for the folder to go quiet before scanning it
+    debounceInterval = 1000
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self.directory = None
+
+        self._watcher = QFileSystemWatcher(self)
+        self._watcher.directoryChanged.connect(self.scheduleScan)
+
+        self._scanTimer = QTimer(self)
+        self._scanTimer.setSingleShot(True)
+        self._scanTimer.setInterval(self.debounceInterval)
+        self._scanTimer.timeout.connect(self.scan)
+
+        # paths already open or handed out, by the path grids are opened from
+        self._known = set()
+        # path -> size at the last scan, for files that may still be copying
+        self._sizes = {}
+
+        # decoded images are handed out in this order
+        self._queue = []
+        self._decoded = {}
+
+    def isWatching(self):
+        return self.directory is not None
+
+    def watch(self, directory, knownPaths=()):
+        '''Starts watching directory. Images in knownPaths, or their inked
+        versions, are never opened again'''
+        self.stop()
+
+        self.directory = Path(directory)
+        self._known = {Path(fp) for fp in knownPaths}
+        self._watcher.addPath(str(self.directory))
+
+        # pick up whatever is already there
+        self.scan()
+
+    def markKnown(self, paths):
+        '''Images opened some other way while watching, which aren't opened again'''
+        for fp in paths:
+            fp = Path(fp)
+            self._known.add(fp)
+            self._sizes.pop(fp, None)
+
+    def stop(self):
+        if self.directory is not None:
+            self._watcher.removePath(str(self.directory))
+        self.directory = None
+        self._scanTimer.stop()
+        self._sizes.clear()
+        self._queue.clear()
+        self._decoded.clear()
+
+    def scheduleScan(self):
+        self._scanTimer.start()
+
+    def scan(self):
+        if self.directory is None:
+            return
+
+        sizes = {}
+        for fp in sorted(self.directory.iterdir()):
+            if fp.suffix.lower() not in imageSuffixes or self._isKnown(fp):
+                continue
+            try:
+                sizes[fp] = fp.stat().st_size
+            except OSError:
+                continue
+
+        # a file is complete once its size held still between two scans
+        ready = [fp for fp, size in sizes.items() if size > 0 and self._sizes.get(fp) == size]
+        self._sizes = {fp: size for fp, size in sizes.items() if fp not in ready}
+
+        for fp in ready:
+            self._add(fp, sizes)
+
+        # copies don't always touch the directory, so look again until they settle
+        if self._sizes:
+            self._scanTimer.start()
+
+    def _isKnown(self, fp):
+        if fp in self._known:
+            return True
+        # an opened inked image covers its base image and the other way round
+        if isInked(fp):
+            return removePathInk(fp) in self._known
+        return inkPath(fp) in self._known
+
+    def _add(self, fp, sizes):
+        if self._isKnown(fp):
+            return
+
+        # wait for the inked version instead if it is there too
+        if not isInked(fp) and inkPath(fp) in sizes:
+            return
+
+        self._known.add(fp)
+        self._queue.append(fp)
+
+        worker = Worker(decodeImage, fp)
+        worker.signals.result.connect(self._imageDecoded)
+        QThreadPool.globalInstance().start(worker)
+
+    @pyqtSlot(object)
+    def _imageDecoded(self, result):
+        fp, image = result
+        if fp not in self._queue:
+            # stopped watching while it was decoding
+            return
+
+        self._decoded[fp] = image
+
+        while self._queue and self._queue[0] in self._decoded:
+            fp = self._queue.pop(0)
+            image = self._decoded.pop(fp)
+            if image.isNull():
+                continue
+
+            basePath = removePathInk(fp) if isInked(fp) else None
+            self.imageReady.emit(fp, basePath, image)
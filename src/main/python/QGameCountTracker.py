@@ -11,7 +11,8 @@ from PyQt5.QtWidgets import (
     QListWidgetItem
 )
 
-from JSONTools import ObjectEncoder
+from ResourceCache import cachedIcon
+from Tracing import span
 
 class GameCountData:
 
@@ -248,10 +249,10 @@ class QGameCountInputForm(QWidget):
 
 class QGameCountTracker(QListWidget):
 
-    def __init__(self):
+    def __init__(self, appContext=None):
         super().__init__()
 
-        self._appContext = None
+        self._appContext = appContext
         self.addAnimalForm = QGameCountInputForm()
         self.addAnimalForm.animalAdded.connect(self.addAnimalData)
         self.addAnimalForm.animalAdded.connect(self.dump)
@@ -262,6 +263,9 @@ class QGameCountTracker(QListWidget):
 
         self.counts = MultiGameCountTracker()
 
+        # file name -> file name of the frame it looks like a copy of
+        self.duplicateFrames = {}
+
         self.createActions()
 
         self.toolbar = QToolBar()
@@ -328,19 +332,30 @@ class QGameCountTracker(QListWidget):
         if self.summaryFile is None:
             self.summaryFile = self.JSONDumpFile.parent / Path('count summary.txt')
 
-        self.JSONDumpFile.touch()
-        self.summaryFile.touch()
-        
-        with open(self.JSONDumpFile, 'w') as f:
-            f.write(self.serialize())
+        with span('tracker dump', path=str(self.JSONDumpFile)):
+            self.JSONDumpFile.touch()
+            self.summaryFile.touch()
+
+            with open(self.JSONDumpFile, 'w') as f:
+                f.write(self.serialize())
 
-        with open(self.summaryFile, 'w') as f:
-            f.write(self.summarize())
+            with open(self.summaryFile, 'w') as f:
+                f.write(self.summarize())
 
     def summarize(self):
         s = self.counts.totalsSummary()
         s += '\n-------------------------\n'
         s += str(self.counts)
+        if self.duplicateFrames:
+            s += '\n-------------------------\n'
+            s += self.duplicatesSummary()
+        return s
+
+    def duplicatesSummary(self):
+        s = 'Possible duplicate frames:\n'
+        for fileName, original in sorted(self.duplicateFrames.items()):
+            counted = ' (counted)' if fileName in self.counts else ''
+            s += f'{fileName} looks like {original}{counted}\n'
         return s
 
     def displaySummary(self):
@@ -354,9 +369,13 @@ class QGameCountTracker(QListWidget):
                 + '\n-------------------------\n'
                 + self.counts.toHTML())
 
+        if self.duplicateFrames:
+            summary += '<p><b>' + self.duplicatesSummary().replace('\n', '<br>') + '</b></p>'
+
         QMessageBox.about(self, 'Count Summary', summary)
 
     def serialize(self):
+        from JSONTools import ObjectEncoder
         return json.dumps(self.counts, cls=ObjectEncoder, indent=2, sort_keys=True)
 
     def clearData(self):
@@ -396,8 +415,8 @@ class QGameCountTracker(QListWidget):
             clearFp = self.appContext.get_resource('eraserIcon.png')
             infoFp = self.appContext.get_resource('infoIcon.png')
 
-        self.clearDataAct = QAction(QIcon(clearFp), '&Delete All Animal Counts', self, triggered=self.clearData)
-        self.summarizeAct = QAction(QIcon(infoFp), '&Summarize', self, shortcut=Qt.Key_S, triggered=self.displaySummary)
+        self.clearDataAct = QAction(cachedIcon(clearFp), '&Delete All Animal Counts', self, triggered=self.clearData)
+        self.summarizeAct = QAction(cachedIcon(infoFp), '&Summarize', self, shortcut=Qt.Key_S, triggered=self.displaySummary)
 
     def initToolbar(self):
         self.toolbar.addAction(self.summarizeAct)
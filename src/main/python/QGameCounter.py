@@ -1,27 +1,44 @@
 from pathlib import Path
 
-from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QThreadPool, QFile, QTextStream, QCoreApplication, QSettings, QSize, QPoint
+from PyQt5.QtCore import Qt, pyqtSlot, pyqtSignal, QThreadPool, QFile, QTextStream, QCoreApplication, QSettings, QSize, QPoint, QTimer
 from PyQt5.QtGui import QKeySequence, QIcon, QImage, QPixmap, QKeyEvent, QGuiApplication
 from PyQt5.QtWidgets import (
     QMessageBox, QMainWindow, QShortcut,
     QMenu, QAction, qApp,
     QGraphicsScene, QGraphicsView, QGraphicsItem,
-    QDockWidget, QWidget, QToolBar, QFileDialog
+    QDockWidget, QWidget, QToolBar, QFileDialog, QLabel, QInputDialog
 )
 
 from QImageGrid import QImageGridViewer
 from QImagePainter import QImagePainter
 from QGameCountTracker import QGameCountTracker
-from QWorker import Worker
+from QFolderWatcher import QFolderWatcher
+import TransectCatalog
+from ResourceCache import cachedIcon, cachedStyleSheet
+from QMemoryAccounting import memoryAccounting, formatBytes
+import ImageEncoder
+from ImageEncoder import imageEncoder
+import Tracing
 
 class QGameCounter(QMainWindow):
 
-    def __init__(self):
+    def __init__(self, appContext=None):
         super().__init__()
 
-        self.imageGridViewer = QImageGridViewer()
-        self.imagePainter = QImagePainter()
-        self.tracker = QGameCountTracker()
+        # normally given by the fbs run function, so everything
+        # is built with its resources in one pass
+        self._appContext = appContext
+        self._version = None
+
+        # built up front: the tracker holds the counts as well as showing them,
+        # and sessions, saves and the menus use it before its dock is ever shown
+        self.imageGridViewer = QImageGridViewer(appContext)
+        self.imagePainter = QImagePainter(appContext)
+        self.tracker = QGameCountTracker(appContext)
+        self.folderWatcher = QFolderWatcher(self)
+
+        # whether the encoder is writing an export, reported when it is done
+        self._exporting = False
 
         self.setCentralWidget(self.imagePainter)
 
@@ -43,10 +60,9 @@ class QGameCounter(QMainWindow):
 
         self.setCorner(Qt.BottomRightCorner, Qt.RightDockWidgetArea)
 
-        # should be overwritten by the fbs run function
-        self._appContext = None
-        self._version = None
-        
+        self.memoryLabel = QLabel()
+        self.statusBar().addPermanentWidget(self.memoryLabel)
+
         self.stylesheetPath = 'QMainWindowStyle.qss'
         self.readStyleSheet()
 
@@ -68,8 +84,16 @@ class QGameCounter(QMainWindow):
         QCoreApplication.setApplicationName('Game Counter')
         self.readSettings()
 
+        # after the window is up, so it shows before any image is decoded
+        if self.restoreSessionAct.isChecked():
+            QTimer.singleShot(0, self.restoreSession)
+
     def closeEvent(self, event):
         self.writeSettings()
+        self.imageGridViewer.decoder.shutdown()
+
+        # inked images still being encoded
+        imageEncoder.waitForDone()
         event.accept()
 
     @property
@@ -106,18 +130,14 @@ class QGameCounter(QMainWindow):
     def readStyleSheet(self):
         if self.appContext is not None:
             fp = self.appContext.get_resource(self.stylesheetPath)
-            f = QFile(fp)
-            f.open(QFile.ReadOnly | QFile.Text)
-            stream = QTextStream(f)
-            self.setStyleSheet(stream.readAll())
-            # f.close()
+            self.setStyleSheet(cachedStyleSheet(fp))
 
     def setWindowIconFbs(self):
         if self.appContext is None:
             fp = '../icons/mainWindowIcon.png'
         else:
             fp = self.appContext.get_resource('mainWindowIcon.png')
-        self.setWindowIcon(QIcon(fp))
+        self.setWindowIcon(cachedIcon(fp))
 
     def writeSettings(self):
         settings = QSettings()
@@ -138,13 +158,86 @@ class QGameCounter(QMainWindow):
         settings.beginGroup('ImageGrid')
         settings.setValue('rows', self.imageGridViewer.rows)
         settings.setValue('cols', self.imageGridViewer.cols)
+        settings.setValue('skipFeatureless', self.imageGridViewer.skipFeatureless)
+        settings.setValue('featurelessThreshold', self.imageGridViewer.featurelessThreshold)
+        settings.setValue('useTileStore', self.imageGridViewer.useTileStore)
+        settings.endGroup()
+
+        settings.beginGroup('Memory')
+        settings.setValue('threshold', memoryAccounting.threshold)
+        settings.endGroup()
+
+        settings.beginGroup('Encoder')
+        settings.setValue('format', imageEncoder.format)
+        settings.setValue('jpegQuality', imageEncoder.jpegQuality)
+        settings.setValue('pngCompression', imageEncoder.pngCompression)
         settings.endGroup()
 
         settings.beginGroup('ImagePainter')
         settings.setValue('penWidth', self.imagePainter.penWidth)
         settings.setValue('penColor', self.imagePainter.penColor)
+        settings.setValue('stampSize', self.imagePainter.stampSize)
+        settings.setValue('historyMemoryLimit', self.imagePainter.historyMemoryLimit)
+        settings.setValue('cachedRendering', self.imagePainter.cachedRendering)
+        settings.setValue('showMinimap', self.imagePainter.showMinimap)
+        settings.setValue('showCandidates', self.imagePainter.showCandidates)
+        settings.setValue('showOverlap', self.imagePainter.showOverlap)
         settings.endGroup()
 
+        self.writeSession(settings)
+
+    def writeSession(self, settings):
+        index, row, col = self.imageGridViewer.focusedPosition()
+
+        settings.beginGroup('Session')
+        settings.setValue('restore', self.restoreSessionAct.isChecked())
+        settings.setValue('files', [str(fp) for fp in self.imageGridViewer.openedPaths()])
+        settings.setValue('gridIndex', index)
+        settings.setValue('row', row)
+        settings.setValue('col', col)
+        if self.tracker.JSONDumpFile is None:
+            settings.setValue('countsFile', '')
+        else:
+            settings.setValue('countsFile', str(self.tracker.JSONDumpFile))
+        settings.endGroup()
+
+    def restoreSession(self):
+        '''Reopens the images and counts from the last session.
+
+        Grids are opened as placeholders and only the focused one is decoded,
+        the rest are decoded as they are first focused or clicked.
+        '''
+        if self.imageGridViewer.count() != 0:
+            return
+
+        settings = QSettings()
+        settings.beginGroup('Session')
+        filePaths = [Path(fp) for fp in settings.value('files', [], type=list)]
+        index = settings.value('gridIndex', 0, type=int)
+        row = settings.value('row', 0, type=int)
+        col = settings.value('col', 0, type=int)
+        countsFile = settings.value('countsFile', '')
+        settings.endGroup()
+
+        filePaths = [fp for fp in filePaths if fp.exists()]
+        if not filePaths:
+            return
+
+        with Tracing.span('restore session', files=len(filePaths)):
+            catalog = TransectCatalog.readCatalog(filePaths)
+            self.imageGridViewer.openFiles(filePaths, lazy=True, catalog=catalog)
+            self.imageGridViewer.focusItem(index, row, col)
+            self.imagePainter.centerImage()
+
+            if countsFile:
+                countsFile = Path(countsFile)
+                if countsFile.exists():
+                    self.tracker.load(countsFile)
+                else:
+                    self.tracker.JSONDumpFile = countsFile
+            else:
+                self.tracker.JSONDumpFile = filePaths[0].parent / Path('counts.json')
+
     def readSettings(self):
         settings = QSettings()
 
@@ -182,14 +275,37 @@ class QGameCounter(QMainWindow):
         settings.beginGroup('ImageGrid')
         self.imageGridViewer.rows = settings.value('rows', 2)
         self.imageGridViewer.cols = settings.value('cols', 2)
+        self.imageGridViewer.skipFeatureless = settings.value('skipFeatureless', 'false')=='true'
+        self.imageGridViewer.featurelessThreshold = float(settings.value('featurelessThreshold', 1.0))
+        self.imageGridViewer.useTileStore = settings.value('useTileStore', 'false')=='true'
+        settings.endGroup()
+
+        settings.beginGroup('Memory')
+        memoryAccounting.threshold = int(settings.value('threshold', 3 * 1024**3))
+        settings.endGroup()
+
+        settings.beginGroup('Encoder')
+        imageEncoder.format = settings.value('format', 'Source')
+        imageEncoder.jpegQuality = int(settings.value('jpegQuality', 95))
+        imageEncoder.pngCompression = int(settings.value('pngCompression', 6))
         settings.endGroup()
 
         settings.beginGroup('ImagePainter')
         self.imagePainter.penWidth = settings.value('penWidth', 30)
+        self.imagePainter.stampSize = int(settings.value('stampSize', 100))
+        self.imagePainter.historyMemoryLimit = int(settings.value('historyMemoryLimit', 64 * 1024**2))
         if settings.contains('penColor'):
             self.imagePainter.setPenColor(settings.value('penColor'))
         else:
             self.imagePainter.setDefaultPenColor()
+        self.imagePainter.cachedRendering = settings.value('cachedRendering', 'true')=='true'
+        self.imagePainter.showMinimap = settings.value('showMinimap', 'true')=='true'
+        self.imagePainter.showCandidates = settings.value('showCandidates', 'true')=='true'
+        self.imagePainter.showOverlap = settings.value('showOverlap', 'true')=='true'
+        settings.endGroup()
+
+        settings.beginGroup('Session')
+        self.restoreSessionAct.setChecked(settings.value('restore', 'true')=='true')
         settings.endGroup()
 
     def resetSettings(self):
@@ -199,8 +315,56 @@ class QGameCounter(QMainWindow):
 
     @pyqtSlot(QPixmap)
     def changeMainImage(self, newPixmap):
-        self.imagePainter.setMainPixmap(newPixmap)
+        # hand the painter the tile's image, it makes its own pixmaps as needed
+        widget = self.imageGridViewer.imageGrids.getFocusedGrid().getFocusWidget()
+        self.imagePainter.editTarget = widget
+        if widget.isPreview():
+            # the full resolution tile follows once focus rests here, see gridLoaded
+            self.imagePainter.setPreviewImage(widget.image, widget.fullSize)
+        else:
+            self.imagePainter.setMainImage(widget.image)
         self.imagePainter.bestFitImage()
+        self.updateCandidateOverlay()
+        self.updateOverlapOverlay()
+
+    def gridLoaded(self, grid):
+        # swap the full resolution tile in for the preview, keeping the view
+        if grid is self.imageGridViewer.imageGrids.getFocusedGrid() and self.imagePainter.isPreviewing():
+            widget = grid.getFocusWidget()
+            self.imagePainter.editTarget = widget
+            self.imagePainter.setMainImage(widget.image)
+            self.updateCandidateOverlay()
+            self.updateOverlapOverlay()
+
+    def updateOverlapOverlay(self):
+        self.imagePainter.setOverlapRect(self.imageGridViewer.focusedOverlapRect())
+
+    def overlapEstimated(self, pair):
+        grid = self.imageGridViewer.imageGrids.getFocusedGrid()
+        if grid is not None and str(grid.imgPath) == pair[1]:
+            self.updateOverlapOverlay()
+
+    def duplicateFound(self, imgPath, original):
+        name, originalName = Path(imgPath).name, Path(original).name
+        self.tracker.duplicateFrames[name] = originalName
+        self.statusBar().showMessage(f'{name} looks like a copy of {originalName}', 10000)
+
+    def forgetDuplicates(self, grid):
+        name = Path(grid.imgPath).name
+        self.tracker.duplicateFrames = {
+            fileName: original for fileName, original in self.tracker.duplicateFrames.items()
+            if name not in (fileName, original)
+        }
+
+    def updateCandidateOverlay(self):
+        key = self.imageGridViewer.focusedTileKey()
+        candidates = self.imageGridViewer.analysis.candidates(key)
+        self.imagePainter.setCandidateBoxes([] if candidates is None else candidates.boxes)
+
+    def tileAnalyzed(self, key):
+        # the focused tile may have been shown before its analysis finished
+        if key == self.imageGridViewer.focusedTileKey():
+            self.updateCandidateOverlay()
 
     @pyqtSlot(QPixmap)
     def updateWindowTitle(self):
@@ -221,7 +385,8 @@ class QGameCounter(QMainWindow):
 
     def save(self):
         if self.imageGridViewer.count() != 0:
-            self.imagePainter.flattenImage()
+            if self.imagePainter.flattenImage() is None:
+                self.statusBar().showMessage('The frame is still loading, save it once it is shown', 5000)
             self.tracker.dump()
 
     def open(self):
@@ -237,6 +402,10 @@ class QGameCounter(QMainWindow):
             return
 
         self.fileDialogDirectory = filePaths[0].parent
+        self.openPaths(filePaths)
+
+    def openPaths(self, filePaths):
+        '''Opens images and, if given, a counts JSON file'''
 
         # remove JSON files from the paths
         JSONPaths: Path = []
@@ -249,21 +418,149 @@ class QGameCounter(QMainWindow):
                 imagePaths.append(fp)
 
         if imagePaths:
+            with Tracing.span('open', files=len(imagePaths)):
+                self.openImages(imagePaths)
 
-            # worker = Worker(self.imageGridViewer.openFiles, imagePaths)
-            # worker.signals.finished.connect(self.imageGridViewer.focusFirstGrid)
-            # worker.signals.finished.connect(self.imagePainter.centerImage)
-            # worker.signals.progress.connect(self.updateImageGridProgressBar)
+        if JSONPaths:
+            self.tracker.load(JSONPaths[0])
 
-            # self.threadpool.start(worker)
+    def openImages(self, imagePaths):
 
-            self.imageGridViewer.openFiles(imagePaths)
-            self.tracker.JSONDumpFile = imagePaths[0].parent / Path('counts.json')
-            self.imageGridViewer.focusFirstGrid()
-            self.imagePainter.centerImage()
+        # worker = Worker(self.imageGridViewer.openFiles, imagePaths)
+        # worker.signals.finished.connect(self.imageGridViewer.focusFirstGrid)
+        # worker.signals.finished.connect(self.imagePainter.centerImage)
+        # worker.signals.progress.connect(self.updateImageGridProgressBar)
 
-        if JSONPaths:
-            self.tracker.load(JSONPaths[0])
+        # self.threadpool.start(worker)
+
+        # read from the file headers, so no pixels are decoded to sort
+        catalog = TransectCatalog.readCatalog(imagePaths)
+        imagePaths = TransectCatalog.sortByCaptureTime(imagePaths, catalog)
+
+        # placeholders first, then the frames decode across cores
+        self.imageGridViewer.openFiles(imagePaths, lazy=True, catalog=catalog)
+        self.folderWatcher.markKnown(imagePaths)
+        self.tracker.JSONDumpFile = imagePaths[0].parent / Path('counts.json')
+        self.imageGridViewer.focusFirstGrid()
+        self.imagePainter.centerImage()
+        self.imageGridViewer.loadInBackground()
+
+    def toggleWatchFolder(self, checked):
+        if not checked:
+            self.folderWatcher.stop()
+            self.statusBar().showMessage('Stopped watching for new images', 5000)
+            return
+
+        directory = QFileDialog.getExistingDirectory(self, 'Watch transect folder', str(self.fileDialogDirectory))
+        if not directory:
+            self.watchFolderAct.setChecked(False)
+            return
+
+        directory = Path(directory)
+        self.fileDialogDirectory = directory
+        if self.tracker.JSONDumpFile is None:
+            self.tracker.JSONDumpFile = directory / Path('counts.json')
+
+        grids = self.imageGridViewer.imageGrids.grids()
+        knownPaths = [grid.imgPath for grid in grids] + [grid.baseImgPath for grid in grids]
+        self.folderWatcher.watch(directory, knownPaths)
+        self.statusBar().showMessage(f'Watching {directory} for new images')
+
+    def exportImages(self):
+        '''Writes every open frame to a folder in the output format, on the encoder's threads'''
+        if self.imageGridViewer.count() == 0:
+            return
+
+        directory = QFileDialog.getExistingDirectory(self, 'Export images', str(self.fileDialogDirectory))
+        if not directory:
+            return
+
+        self.imagePainter.flattenImageIfDrawnOn()
+        imageEncoder.resetReport()
+
+        exported = 0
+        for grid in self.imageGridViewer.imageGrids.grids():
+            fp = imageEncoder.outputPath(Path(directory) / Path(grid.imgPath).name)
+
+            # never write over the frames themselves
+            if fp.exists() and fp.samefile(grid.imgPath):
+                continue
+
+            # frames never decoded are read on the encoder's threads
+            source = grid.tileImages() if grid.isLoaded() else grid.imgPath
+            imageEncoder.save(source, fp)
+            exported += 1
+
+        self._exporting = exported > 0
+        self.statusBar().showMessage(f'Exporting {exported} images to {directory}...')
+
+    def imagesWritten(self):
+        if self._exporting:
+            self._exporting = False
+            self.statusBar().showMessage(f'Exported {imageEncoder.report()}', 15000)
+
+    def imageWriteFailed(self, fp, error):
+        self.statusBar().showMessage(f'Could not write {Path(fp).name}: {error}', 15000)
+
+    def promptForOutputFormat(self):
+        formats = ImageEncoder.supportedFormats()
+        current = formats.index(imageEncoder.format) if imageEncoder.format in formats else 0
+        fmt, okPressed = QInputDialog.getItem(self, 'Output Format',
+            'Format of exported images (inked images keep their own):', formats, current, False)
+        if not okPressed:
+            return
+        imageEncoder.format = fmt
+
+        if fmt in ('Source', 'JPEG'):
+            quality, okPressed = QInputDialog.getInt(self, 'Output Format',
+                'JPEG quality:', imageEncoder.jpegQuality, 1, 100, 1)
+            if okPressed:
+                imageEncoder.jpegQuality = quality
+        if fmt in ('Source', 'PNG'):
+            level, okPressed = QInputDialog.getInt(self, 'Output Format',
+                'PNG compression level (0 fastest, 9 smallest):', imageEncoder.pngCompression, 0, 9, 1)
+            if okPressed:
+                imageEncoder.pngCompression = level
+
+    def imageIngested(self, imgPath):
+        self.statusBar().showMessage(f'Added {Path(imgPath).name}', 5000)
+
+    def updateMemoryLabel(self):
+        self.memoryLabel.setText(f'Memory: {formatBytes(memoryAccounting.total())}')
+        self.memoryLabel.setToolTip(memoryAccounting.summary())
+
+    def memoryThresholdCrossed(self, total):
+        # shed what can be rebuilt: retained split images, and older undo history.
+        # the history is trimmed once, its configured limit is left as it is
+        self.imageGridViewer.imageGrids.releaseSplitImages()
+        self.imagePainter.history.enforceMemoryLimit(self.imagePainter.historyMemoryLimit // 2)
+
+        self.statusBar().showMessage(
+            f'Memory use {formatBytes(total)} is over the {formatBytes(memoryAccounting.threshold)} '
+            'warning threshold. Consider closing some images.', 15000)
+
+    def showMemoryUsage(self):
+        QMessageBox.about(self, 'Memory Usage', memoryAccounting.summaryHTML())
+
+    def promptForMemoryThreshold(self):
+        megabytes, okPressed = QInputDialog.getInt(self, 'Memory Warning',
+            'Warn when image memory exceeds (MB):', memoryAccounting.threshold // 1024**2, 256, 262144, 256)
+        if okPressed:
+            memoryAccounting.threshold = megabytes * 1024**2
+
+    def toggleTracing(self):
+        Tracing.setEnabled(self.recordTraceAct.isChecked())
+
+    def exportTrace(self):
+        fileName, _ = QFileDialog.getSaveFileName(self,
+            'Export trace', str(self.fileDialogDirectory / 'trace.json'),
+            'Chrome trace (*.json)')
+
+        if fileName:
+            Tracing.export(fileName)
+            QMessageBox.information(self, 'Trace Exported',
+                f'Wrote {Tracing.eventCount()} events to {fileName}.\n'
+                'Open it in chrome://tracing or ui.perfetto.dev')
 
     def openFile(self, fileName):
         self.imageGridViewer.openFile(fileName)
@@ -291,10 +588,23 @@ class QGameCounter(QMainWindow):
 
     def createConnections(self):
         self.imageGridViewer.imageGrids.focusChanged.connect(self.changeMainImage)
+        self.imageGridViewer.imageGrids.gridLoaded.connect(self.gridLoaded)
         self.imageGridViewer.imageGrids.focusChanged.connect(self.imagePainter.clearDrawnItems)
         self.imageGridViewer.imageGrids.focusChanged.connect(self.updateWindowTitle)
         self.imageGridViewer.imageGrids.focusChanged.connect(self.updateTrackerFile)
         self.imagePainter.imageFlattened.connect(self.imageGridViewer.changeFocusedImageData)
+        self.imagePainter.editTargetRequested.connect(self.imageGridViewer.imageGrids.focusImageLabel)
+        self.imageGridViewer.imageGrids.gridRemoved.connect(self.imagePainter.clearHistory)
+        self.imageGridViewer.imageGrids.gridRemoved.connect(self.forgetDuplicates)
+        self.folderWatcher.imageReady.connect(self.imageGridViewer.appendImage)
+        self.imageGridViewer.analysis.tileAnalyzed.connect(self.tileAnalyzed)
+        self.imageGridViewer.overlaps.overlapEstimated.connect(self.overlapEstimated)
+        self.imageGridViewer.frameIndex.duplicateFound.connect(self.duplicateFound)
+        self.folderWatcher.imageReady.connect(self.imageIngested)
+        memoryAccounting.usageChanged.connect(self.updateMemoryLabel)
+        memoryAccounting.thresholdCrossed.connect(self.memoryThresholdCrossed)
+        imageEncoder.allWritten.connect(self.imagesWritten)
+        imageEncoder.writeFailed.connect(self.imageWriteFailed)
 
     def createActions(self):
 
@@ -311,25 +621,36 @@ class QGameCounter(QMainWindow):
             openIconFp = self.appContext.get_resource('openIcon.png')
             saveIconFp = self.appContext.get_resource('saveIcon.png')
 
-        self.saveAct = QAction(QIcon(saveIconFp), 'Save', self, shortcut=QKeySequence.Save, triggered=self.save)
-        self.openAct = QAction(QIcon(openIconFp), '&Open...', self, shortcut=QKeySequence.Open, triggered=self.open)
+        self.saveAct = QAction(cachedIcon(saveIconFp), 'Save', self, shortcut=QKeySequence.Save, triggered=self.save)
+        self.openAct = QAction(cachedIcon(openIconFp), '&Open...', self, shortcut=QKeySequence.Open, triggered=self.open)
+        self.watchFolderAct = QAction('&Watch Folder...', self, checkable=True, triggered=self.toggleWatchFolder)
         self.exitAct = QAction('E&xit', self, shortcut='Ctrl+Q', triggered=self.close)
         self.aboutAct = QAction(f'&About', self, triggered=self.about)
         self.aboutQtAct = QAction('About &Qt', self, triggered=qApp.aboutQt)
         self.resetSettingsAct = QAction('Default Settings', self, triggered=self.resetSettings)
+        self.restoreSessionAct = QAction('Restore Last Session on Start', self, checkable=True, checked=True)
+        self.exportImagesAct = QAction('E&xport Images...', self, triggered=self.exportImages)
+        self.outputFormatAct = QAction('Set Output &Format...', self, triggered=self.promptForOutputFormat)
+
+        self.memoryUsageAct = QAction('&Memory Usage...', self, triggered=self.showMemoryUsage)
+        self.memoryThresholdAct = QAction('Set Memory Warning Threshold', self, triggered=self.promptForMemoryThreshold)
+
+        self.recordTraceAct = QAction('Record &Trace', self, checkable=True, checked=Tracing.isEnabled(), triggered=self.toggleTracing)
+        self.exportTraceAct = QAction('&Export Trace...', self, triggered=self.exportTrace)
 
         self.imageGridsToggle = self.imageGridDock.toggleViewAction()
         self.imageGridsToggle.setShortcut(Qt.CTRL + Qt.Key_G)
-        self.imageGridsToggle.setIcon(QIcon(gridIconFp))
+        self.imageGridsToggle.setIcon(cachedIcon(gridIconFp))
 
         self.addAnimalToggle = self.trackerAddDock.toggleViewAction()
-        self.addAnimalToggle.setIcon(QIcon(addAnimalFp))
+        self.addAnimalToggle.setIcon(cachedIcon(addAnimalFp))
 
         self.trackerViewToggle = self.trackerDock.toggleViewAction()
-        self.trackerViewToggle.setIcon(QIcon(trackerViewIconFp))
+        self.trackerViewToggle.setIcon(cachedIcon(trackerViewIconFp))
 
     def clearMenus(self):
         self.fileMenu.clear()
+        self.editMenu.clear()
         self.viewMenu.clear()
         self.helpMenu.clear()
 
@@ -339,6 +660,7 @@ class QGameCounter(QMainWindow):
 
     def createMenus(self):
         self.fileMenu = QMenu('&File', self)
+        self.editMenu = QMenu('&Edit', self)
         self.viewMenu = QMenu('&View', self)
         self.helpMenu = QMenu('&Help', self)
 
@@ -346,15 +668,34 @@ class QGameCounter(QMainWindow):
         
         self.fileMenu.addAction(self.saveAct)
         self.fileMenu.addAction(self.openAct)
+        self.fileMenu.addAction(self.watchFolderAct)
         self.fileMenu.addSeparator()
+        self.fileMenu.addAction(self.exportImagesAct)
+        self.fileMenu.addAction(self.outputFormatAct)
+        self.fileMenu.addSeparator()
+        self.fileMenu.addAction(self.restoreSessionAct)
         self.fileMenu.addAction(self.resetSettingsAct)
         self.fileMenu.addAction(self.exitAct)
 
+        self.editMenu.addAction(self.imagePainter.undoAct)
+        self.editMenu.addAction(self.imagePainter.redoAct)
+        self.editMenu.addSeparator()
+        self.editMenu.addAction(self.imagePainter.setHistoryMemoryLimitAct)
+        self.editMenu.addAction(self.memoryThresholdAct)
+
+        self.viewMenu.addAction(self.imagePainter.cachedRenderingAct)
+        self.viewMenu.addAction(self.imagePainter.showMinimapAct)
+        self.viewMenu.addAction(self.imagePainter.showCandidatesAct)
+        self.viewMenu.addAction(self.imagePainter.showOverlapAct)
         self.viewMenu.addSeparator()
         self.viewMenu.addAction(self.imageGridsToggle)
         self.viewMenu.addAction(self.addAnimalToggle)
         self.viewMenu.addAction(self.trackerViewToggle)
 
+        self.helpMenu.addAction(self.memoryUsageAct)
+        self.helpMenu.addAction(self.recordTraceAct)
+        self.helpMenu.addAction(self.exportTraceAct)
+        self.helpMenu.addSeparator()
         self.helpMenu.addAction(self.aboutAct)
         self.helpMenu.addAction(self.aboutQtAct)
 
@@ -363,6 +704,7 @@ class QGameCounter(QMainWindow):
     def arangeMenus(self):
 
         self.menuBar().addMenu(self.fileMenu)
+        self.menuBar().addMenu(self.editMenu)
         self.menuBar().addMenu(self.viewMenu)
         self.menuBar().addMenu(self.imageGridViewer.menu)
         self.menuBar().addMenu(self.tracker.menu)
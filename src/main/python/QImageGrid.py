@@ -1,10 +1,8 @@
-from fbs_runtime.application_context import ApplicationContext
-
 from pathlib import Path
 import re
 
-from PyQt5.QtCore import Qt, QSize, QFile, QTextStream, pyqtSignal, pyqtSlot, QObject
-from PyQt5.QtGui import QImage, QPixmap, QPalette, QPainter, QKeyEvent, QIcon
+from PyQt5.QtCore import Qt, QSize, QRect, QFile, QTextStream, QTimer, pyqtSignal, pyqtSlot, QObject, QThreadPool
+from PyQt5.QtGui import QImage, QPixmap, QPalette, QKeyEvent, QIcon
 from PyQt5.QtWidgets import (
     QLabel, QSizePolicy, QScrollArea, QMainWindow,
     QFileDialog, QWidget, QGridLayout, QVBoxLayout, QMessageBox,
@@ -12,6 +10,19 @@ from PyQt5.QtWidgets import (
 )
 
 from QImageGridErrors import MoveGridItemFocusError, MoveGridFocusError
+from ResourceCache import cachedIcon, cachedStyleSheet
+import TileCache
+import RawTileStore
+import TransectCatalog
+from Tracing import span
+from QMemoryAccounting import memoryAccounting, imageBytes, pixmapBytes
+from TileAnalysis import QTileAnalysis, tileKey
+from OverlapEstimation import QOverlapEstimator
+from FrameIndex import QFrameIndex
+from TraversalIndex import TraversalIndex
+from DecodeService import QDecodeService
+from QWorker import Worker
+from ImageEncoder import imageEncoder, formatForPath
 
 class QImageLabel(QLabel):
 
@@ -23,6 +34,12 @@ class QImageLabel(QLabel):
 
         self.imgPath = None
 
+        # size of the full resolution tile while a preview is shown
+        self.fullSize = None
+
+        # name memory is accounted under, normally the image file name
+        self.memoryGroup = None
+
         self.setBackgroundRole(QPalette.Base)
         self.setScaledContents(True)
 
@@ -32,7 +49,8 @@ class QImageLabel(QLabel):
 
     def readImage(self):
         # read in the image
-        image = QImage(str(self.imgPath))
+        with span('decode', path=str(self.imgPath)):
+            image = TileCache.toPixelFormat(QImage(str(self.imgPath)))
         if image.isNull():
             QMessageBox.information(self,
                 'Image Viewer',
@@ -47,36 +65,113 @@ class QImageLabel(QLabel):
     def setImage(self, image: QImage):
         # save the image
         self.image = image
+        self.fullSize = None
 
         # get the original image size & AR
         self.originalSize = image.size()
         self.originalAR = self.originalSize.height() / self.originalSize.width()
 
         # set the image into the label
-        self.setPixmap(QPixmap.fromImage(image))
+        with span('pixmap upload', width=image.width(), height=image.height()):
+            self.setPixmap(QPixmap.fromImage(image))
+
+        memoryAccounting.track(self, 'images', imageBytes(image), self.memoryGroup)
+        memoryAccounting.track(self, 'label pixmaps', pixmapBytes(self.pixmap()), self.memoryGroup)
+
+    def setPreview(self, image: QImage, fullSize: QSize):
+        '''Shows a low resolution stand in for a tile of fullSize, until setImage'''
+        self.setImage(image)
+        self.fullSize = fullSize
+
+    def isPreview(self):
+        return self.fullSize is not None
 
     def heightForWidth(self, w):
         return w * self.originalAR
 
+    def array(self, writable=False):
+        '''The image as a NumPy array sharing its memory, see ImageBuffer'''
+        from ImageBuffer import imageToArray
+        return imageToArray(self.image, writable)
+
     def highlight(self):
         self.setProperty('highlighted', True)
+        self.repolish()
 
     def clearHighlight(self):
         self.setProperty('highlighted', False)
+        self.repolish()
+
+    def setDuplicate(self, duplicate):
+        if self.property('duplicate') != duplicate:
+            self.setProperty('duplicate', duplicate)
+            self.repolish()
+
+    def setFeatureless(self, featureless):
+        if self.property('featureless') != featureless:
+            self.setProperty('featureless', featureless)
+            self.repolish()
+
+    def repolish(self):
+        # re-apply the style sheet to this label only, after a property change
+        self.style().unpolish(self)
+        self.style().polish(self)
+        self.update()
 
     def mouseReleaseEvent(self, event):
         self.clicked.emit()
 
+class QPlaceholderLabel(QLabel):
+    '''Stands in for an image that isn't loaded yet, at the image's aspect ratio'''
+
+    def __init__(self, text):
+        super().__init__(text)
+
+        self.aspectRatio = 2 / 3
+
+        self.setAlignment(Qt.AlignCenter)
+        self.setWordWrap(True)
+
+        sizePolicy = QSizePolicy(QSizePolicy.Preferred, QSizePolicy.Preferred)
+        sizePolicy.setHeightForWidth(True)
+        self.setSizePolicy(sizePolicy)
+
+    def setImageSize(self, width, height):
+        if width and height:
+            self.aspectRatio = height / width
+            self.updateGeometry()
+
+    def heightForWidth(self, w):
+        return w * self.aspectRatio
+
 class QImageGrid(QWidget):
 
+    # signals
+    labelsCreated = pyqtSignal(QWidget)
+    imagesLoaded = pyqtSignal(QWidget)
+
     clsRows = 2
     clsCols = 2
 
-    def __init__(self, baseImgPath):
+    # keep decoded tiles in the memory-mapped store, see RawTileStore
+    useTileStore = False
+
+    # thumbnails whose aspect ratio is further off than this from the image's
+    # are letterboxed, and aren't used as previews
+    previewAspectTolerance = 0.05
+
+    def __init__(self, baseImgPath, lazy=False, image=None):
 
         super().__init__()
         self.baseImgPath = baseImgPath
 
+        # the path the grid was opened from, may be the inked version
+        self.imgPath = baseImgPath
+
+        # from the file headers, if they were read
+        self.metadata = {}
+        self.flightIndex = None
+
         self.gridLayout = QGridLayout()
         self.gridLayout.setSpacing(0)
         self.setLayout(self.gridLayout)
@@ -93,12 +188,131 @@ class QImageGrid(QWidget):
         self._focusItemRow = 0
         self._focusItemColumn = 0
 
-        # read in the image as a grid
+        # already decoded image to use instead of reading the file
+        self._decodedImage = image
+
+        # read in the image as a grid, or wait until it is first needed
         self.splitImages = None
+        self._loaded = False
+        self._previewing = False
+        self.placeholder = None
+        if lazy:
+            self.addPlaceholder()
+        else:
+            self.readImage()
+
+    def tileShape(self):
+        '''(rows, cols) of tiles, the image isn't split unless it has more than one row and column'''
+        return (self.rows, self.cols) if self.rows > 1 and self.cols > 1 else (1, 1)
+
+    def isLoaded(self):
+        '''Whether the tiles are at full resolution'''
+        return self._loaded
+
+    def isShown(self):
+        '''Whether the grid has tiles, if only previews'''
+        return self._loaded or self._previewing
+
+    def ensureLoaded(self):
+        if not self._loaded:
+            self.readImage()
+
+    def ensureShown(self):
+        '''Shows the tiles, as previews if the image hasn't been decoded and a thumbnail is at hand'''
+        if not self.isShown() and not self.showPreview():
+            self.readImage()
+
+    def showPreview(self):
+        '''Shows upscaled thumbnail tiles until readImage. Returns whether there was a thumbnail'''
+        fullSize = QSize(self.metadata.get('width') or 0, self.metadata.get('height') or 0)
+        if fullSize.isEmpty():
+            return False
+
+        with span('preview', path=str(self.imgPath)):
+            thumbnail = self._readThumbnail(fullSize)
+        if thumbnail is None:
+            return False
+
+        self.removePlaceholder()
+        self._previewing = True
+
+        rows, cols = self.tileShape()
+        tileSize = QSize(fullSize.width() // cols, fullSize.height() // rows)
+        for row, imgRow in enumerate(TileCache.splitImage(thumbnail, rows, cols)):
+            for col, image in enumerate(imgRow):
+                imageLabel = QImageLabel()
+                imageLabel.memoryGroup = self.memoryGroup
+                imageLabel.imgPath = self.imgPath
+                imageLabel.setPreview(image, tileSize)
+                self.gridLayout.addWidget(imageLabel, row, col)
+
+        self.labelsCreated.emit(self)
+        return True
+
+    def _readThumbnail(self, fullSize):
+        '''The pre-tiling thumbnail, or the one embedded in the EXIF, if it has the image's shape'''
+        thumbnail = TileCache.readAnyThumbnail(self.imgPath)
+        if thumbnail is None:
+            return None
+
+        aspect = thumbnail.width() / thumbnail.height()
+        fullAspect = fullSize.width() / fullSize.height()
+        if abs(aspect - fullAspect) > self.previewAspectTolerance * fullAspect:
+            return None
+        return thumbnail
+
+    def addPlaceholder(self):
+        self.placeholder = QPlaceholderLabel(Path(self.imgPath).name)
+        self.gridLayout.addWidget(self.placeholder, 0, 0)
+
+    def setMetadata(self, metadata, flightIndex=None):
+        '''Header metadata of the image (see TransectCatalog), known before it is decoded'''
+        self.metadata = metadata
+        self.flightIndex = flightIndex
+        self.setToolTip(TransectCatalog.describe(metadata, flightIndex))
+
+        if self.placeholder is not None:
+            self.placeholder.setImageSize(metadata.get('width'), metadata.get('height'))
+            self.placeholder.setText(f'{Path(self.imgPath).name}\n{self.toolTip()}')
+
+    def hasCachedTiles(self):
+        '''Whether loading would read pre-cut tiles rather than decode the image'''
+        if not (self.rows > 1 and self.cols > 1):
+            return False
+        if self.useTileStore and RawTileStore.store(self.imgPath).isStored(self.imgPath, self.rows, self.cols):
+            return True
+        return TileCache.isCached(self.imgPath, self.rows, self.cols)
+
+    def loadDecoded(self, image):
+        '''Loads the grid from an image decoded elsewhere, e.g. by the DecodeService.
+        Keeps none of image's memory, which may be released once this returns.
+        Replaces the previews if they are shown'''
+        if self._loaded:
+            return
+
+        if image.isNull():
+            self._decodedImage = None
+        elif self.rows > 1 and self.cols > 1:
+            # splitting copies the tiles out of it
+            self._decodedImage = image
+        else:
+            self._decodedImage = image.copy()
         self.readImage()
 
+    def removePlaceholder(self):
+        if self.placeholder is not None:
+            self.gridLayout.removeWidget(self.placeholder)
+            self.placeholder.deleteLater()
+            self.placeholder = None
+
     def readImage(self):
 
+        self.removePlaceholder()
+        self._loaded = True
+
+        # previews are replaced in their labels, which keep their focus and flags
+        previewing, self._previewing = self._previewing, False
+
         if self.rows > 1 and self.cols > 1:
             # split image
             self.splitImages = self._splitImage() # split_image(self.baseImgPath, self.splitDir, self.rows, self.cols)
@@ -106,76 +320,128 @@ class QImageGrid(QWidget):
             # read in pieces
             for row, imgRow in enumerate(self.splitImages):
                 for col, image in enumerate(imgRow):
-                    imageLabel  = QImageLabel()
+                    if previewing:
+                        imageLabel = self.gridLayout.itemAtPosition(row, col).widget()
+                    else:
+                        imageLabel  = QImageLabel()
+                        imageLabel.memoryGroup = self.memoryGroup
+                        self.gridLayout.addWidget(imageLabel, row, col)
                     imageLabel.setImage(image)
-                    self.gridLayout.addWidget(imageLabel, row, col)
         
         else:
-            imageLabel = QImageLabel()
-            imageLabel.setImagePath(self.baseImgPath)
-            self.gridLayout.addWidget(imageLabel, 0, 0)
-
-    def _splitImage(self):
-
-        # open image
-        img = QImage(str(self.baseImgPath))
-
-        width = img.width()
-        height = img.height()
+            if previewing:
+                imageLabel = self.gridLayout.itemAtPosition(0, 0).widget()
+            else:
+                imageLabel = QImageLabel()
+                imageLabel.memoryGroup = self.memoryGroup
+                self.gridLayout.addWidget(imageLabel, 0, 0)
+            if self._decodedImage is None:
+                imageLabel.setImagePath(self.imgPath)
+            else:
+                imageLabel.imgPath = self.imgPath
+                imageLabel.setImage(TileCache.toPixelFormat(self._decodedImage))
+                self._decodedImage = None
 
-        segmentWidth = width / self.cols
-        segmentHeight = height / self.rows
+        self.updateMemoryAccounting()
+        if not previewing:
+            self.labelsCreated.emit(self)
+        self.imagesLoaded.emit(self)
 
-        # hold list of image labels
-        splitImageList = []
-        imageRow = []
+    @property
+    def memoryGroup(self):
+        return Path(self.baseImgPath).name
+
+    def updateMemoryAccounting(self):
+        # split images shared with a label are counted by the label
+        shown = {label.image.cacheKey() for label in self.findChildren(QImageLabel)}
+        retained = sum(
+            imageBytes(image)
+            for imgRow in (self.splitImages or [])
+            for image in imgRow
+            if image.cacheKey() not in shown
+        )
+        memoryAccounting.track(self, 'split images', retained, self.memoryGroup)
+
+    def releaseSplitImages(self):
+        '''Drops the split images kept from loading. The labels keep their own'''
+        self.splitImages = None
+        self.updateMemoryAccounting()
 
-        # crop image into AxB
-        for row in range(self.rows):
-            for col in range(self.cols):
+    def tileArrays(self, writable=False):
+        '''The tile images as a rows x cols list of lists of NumPy arrays sharing their memory'''
+        self.ensureLoaded()
 
-                x = width - (self.cols - col) * segmentWidth
-                y = height - (self.rows - row) * segmentHeight
+        rows, cols = self.tileShape()
+        return [
+            [self.getItemAtPosition(row, col).widget().array(writable) for col in range(cols)]
+            for row in range(rows)
+        ]
 
-                cropped = img.copy(x, y, segmentWidth, segmentHeight)
-                imageRow.append(cropped)
+    def _splitImage(self):
 
-            splitImageList.append(imageRow.copy())
-            imageRow.clear()
+        # mapped straight from the store, without decoding
+        if self.useTileStore and self._decodedImage is None:
+            with span('tile store read', path=str(self.imgPath)):
+                tiles = RawTileStore.readTiles(self.imgPath, self.rows, self.cols)
+            if tiles is not None:
+                return tiles
+
+        tiles = self._decodeTiles()
+        if self.useTileStore:
+            stamp = TileCache.fileStamp(self.imgPath)
+            QThreadPool.globalInstance().start(Worker(RawTileStore.writeTiles, self.imgPath, tiles, stamp))
+        return tiles
+
+    def _decodeTiles(self):
+
+        # open image, from the pre-cut tiles if there are some
+        if self._decodedImage is None:
+            with span('tile cache read', path=str(self.imgPath)):
+                tiles = TileCache.readTiles(self.imgPath, self.rows, self.cols)
+            if tiles is not None:
+                return tiles
+
+            with span('decode', path=str(self.imgPath)):
+                img = QImage(str(self.imgPath))
+        else:
+            img, self._decodedImage = self._decodedImage, None
 
-        return splitImageList
+        with span('split', rows=self.rows, cols=self.cols):
+            return TileCache.splitImage(img, self.rows, self.cols)
 
     def writeImage(self):
+        with span('writeImage', path=str(self.baseImgPath)):
+            self._writeImage()
 
-        if self.rows > 1 and self.cols > 1:
-            # assumes all images are the same size within a grid
-            width = self.getItemAtPosition(0,0).widget().image.width()
-            height = self.getItemAtPosition(0,0).widget().image.height()
+    def _writeImage(self):
 
-            mergedImage = QImage(width*self.cols, height*self.rows, QImage.Format_RGB32)
-            painter = QPainter(mergedImage)
+        self.ensureLoaded()
 
-            for row in range(self.rows):
-                for col in range(self.cols):
-                    widget = self.getItemAtPosition(row, col).widget()
-                    image = widget.image
-                    painter.drawImage(col * width, row * height, image)
-            
-            painter.end()
+        # merged and encoded on the encoder's threads, always in the source's format
+        # since the inked file is found again by the source's suffix
+        savePath = self.baseImgPath.parent / Path(f'{self.baseImgPath.stem}_Inked{self.baseImgPath.suffix}')
+        imageEncoder.save(self.tileImages(), savePath, formatForPath(savePath))
 
-        else:
-            mergedImage = self.getItemAtPosition(0, 0).widget().image
+    def tileImages(self):
+        '''The tile images as a rows x cols list of lists'''
+        self.ensureLoaded()
 
-        # save the merged file
-        savePath = self.baseImgPath.parent / Path(f'{self.baseImgPath.stem}_Inked{self.baseImgPath.suffix}')
-        mergedImage.save(str(savePath))
+        rows, cols = self.tileShape()
+        return [
+            [self.getItemAtPosition(row, col).widget().image for col in range(cols)]
+            for row in range(rows)
+        ]
 
     def reloadImage(self):
         for widget in self.findChildren(QImageLabel, options=Qt.FindDirectChildrenOnly):
             widget.deleteLater()
+        self._previewing = False
         self.readImage()
 
     def clearFocusItem(self):
+        if not self.isShown():
+            return
+
         widget = self.getFocusWidget()
         try:
             widget.clearHighlight()
@@ -186,6 +452,7 @@ class QImageGrid(QWidget):
         return self.getItemAtPosition(self._focusItemRow, self._focusItemColumn)
 
     def getItemAtPosition(self, row, col):
+        self.ensureShown()
         item = self.gridLayout.itemAtPosition(row, col)
 
         if item is None:
@@ -202,6 +469,7 @@ class QImageGrid(QWidget):
         self.setFocusItem(row, col)
 
     def setFocusItem(self, row, col):
+        self.ensureShown()
         item = self.gridLayout.itemAtPosition(row, col)
         
         if item is None:
@@ -228,101 +496,18 @@ class QImageGrid(QWidget):
     def reFocus(self):
         self.setFocusItem(self._focusItemRow, self._focusItemColumn)
 
-    def moveFocusDown(self):
-        row = self._focusItemRow + 1
-        col = self._focusItemColumn
-        return self.setFocusItem(row, col)
-
-    def moveFocusUp(self):
-        row = self._focusItemRow - 1
-        col = self._focusItemColumn
-        return self.setFocusItem(row, col)
-
-    def moveFocusLeft(self):
-        row = self._focusItemRow
-        col = self._focusItemColumn - 1
-        return self.setFocusItem(row, col)
-
-    def moveFocusRight(self):
-        row = self._focusItemRow
-        col = self._focusItemColumn + 1
-        return self.setFocusItem(row, col)
-
-    def moveFocusNext(self):
-        row = self._focusItemRow
-        col = self._focusItemColumn
-
-        # figure out if we are in an even or odd row
-        if row % 2 == 0:
-            # EVEN row, move right a column if possible
-            if col < self.cols - 1:
-                col += 1
-            else:
-                row = self._tryGetNextRowNumber()
-        else:
-            # ODD row, move left a column if possible
-            if col > 0:
-                col -= 1
-            else:
-                row = self._tryGetNextRowNumber()
-
-        return self.setFocusItem(row, col)
-
-    def moveFocusPrevious(self):
-        row = self._focusItemRow
-        col = self._focusItemColumn
-
-        # figure out if we are in an even or odd row
-        if row % 2 == 0:
-            # EVEN row, move left a column if possible
-            if col > 0:
-                col -= 1
-            else:
-                row = self._tryGetPreviousRowNumber()
-        else:
-            # ODD row, move right a column if possible
-            if col < self.cols - 1:
-                col += 1
-            else:
-                row = self._tryGetPreviousRowNumber()
-
-        return self.setFocusItem(row, col)
-
-    def _tryGetNextRowNumber(self):
-        # if we are at the end of a column, keep column the same
-        # and try to move the row down
-        row = self._focusItemRow
-
-        if row < self.rows - 1:
-            row += 1
-        else:
-            raise MoveGridItemFocusError(
-                self._focusItemRow, self._focusItemColumn, row, self._focusItemColumn,
-                f'No item at ({row}, {self._focusItemColumn}'
-            )
-
-        return row
-
-    def _tryGetPreviousRowNumber(self):
-        # if we are at the beginning of a column, keep column the same
-        # and try to move the row up
-        row = self._focusItemRow
-
-        if row > 0:
-            row -= 1
-        else:
-            raise MoveGridItemFocusError(
-                self._focusItemRow, self._focusItemColumn, row, self._focusItemColumn,
-                f'No item at ({row}, {self._focusItemColumn}'
-            )
-
-        return row
+    def mouseReleaseEvent(self, event):
+        # clicking a grid that isn't loaded yet shows it
+        self.ensureShown()
 
 
 class QImageGrids(QWidget):
 
     # signals
     focusChanged = pyqtSignal(QPixmap)
+    gridAdded = pyqtSignal(QWidget)
+    gridLoaded = pyqtSignal(QWidget)
+    gridRemoved = pyqtSignal(QWidget)
 
     def __init__(self):
         super().__init__()
@@ -334,20 +519,36 @@ class QImageGrids(QWidget):
         self.setBackgroundRole(QPalette.Light)
 
         self._focusItemIndex = 0
+
+        # called with (grid, row, col), moveFocusNext/Previous pass over
+        # tiles it returns True for
+        self.skipTile = None
+
+        # every tile in next/previous order
+        self.traversal = TraversalIndex()
         
-    def add(self, imgPath, imgBasePath=None):
-        self.insert(self.VBoxLayout.count()-1, imgPath, imgBasePath)
+    def add(self, imgPath, imgBasePath=None, lazy=False, image=None):
+        return self.insert(self.VBoxLayout.count()-1, imgPath, imgBasePath, lazy, image)
 
-    def insert(self, index, imgPath, imgBasePath=None):
+    def insert(self, index, imgPath, imgBasePath=None, lazy=False, image=None):
 
-        imgGrid = QImageGrid(imgPath)
+        imgGrid = QImageGrid(imgPath, lazy, image)
 
         if imgBasePath is not None:
             imgGrid.baseImgPath = imgBasePath
 
         self.VBoxLayout.insertWidget(index, imgGrid)
+        self.traversal.insert(self.VBoxLayout.indexOf(imgGrid), *imgGrid.tileShape())
+
+        # lazy grids get their labels later, and a reload makes new ones
+        imgGrid.labelsCreated.connect(self.connectGridSignals)
+        imgGrid.imagesLoaded.connect(self.gridLoaded)
+        self.gridAdded.emit(imgGrid)
+        if imgGrid.isLoaded():
+            self.connectGridSignals(imgGrid)
+            self.gridLoaded.emit(imgGrid)
 
-        self.connectGridSignals(imgGrid)
+        return imgGrid
 
     def count(self):
         return self.VBoxLayout.count()-1
@@ -361,7 +562,9 @@ class QImageGrids(QWidget):
         # TODO
         grid = self.getFocusedGrid() # .VBoxLayout.itemAt(self._focusItemIndex)
         if isinstance(grid, QImageGrid):
+            self.traversal.remove(self.VBoxLayout.indexOf(grid))
             self.VBoxLayout.removeWidget(grid)
+            self.gridRemoved.emit(grid)
             grid.deleteLater()
             try:
                 self.moveGridFocusUp()
@@ -389,8 +592,56 @@ class QImageGrids(QWidget):
         self.getFocusedGrid().setFocusItem(row, col)
         self.emitFocusChanged()
 
+    def grids(self):
+        return [self.VBoxLayout.itemAt(i).widget() for i in range(self.count())]
+
+    def releaseSplitImages(self):
+        for grid in self.grids():
+            grid.releaseSplitImages()
+
+    def tileArrays(self, writable=False):
+        '''Yields (grid index, row, col, array) for every tile of the transect, loading grids as needed'''
+        for index, grid in enumerate(self.grids()):
+            for row, arrayRow in enumerate(grid.tileArrays(writable)):
+                for col, array in enumerate(arrayRow):
+                    yield index, row, col, array
+
+    def focusItem(self, index, row, col):
+        '''Focuses a tile by grid index and position, falling back to the first tile'''
+        self._setFocusPosition(index, row, col)
+        self.emitFocusChanged()
+
+    def _setFocusPosition(self, index, row, col):
+        if not 0 <= index < self.count():
+            index = 0
+
+        oldGrid = self.getFocusedGrid()
+        if oldGrid is not None:
+            oldGrid.clearFocusItem()
+
+        if self.traversal.number(index, row, col) is None:
+            row, col = 0, 0
+
+        self._focusItemIndex = index
+        self.getFocusedGrid().setFocusItem(row, col)
+
+    def focusPosition(self):
+        grid = self.getFocusedGrid()
+        return self._focusItemIndex, grid._focusItemRow, grid._focusItemColumn
+
+    def isFocusSkipped(self):
+        return self.isTileSkipped(*self.focusPosition())
+
+    def isTileSkipped(self, index, row, col):
+        if self.skipTile is None:
+            return False
+        return self.skipTile(self.getGridAtIndex(index), row, col)
+
     def getFocusedGrid(self) -> QImageGrid:
-        imgGridItem = self.VBoxLayout.itemAt(self._focusItemIndex)
+        return self.getGridAtIndex(self._focusItemIndex)
+
+    def getGridAtIndex(self, index) -> QImageGrid:
+        imgGridItem = self.VBoxLayout.itemAt(index)
         if imgGridItem is None:
             return None
         else:
@@ -410,19 +661,19 @@ class QImageGrids(QWidget):
         self.getFocusedGrid().setFocusWidget(imgLabel)
         imgLabel.clicked.connect(self.emitFocusChanged)
 
-    def emitFocusChanged(self):
-        pixmap = self.getFocusedGrid().getFocusWidget().pixmap()
-        self.focusChanged.emit(pixmap)
+    def focusImageLabel(self, imgLabel):
+        oldGrid = self.getFocusedGrid()
+        if oldGrid is not None:
+            oldGrid.clearFocusItem()
 
-    def moveGridFocusDown(self):
-        # only shift if we're not already at the bottom
-        if not self._focusItemIndex == self.VBoxLayout.count() - 2:
-            self._focusItemIndex += 1
-        else:
-            raise MoveGridFocusError(
-                self._focusItemIndex, self._focusItemIndex + 1,
-                f'Grid {self._focusItemIndex + 1} does not exist'
-            )
+        self._focusItemIndex = self.VBoxLayout.indexOf(imgLabel.parent())
+        self.getFocusedGrid().setFocusWidget(imgLabel)
+        self.emitFocusChanged()
+
+    def emitFocusChanged(self):
+        with span('focus change', grid=self._focusItemIndex):
+            pixmap = self.getFocusedGrid().getFocusWidget().pixmap()
+            self.focusChanged.emit(pixmap)
 
     def moveGridFocusUp(self):
         # only shift if we're not already at the top
@@ -435,120 +686,137 @@ class QImageGrids(QWidget):
             )
 
     def moveItemFocusDown(self):
-        grid = self.getFocusedGrid()
-        try:
-            grid.moveFocusDown()
-        except MoveGridItemFocusError as e:
-
-            try:
-                self.moveGridFocusDown()
-            except MoveGridFocusError:
-                pass
-            else:
-                newGrid = self.getFocusedGrid()
-                newGrid.setFocusItem(0, e.column)
-                grid.clearFocusItem()
-                self.emitFocusChanged()
-
-        else:
+        if self._stepFocusBy(1, 0):
             self.emitFocusChanged()
 
     def moveItemFocusUp(self):
-        grid = self.getFocusedGrid()
-        try:
-            grid.moveFocusUp()
-        except MoveGridItemFocusError as e:
-
-            try:
-                self.moveGridFocusUp()
-            except MoveGridFocusError:
-                pass
-            else:
-                newGrid = self.getFocusedGrid()
-                newGrid.setFocusItem(newGrid.rows-1, e.column)
-                grid.clearFocusItem()
-                self.emitFocusChanged()
-
-        else:
+        if self._stepFocusBy(-1, 0):
             self.emitFocusChanged()
 
     def moveItemFocusLeft(self):
-        grid = self.getFocusedGrid()
-        try:
-            grid.moveFocusLeft()
-        except MoveGridItemFocusError:
-            pass
-        else:
+        if self._stepFocusBy(0, -1):
             self.emitFocusChanged()
-        
+
     def moveItemFocusRight(self):
-        grid = self.getFocusedGrid()
-        try:
-            grid.moveFocusRight()
-        except MoveGridItemFocusError:
-            pass
-        else:
+        if self._stepFocusBy(0, 1):
             self.emitFocusChanged()
 
     def moveFocusNext(self):
-        grid = self.getFocusedGrid()
-        try:
-            grid.moveFocusNext()
-        except MoveGridItemFocusError:
-
-            try:
-                self.moveGridFocusDown()
-            except MoveGridFocusError:
-                pass
-            else:
-                newGrid = self.getFocusedGrid()
-                newGrid.setFocusItem(0, 0)
-                grid.clearFocusItem()
-                self.emitFocusChanged()
-
-        else:
+        if self._stepFocusSkipping(1):
             self.emitFocusChanged()
 
     def moveFocusPrevious(self):
-        grid = self.getFocusedGrid()
-        try:
-            grid.moveFocusPrevious()
-        except MoveGridItemFocusError:
+        if self._stepFocusSkipping(-1):
+            self.emitFocusChanged()
 
-            try:
-                self.moveGridFocusUp()
-            except MoveGridFocusError:
-                pass
-            else:
-                newGrid = self.getFocusedGrid()
-                if newGrid.rows % 2 == 0:
-                    newGrid.setFocusItem(newGrid.rows - 1, 0)
-                else:
-                    newGrid.setFocusItem(newGrid.rows - 1, newGrid.cols - 1)
-                grid.clearFocusItem()
-                self.emitFocusChanged()
+    def _stepFocusBy(self, rowStep, colStep):
+        '''Moves the focus to the neighbouring tile, see TraversalIndex.neighbour.
+        Returns whether the focus moved.
+        '''
+        n = self.traversal.number(*self.focusPosition())
+        if n is None:
+            return False
 
-        else:
-            self.emitFocusChanged()
+        n = self.traversal.neighbour(n, rowStep, colStep)
+        if n is None:
+            return False
+
+        self._setFocusPosition(*self.traversal.tile(n))
+        return True
+
+    def _stepFocusSkipping(self, step):
+        '''Moves the focus step tiles at a time to the first tile that isn't skipped.
+
+        If there is none before the end, the focus stays where it is.
+        Returns whether the focus moved.
+        '''
+        n = self.traversal.number(*self.focusPosition())
+        if n is None:
+            return False
+
+        n = self.traversal.step(n, step)
+        while n is not None and self.isTileSkipped(*self.traversal.tile(n)):
+            n = self.traversal.step(n, step)
+
+        if n is None:
+            return False
+
+        self._setFocusPosition(*self.traversal.tile(n))
+        return True
+
+    def tileCount(self):
+        return len(self.traversal)
+
+    def focusedTileNumber(self):
+        '''The number of the focused tile in next/previous order, see TraversalIndex'''
+        if self.count() == 0:
+            return None
+        return self.traversal.number(*self.focusPosition())
+
+    def focusTileNumber(self, n):
+        if 0 <= n < len(self.traversal):
+            self.focusItem(*self.traversal.tile(n))
+
+    def focusFraction(self, fraction):
+        '''Focuses the tile fraction (0 to 1) of the way through the transect'''
+        n = self.traversal.atFraction(fraction)
+        if n is not None:
+            self.focusItem(*self.traversal.tile(n))
 
 
 class QImageGridViewer(QScrollArea):
 
-    def __init__(self):
+    # time (ms) focus has to rest on a preview before it is decoded
+    settleDelay = 150
+
+    def __init__(self, appContext=None):
 
         super().__init__()
 
         self.imageGrids = QImageGrids()
         self.imageGrids.focusChanged.connect(self.focusChangedSlot)
 
+        # candidate animals are looked for in each grid once it is loaded
+        self.analysis = QTileAnalysis(self)
+        self.analysis.tileAnalyzed.connect(self.updateTileToolTip)
+        self.analysis.tileAnalyzed.connect(self.updateTileFlag)
+
+        # next/previous pass over tiles with less edge pixels (percent) than this
+        self._skipFeatureless = False
+        self._featurelessThreshold = 1.0
+        self.imageGrids.gridLoaded.connect(self.analysis.analyzeGrid)
+        self.imageGrids.gridRemoved.connect(self.analysis.forgetGrid)
+
+        # and how far each frame moved on from the one before
+        self.overlaps = QOverlapEstimator(self.imageGrids, self)
+        self.imageGrids.gridLoaded.connect(self.overlaps.gridLoaded)
+
+        # and whether it is a copy of a frame already open
+        self.frameIndex = QFrameIndex(self)
+        self.frameIndex.duplicateFound.connect(self.flagDuplicate)
+        self.imageGrids.gridAdded.connect(self.frameIndex.gridAdded)
+        self.imageGrids.gridLoaded.connect(self.frameIndex.gridLoaded)
+        self.imageGrids.gridRemoved.connect(self.frameIndex.forgetGrid)
+
+        # frames are decoded in worker processes when opened together
+        self.decoder = QDecodeService(parent=self)
+        self.decoder.imageDecoded.connect(self.gridDecoded)
+
+        # a focused preview is replaced at full resolution once focus rests on it
+        self._settleTimer = QTimer(self)
+        self._settleTimer.setSingleShot(True)
+        self._settleTimer.setInterval(self.settleDelay)
+        self._settleTimer.timeout.connect(self.loadFocusedGrid)
+        self.imageGrids.focusChanged.connect(self.scheduleFullResolution)
+
         self.setBackgroundRole(QPalette.Dark)
         self.setWidget(self.imageGrids)
         self.setWidgetResizable(True)
 
-        self._appContext = None
+        self._appContext = appContext
 
         self.stylesheetPath = 'QImageGridStyle.qss'
-        # self.readStyleSheet()
+        self.readStyleSheet()
 
         self.toolbar = QToolBar()
         self.initToolbar()
@@ -559,10 +827,9 @@ class QImageGridViewer(QScrollArea):
         return self.imageGrids.count()
 
     def readStyleSheet(self):
-        f = QFile(self.appContext.get_resource(self.stylesheetPath))
-        f.open(QFile.ReadOnly | QFile.Text)
-        stream = QTextStream(f)
-        self.setStyleSheet(stream.readAll())
+        if self.appContext is not None:
+            fp = self.appContext.get_resource(self.stylesheetPath)
+            self.setStyleSheet(cachedStyleSheet(fp))
 
     def open(self):
         options = QFileDialog.Options()
@@ -575,23 +842,216 @@ class QImageGridViewer(QScrollArea):
             filePaths = [Path(name) for name in fileNames]
             self.openFiles(filePaths)
 
-    def openFiles(self, filePaths):
+    def openFiles(self, filePaths, lazy=False, catalog=None):
+        '''Opens images in the given order. catalog is their header metadata
+        from TransectCatalog.readCatalog, if read'''
+
+        pathSet = set(filePaths)
+        flightIndex = 0
 
         for filePath in filePaths:
 
             # don't open the file if a version with "inked" exists
-            if inkPath(filePath) in filePaths:
-                pass # print(f'skipped {filePath}')
+            if inkPath(filePath) in pathSet:
+                continue # print(f'skipped {filePath}')
             elif isInked(filePath):
-                self.openFile(filePath, removePathInk(filePath))
+                grid = self.openFile(filePath, removePathInk(filePath), lazy)
             else:
-                self.openFile(filePath)
+                grid = self.openFile(filePath, lazy=lazy)
+
+            if catalog is not None and Path(filePath) in catalog:
+                grid.setMetadata(catalog[Path(filePath)], flightIndex)
+            flightIndex += 1
 
-    def openFile(self, fileName, baseFileName=None):
+    def openFile(self, fileName, baseFileName=None, lazy=False):
         if baseFileName is None:
-            self.imageGrids.add(Path(fileName))
+            return self.imageGrids.add(Path(fileName), lazy=lazy)
         else:
-            self.imageGrids.add(Path(fileName), Path(baseFileName))
+            return self.imageGrids.add(Path(fileName), Path(baseFileName), lazy)
+
+    def openedPaths(self):
+        return [grid.imgPath for grid in self.imageGrids.grids()]
+
+    @pyqtSlot(object, object, QImage)
+    def appendImage(self, imgPath, baseImgPath, image):
+        '''Adds a grid for an image decoded elsewhere, leaving the others alone'''
+        wasEmpty = self.imageGrids.count() == 0
+        self.imageGrids.add(Path(imgPath), baseImgPath, image=image)
+        if wasEmpty:
+            self.focusFirstGrid()
+
+    def focusedPosition(self):
+        '''Returns (grid index, row, col) of the focused tile'''
+        grid = self.imageGrids.getFocusedGrid()
+        if grid is None:
+            return 0, 0, 0
+        return self.imageGrids._focusItemIndex, grid._focusItemRow, grid._focusItemColumn
+
+    def focusItem(self, index, row, col):
+        if not self.imageGrids.count() == 0:
+            self.imageGrids.focusItem(index, row, col)
+
+    def loadInBackground(self):
+        '''Loads the grids not loaded yet, decoding those without cached tiles in worker processes'''
+        for grid in self.imageGrids.grids():
+            if grid.isLoaded():
+                continue
+            if grid.hasCachedTiles() or not self.decoder.isParallel():
+                grid.ensureLoaded()
+            else:
+                self.decoder.decode(grid.imgPath)
+
+    def scheduleFullResolution(self):
+        # stepping quickly through previews decodes none of them
+        self._settleTimer.start()
+
+    def loadFocusedGrid(self):
+        '''Decodes the focused grid if only its previews are shown'''
+        grid = self.imageGrids.getFocusedGrid()
+        if grid is None or grid.isLoaded():
+            return
+        if self.decoder.isParallel():
+            self.decoder.decode(grid.imgPath)
+        else:
+            grid.ensureLoaded()
+
+    @pyqtSlot(object, object)
+    def gridDecoded(self, imgPath, decoded):
+        _, grid = self.gridForPath(str(imgPath))
+
+        # removed, or loaded on demand in the meantime
+        if grid is not None and not grid.isLoaded():
+            grid.loadDecoded(QImage() if decoded is None else decoded.image)
+
+    def gridForPath(self, imgPath):
+        for index, grid in enumerate(self.imageGrids.grids()):
+            if str(grid.imgPath) == imgPath:
+                return index, grid
+        return None, None
+
+    def focusedOverlapRect(self):
+        '''The part of the focused tile also seen in the previous frame, in tile pixels, or None'''
+        grids = self.imageGrids
+        grid = grids.getFocusedGrid()
+        if grid is None or grids._focusItemIndex == 0:
+            return None
+
+        previous = grids.getGridAtIndex(grids._focusItemIndex - 1)
+        overlap = self.overlaps.overlapRect(str(previous.imgPath), str(grid.imgPath))
+        if overlap is None:
+            return None
+
+        widget = grid.getFocusWidget()
+        size = widget.fullSize if widget.isPreview() else widget.image.size()
+        tileRect = QRect(grid._focusItemColumn * size.width(), grid._focusItemRow * size.height(), size.width(), size.height())
+        overlap &= tileRect
+        if overlap.isEmpty():
+            return None
+        return overlap.translated(-tileRect.topLeft())
+
+    def focusedTileKey(self):
+        grid = self.imageGrids.getFocusedGrid()
+        if grid is None:
+            return None
+        return tileKey(grid, grid._focusItemRow, grid._focusItemColumn)
+
+    def focusTileKey(self, key):
+        imgPath, row, col = key
+        index, _ = self.gridForPath(imgPath)
+        if index is not None:
+            self.imageGrids.focusItem(index, row, col)
+
+    def updateTileToolTip(self, key):
+        imgPath, row, col = key
+        _, grid = self.gridForPath(imgPath)
+        if grid is not None and grid.isLoaded():
+            label = grid.getItemAtPosition(row, col).widget()
+            label.setToolTip(f'Candidate score: {self.analysis.score(key):.1f}')
+
+    @property
+    def skipFeatureless(self):
+        return self._skipFeatureless
+
+    @skipFeatureless.setter
+    def skipFeatureless(self, value):
+        self._skipFeatureless = bool(value)
+        self.skipFeaturelessAct.setChecked(self._skipFeatureless)
+        self.imageGrids.skipTile = self.isTileFeatureless if self._skipFeatureless else None
+        self.updateTileFlags()
+
+    @property
+    def featurelessThreshold(self):
+        return self._featurelessThreshold
+
+    @featurelessThreshold.setter
+    def featurelessThreshold(self, value):
+        self._featurelessThreshold = float(value)
+        self.updateTileFlags()
+
+    def toggleSkipFeatureless(self):
+        self.skipFeatureless = self.skipFeaturelessAct.isChecked()
+
+    def isTileFeatureless(self, grid, row, col):
+        return self.analysis.isFeatureless(tileKey(grid, row, col), self.featurelessThreshold)
+
+    def updateTileFlag(self, key):
+        '''Marks the tile in the dock if next/previous will pass over it'''
+        imgPath, row, col = key
+        _, grid = self.gridForPath(imgPath)
+        if grid is not None and grid.isLoaded():
+            label = grid.getItemAtPosition(row, col).widget()
+            label.setFeatureless(self.skipFeatureless and self.analysis.isFeatureless(key, self.featurelessThreshold))
+
+    def flagDuplicate(self, imgPath, original):
+        '''Marks every tile of a frame that looks like a copy of another in the dock'''
+        _, grid = self.gridForPath(imgPath)
+        if grid is not None and grid.isLoaded():
+            for label in grid.findChildren(QImageLabel):
+                label.setDuplicate(True)
+                label.setToolTip(f'Looks like a copy of {Path(original).name}')
+
+    def updateTileFlags(self):
+        for key in self.analysis.analyzedKeys():
+            self.updateTileFlag(key)
+
+    def promptForTileNumber(self):
+        if self.imageGrids.count() == 0:
+            return
+        current = self.imageGrids.focusedTileNumber()
+        number, okPressed = QInputDialog.getInt(self, 'Go to Tile',
+            f'Tile number (1 to {self.imageGrids.tileCount()}):', current + 1, 1, self.imageGrids.tileCount(), 1)
+        if okPressed:
+            self.imageGrids.focusTileNumber(number - 1)
+
+    def promptForTransectPercent(self):
+        if self.imageGrids.count() == 0:
+            return
+        current = 100 * self.imageGrids.focusedTileNumber() // self.imageGrids.tileCount()
+        percent, okPressed = QInputDialog.getInt(self, 'Go to Percent',
+            'Percent of the way through the transect:', current, 0, 100, 5)
+        if okPressed:
+            self.imageGrids.focusFraction(percent / 100)
+
+    def moveFocusNextByScore(self):
+        self.moveFocusByScore(1)
+
+    def moveFocusPreviousByScore(self):
+        self.moveFocusByScore(-1)
+
+    def moveFocusByScore(self, step):
+        '''Moves through the analyzed tiles from most to least likely to hold animals'''
+        ranking = self.analysis.ranking()
+        if not ranking:
+            return
+
+        key = self.focusedTileKey()
+        if key in ranking:
+            index = ranking.index(key) + step
+        else:
+            index = 0 if step > 0 else len(ranking) - 1
+
+        if 0 <= index < len(ranking):
+            self.focusTileKey(ranking[index])
 
     def removeFocusedGrid(self):
         if not self.imageGrids.count() == 0:
@@ -628,7 +1088,6 @@ class QImageGridViewer(QScrollArea):
 
     @pyqtSlot()
     def focusChangedSlot(self):
-        self.readStyleSheet()
         self.ensureFocusedItemVisible()
 
     @pyqtSlot(QImage)
@@ -637,7 +1096,8 @@ class QImageGridViewer(QScrollArea):
         if grid is not None:
             widget = grid.getFocusWidget()
             widget.setImage(newImage)
-            self.imageGrids.getFocusedGrid().writeImage()
+            grid.updateMemoryAccounting()
+            grid.writeImage()
 
     def moveFocusDown(self):
         if not self.imageGrids.count() == 0:
@@ -673,6 +1133,7 @@ class QImageGridViewer(QScrollArea):
     @appContext.setter
     def appContext(self, context):
         self._appContext = context
+        self.readStyleSheet()
         self.toolbar.clear()
         self.initToolbar()
 
@@ -692,6 +1153,18 @@ class QImageGridViewer(QScrollArea):
     def cols(self, value):
         QImageGrid.clsCols = value
 
+    @property
+    def useTileStore(self):
+        return QImageGrid.useTileStore
+
+    @useTileStore.setter
+    def useTileStore(self, value):
+        QImageGrid.useTileStore = bool(value)
+        self.useTileStoreAct.setChecked(QImageGrid.useTileStore)
+
+    def toggleUseTileStore(self):
+        self.useTileStore = self.useTileStoreAct.isChecked()
+
     def createActions(self):
         if self.appContext is None:
             refreshIconFp = './icons/refreshIcon.png'
@@ -704,14 +1177,22 @@ class QImageGridViewer(QScrollArea):
         self.itemFocusRightAct = QAction('Right Item', self, shortcut=Qt.CTRL + Qt.Key_Right, triggered=self.moveFocusRight)
         self.itemFocusNextAct = QAction('Next Item', self, shortcut=Qt.CTRL + Qt.Key_N, triggered=self.moveFocusNext)
         self.itemFocusPreviousAct = QAction('Previous Item', self, shortcut=Qt.CTRL + Qt.Key_P, triggered=self.moveFocusPrevious)
+        self.itemFocusNextByScoreAct = QAction('Next Item by Score', self, shortcut=Qt.CTRL + Qt.SHIFT + Qt.Key_N, triggered=self.moveFocusNextByScore)
+        self.itemFocusPreviousByScoreAct = QAction('Previous Item by Score', self, shortcut=Qt.CTRL + Qt.SHIFT + Qt.Key_P, triggered=self.moveFocusPreviousByScore)
+        self.itemFocusNumberAct = QAction('Go to Item...', self, shortcut=Qt.CTRL + Qt.Key_J, triggered=self.promptForTileNumber)
+        self.itemFocusPercentAct = QAction('Go to Percent...', self, shortcut=Qt.CTRL + Qt.SHIFT + Qt.Key_J, triggered=self.promptForTransectPercent)
 
-        self.resetImageAct = QAction(QIcon(refreshIconFp), 'Reset Image', self, shortcut=Qt.CTRL + Qt.Key_R, triggered=self.reloadFocusedImage)
+        self.resetImageAct = QAction(cachedIcon(refreshIconFp), 'Reset Image', self, shortcut=Qt.CTRL + Qt.Key_R, triggered=self.reloadFocusedImage)
 
         self.promptGridRowsAct = QAction('Set grid rows', self, triggered=self.promptForGridRows)
         self.promptGridColumnsAct = QAction('Set grid columns', self, triggered=self.promptForGridColumns)
 
         self.removeFocusedGridAct = QAction('Remove current image', self, shortcut=Qt.CTRL + Qt.Key_W, triggered=self.removeFocusedGrid)
 
+        self.skipFeaturelessAct = QAction('Skip Featureless Tiles', self, checkable=True, checked=self.skipFeatureless, shortcut=Qt.CTRL + Qt.Key_E, triggered=self.toggleSkipFeatureless)
+        self.promptFeaturelessThresholdAct = QAction('Set featureless threshold', self, triggered=self.promptForFeaturelessThreshold)
+        self.useTileStoreAct = QAction('Keep Decoded Tiles', self, checkable=True, checked=self.useTileStore, triggered=self.toggleUseTileStore)
+
     def initMenu(self):
         self.menu = QMenu('&Grids', self)
         self.menu.addAction(self.promptGridRowsAct)
@@ -724,6 +1205,16 @@ class QImageGridViewer(QScrollArea):
         self.menu.addSeparator()
         self.menu.addAction(self.itemFocusNextAct)
         self.menu.addAction(self.itemFocusPreviousAct)
+        self.menu.addAction(self.itemFocusNumberAct)
+        self.menu.addAction(self.itemFocusPercentAct)
+        self.menu.addSeparator()
+        self.menu.addAction(self.itemFocusNextByScoreAct)
+        self.menu.addAction(self.itemFocusPreviousByScoreAct)
+        self.menu.addSeparator()
+        self.menu.addAction(self.skipFeaturelessAct)
+        self.menu.addAction(self.promptFeaturelessThresholdAct)
+        self.menu.addSeparator()
+        self.menu.addAction(self.useTileStoreAct)
         self.menu.addSeparator()
         self.menu.addAction(self.removeFocusedGridAct)
 
@@ -736,6 +1227,12 @@ class QImageGridViewer(QScrollArea):
         if okPressed:
             QImageGrid.clsRows = rows
 
+    def promptForFeaturelessThreshold(self):
+        threshold, okPressed = QInputDialog.getDouble(self, 'Featureless Threshold',
+            'Skip tiles with less than this percent of edge pixels:', self.featurelessThreshold, 0, 100, 1)
+        if okPressed:
+            self.featurelessThreshold = threshold
+
     def promptForGridColumns(self):
         cols, okPressed = QInputDialog.getInt(self, 'Grid Columns','Number of grid columns:', QImageGrid.clsCols, 1, 20, 1)
         if okPressed:
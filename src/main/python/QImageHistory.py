@@ -0,0 +1,171 @@
+'''Undo/redo history for the image painter'''
+
+import zlib
+
+from PyQt5.QtCore import QRect, QPoint
+from PyQt5.QtGui import QImage, QPainter
+from PyQt5.QtWidgets import QUndoStack, QUndoCommand
+
+from QMemoryAccounting import memoryAccounting
+
+
+class RegionSnapshot:
+    '''Compressed copy of a rectangular region of an image'''
+
+    def __init__(self, region: QImage, topLeft: QPoint):
+        self.topLeft = QPoint(topLeft)
+        self.width = region.width()
+        self.height = region.height()
+        self.bytesPerLine = region.bytesPerLine()
+        self.format = region.format()
+        self.data = zlib.compress(region.bits().asstring(region.byteCount()), 1)
+
+    @classmethod
+    def fromImage(cls, image: QImage, rect: QRect):
+        return cls(image.copy(rect), rect.topLeft())
+
+    @property
+    def nbytes(self):
+        return len(self.data)
+
+    def toImage(self):
+        data = zlib.decompress(self.data)
+        image = QImage(data, self.width, self.height, self.bytesPerLine, self.format)
+
+        # detach from the decompressed buffer before it goes out of scope
+        return image.copy()
+
+    def restoreInto(self, image: QImage):
+        painter = QPainter(image)
+        painter.setCompositionMode(QPainter.CompositionMode_Source)
+        painter.drawImage(self.topLeft, self.toImage())
+        painter.end()
+
+
+class DrawItemCommand(QUndoCommand):
+    '''An item drawn onto the painter scene'''
+
+    def __init__(self, painter, item, text='Draw'):
+        super().__init__(text)
+        self.painter = painter
+        self.item = item
+        self.target = painter.editTarget
+
+    @property
+    def nbytes(self):
+        return 0
+
+    def redo(self):
+        self.painter.addDrawnItems([self.item])
+
+    def undo(self):
+        self.painter.removeDrawnItems([self.item])
+
+    def evict(self):
+        self.item = None
+
+
+class FlattenCommand(QUndoCommand):
+    '''Drawn items merged into the image of the edit target.
+
+    Only the changed region is kept, before and after, so undoing a flatten
+    does not need a copy of the whole image.
+    '''
+
+    def __init__(self, painter, items, before: RegionSnapshot, after: RegionSnapshot, image: QImage=None, text='Flatten'):
+        super().__init__(text)
+        self.painter = painter
+        self.items = list(items)
+        self.target = painter.editTarget
+        self.before = before
+        self.after = after
+
+        # the already flattened image, applied on the first redo only
+        self._image = image
+
+    @property
+    def nbytes(self):
+        if self.before is None:
+            return 0
+        return self.before.nbytes + self.after.nbytes
+
+    def redo(self):
+        if self._image is not None:
+            image, self._image = self._image, None
+        else:
+            # shallow copy, painting into it detaches from the shown image
+            image = QImage(self.painter.mainImage())
+            self.after.restoreInto(image)
+
+        self.painter.removeDrawnItems(self.items)
+        self.painter.applyImageEdit(image)
+
+    def undo(self):
+        image = QImage(self.painter.mainImage())
+        self.before.restoreInto(image)
+
+        self.painter.applyImageEdit(image)
+        self.painter.addDrawnItems(self.items)
+
+    def evict(self):
+        self.items.clear()
+        self.before = None
+        self.after = None
+        self._image = None
+
+
+class QBoundedUndoStack(QUndoStack):
+    '''Undo stack with a cap on the memory held by its commands.
+
+    QUndoStack cannot drop individual commands, so once the cap is exceeded
+    the data of the oldest commands is released and undo stops at them.
+    '''
+
+    def __init__(self, parent=None, memoryLimit=64 * 1024**2):
+        super().__init__(parent)
+        self.memoryLimit = memoryLimit
+
+        # commands below this index have been evicted
+        self._floor = 0
+
+    def push(self, command):
+        super().push(command)
+        self.enforceMemoryLimit()
+
+    def clear(self):
+        super().clear()
+        self._floor = 0
+        memoryAccounting.track(self, 'undo history', 0, 'painter')
+
+    def canUndoFurther(self):
+        return self.index() > self._floor
+
+    def nextUndoCommand(self):
+        if not self.canUndoFurther():
+            return None
+        return self.command(self.index() - 1)
+
+    def nextRedoCommand(self):
+        return self.command(self.index())
+
+    def memoryUsage(self):
+        return sum(self.command(i).nbytes for i in range(self._floor, self.count()))
+
+    def setMemoryLimit(self, limit):
+        self.memoryLimit = limit
+        self.enforceMemoryLimit()
+
+    def enforceMemoryLimit(self, limit=None):
+        '''Evicts down to the memory limit, or once down to a lower limit without changing it'''
+        if limit is None:
+            limit = self.memoryLimit
+        usage = self.memoryUsage()
+
+        # evict oldest first, but never the most recent undo step
+        while usage > limit and self._floor < self.index() - 1:
+            command = self.command(self._floor)
+            usage -= command.nbytes
+            command.evict()
+            self._floor += 1
+
+        memoryAccounting.track(self, 'undo history', usage, 'painter')
@@ -1,10 +1,18 @@
-from PyQt5.QtCore import Qt, QRectF, QMarginsF, QTimeLine, pyqtSignal, QSize
-from PyQt5.QtGui import QKeySequence, QImage, QPixmap, QPalette, QPainter, QWheelEvent, QKeyEvent, QIcon, QPen, QColor
+from PyQt5.QtCore import Qt, QEvent, QRectF, QMarginsF, QTimeLine, QTimer, pyqtSignal, QSize
+from PyQt5.QtGui import QKeySequence, QImage, QPixmap, QPalette, QPainter, QWheelEvent, QKeyEvent, QIcon, QPen, QColor, QTransform
 from PyQt5.QtWidgets import (
     QGraphicsView, QGraphicsScene, QGraphicsItem, QToolBar, QAction,
-    QApplication, QInputDialog, QMenu, QToolButton, QPushButton
+    QApplication, QInputDialog, QMenu, QToolButton, QPushButton,
+    QGraphicsItemGroup, QGraphicsRectItem
 )
 
+from QImageHistory import QBoundedUndoStack, RegionSnapshot, DrawItemCommand, FlattenCommand
+from QTiledImageItem import QTiledImageItem
+from QMinimap import QMinimap
+from ResourceCache import cachedIcon, cachedPalettePixmap
+from Tracing import span
+from QMemoryAccounting import memoryAccounting, imageBytes
+
 COLORS = {
     'Teleric Blue': '#3296e6',
     'Blue': 'Blue',
@@ -24,13 +32,14 @@ class QPaletteIcon(QIcon):
 
         self.color = color
 
-        pixmap = QPixmap(100, 100)
-        pixmap.fill(QColor(color))
-        self.addPixmap(pixmap)
+        self.addPixmap(cachedPalettePixmap(color))
 
 class QSmoothGraphicsView(QGraphicsView):
     '''Implements smooth mouse/keyboard navigation'''
 
+    # time (ms) without scrolling or zooming before the view is considered settled
+    settleDelay = 150
+
     def __init__(self):
         super().__init__()
         
@@ -43,6 +52,40 @@ class QSmoothGraphicsView(QGraphicsView):
 
         self.controlDown = False
 
+        # motion tracking, so subclasses can render cheaply while navigating
+        self._inMotion = False
+        self._settleTimer = QTimer(self)
+        self._settleTimer.setSingleShot(True)
+        self._settleTimer.setInterval(self.settleDelay)
+        self._settleTimer.timeout.connect(self._settle)
+
+    @property
+    def inMotion(self):
+        return self._inMotion
+
+    def beginMotion(self):
+        '''Flags the view as moving. Restarts the settle countdown'''
+        if not self._inMotion:
+            self._inMotion = True
+            self.motionStarted()
+        self._settleTimer.start()
+
+    def _settle(self):
+        self._inMotion = False
+        self.motionSettled()
+
+    def motionStarted(self):
+        '''Called when the view starts scrolling or zooming. Override in subclasses'''
+        pass
+
+    def motionSettled(self):
+        '''Called once the view has stopped scrolling or zooming. Override in subclasses'''
+        pass
+
+    def scrollContentsBy(self, dx, dy):
+        self.beginMotion()
+        super().scrollContentsBy(dx, dy)
+
     def keyPressEvent(self, event: QKeyEvent):
         key = event.key()
         if key == Qt.Key_Up:
@@ -81,6 +124,7 @@ class QSmoothGraphicsView(QGraphicsView):
         anim.start()
 
     def scalingTime(self, x):
+        self.beginMotion()
         factor = 1 + self._numScheduledScalings / 300.0
         self.scaleView(factor)
 
@@ -173,17 +217,55 @@ class QImagePainter(QSmoothGraphicsView):
 
     # signals
     imageFlattened = pyqtSignal(QImage)
+    editTargetRequested = pyqtSignal(object)
 
-    def __init__(self):
+    # minimum time (ms) between updates of the oval being drawn
+    frameInterval = 16
+
+    def __init__(self, appContext=None):
         super().__init__()
 
         self.scene = QGraphicsScene(self)
         self.setScene(self.scene)
-        self.setRenderHint(QPainter.Antialiasing)
 
-        self.mainPixmapItem = self.scene.addPixmap(QPixmap())
+        # only a handful of items are ever in the scene, and the dynamic oval
+        # changes on every mouse move. skip maintaining the BSP index
+        self.scene.setItemIndexMethod(QGraphicsScene.NoIndex)
+
+        # the main image is shown as tiles created lazily as they come into view
+        self.mainPixmapItem = QTiledImageItem()
+        self.mainPixmapItem.setZValue(-1)
+        self.scene.addItem(self.mainPixmapItem)
 
-        self._appContext = None
+        # overview of the image, kept in the corner of the view.
+        # made when the first image is shown
+        self.minimap = None
+        self._showMinimap = True
+
+        # outlines from image analysis, shown over the image and drawings
+        # but never flattened into them. name -> item group
+        self._overlays = {}
+        self._overlayVisible = {}
+        self._showCandidates = True
+        self._showOverlap = True
+
+        # repaint only the regions that actually changed
+        self.setViewportUpdateMode(QGraphicsView.MinimalViewportUpdate)
+        self.setOptimizationFlag(QGraphicsView.DontSavePainterState)
+
+        self._cachedRendering = True
+        self.applyRenderQuality()
+
+        # whether the main image is a low resolution stand in, see setPreviewImage
+        self._previewing = False
+
+        self._appContext = appContext
+
+        # the tile being edited, set by whoever provides the main pixmap.
+        # undo/redo asks for it to be shown again via editTargetRequested
+        self.editTarget = None
+        self.history = QBoundedUndoStack(self)
+        self.history.indexChanged.connect(self.updateHistoryActions)
 
         # policies
         # self.setTransformationAnchor(QGraphicsView.AnchorUnderMouse)
@@ -200,8 +282,17 @@ class QImagePainter(QSmoothGraphicsView):
 
         self._drawStartPos = None
         self._dynamicOval = None
+        self._pendingMovePos = None
         self._drawnItems = []
 
+        self.stampSize = 100
+
+        # coalesces mouse moves so the oval is updated at most once per frame
+        self._moveTimer = QTimer(self)
+        self._moveTimer.setSingleShot(True)
+        self._moveTimer.setInterval(self.frameInterval)
+        self._moveTimer.timeout.connect(self.updateDynamicOval)
+
         self.updateDragMode()
 
     @property
@@ -217,13 +308,66 @@ class QImagePainter(QSmoothGraphicsView):
     def setMainPixmapFromPath(self, imgPath):
 
         # set image
-        image = QImage(str(imgPath))
-        pixmap = self.mainPixmapItem.pixmap()
-        pixmap.convertFromImage(image)
-        self.setMainPixmap(pixmap)
+        with span('decode', path=str(imgPath)):
+            image = QImage(str(imgPath))
+        self.setMainImage(image)
+
+    @property
+    def cachedRendering(self):
+        return self._cachedRendering
+
+    @cachedRendering.setter
+    def cachedRendering(self, value):
+        self._cachedRendering = bool(value)
+        self.cachedRenderingAct.setChecked(self._cachedRendering)
+        self.applyRenderQuality()
+
+    def applyRenderQuality(self):
+        '''Sets the full quality render policy used while the view is at rest.
+
+        With cached rendering the main pixmap is smoothly transformed once and
+        cached at the current zoom, so repaints (e.g. while drawing) are blits.
+        '''
+        if self.cachedRendering:
+            self.setRenderHints(QPainter.Antialiasing | QPainter.SmoothPixmapTransform)
+            self.mainPixmapItem.setTransformationMode(Qt.SmoothTransformation)
+            self.mainPixmapItem.setCacheMode(QGraphicsItem.DeviceCoordinateCache)
+        else:
+            self.setRenderHints(QPainter.Antialiasing)
+            self.mainPixmapItem.setTransformationMode(Qt.FastTransformation)
+            self.mainPixmapItem.setCacheMode(QGraphicsItem.NoCache)
+
+    def applyMotionQuality(self):
+        '''Sets the cheap render policy used while panning and zooming'''
+        # every zoom step would invalidate the device cache, so don't keep one
+        self.setRenderHints(QPainter.RenderHints())
+        self.mainPixmapItem.setTransformationMode(Qt.FastTransformation)
+        self.mainPixmapItem.setCacheMode(QGraphicsItem.NoCache)
+
+    def motionStarted(self):
+        if self.cachedRendering:
+            self.applyMotionQuality()
+
+    def motionSettled(self):
+        if self.cachedRendering:
+            self.applyRenderQuality()
+            self.viewport().update()
+
+    def toggleCachedRendering(self):
+        self.cachedRendering = self.cachedRenderingAct.isChecked()
 
     def setMainPixmap(self, pixmap):
-        self.mainPixmapItem.setPixmap(pixmap)
+        self.setMainImage(pixmap.toImage())
+
+    def setMainImage(self, image):
+        with span('setMainImage', width=image.width(), height=image.height()):
+            self._setMainImage(image)
+
+    def _setMainImage(self, image):
+        self._previewing = False
+        self.mainPixmapItem.setTransform(QTransform())
+        self.mainPixmapItem.setImage(image)
+        self.updateMainImageMemory()
 
         # set scene rect
         boundingRect = self.mainPixmapItem.boundingRect()
@@ -231,65 +375,307 @@ class QImagePainter(QSmoothGraphicsView):
         boundingRect += QMarginsF(margin,margin,margin,margin)
         self.scene.setSceneRect(boundingRect)
 
+        if self.minimap is None:
+            self.minimap = QMinimap(self)
+        self.minimap.setImage(image)
+        self.updateMinimapVisibility()
+        self.updateVisibleTiles()
+
+    def setPreviewImage(self, image, fullSize):
+        '''Shows a low resolution image stretched over a scene of fullSize until setMainImage.
+
+        The scene is laid out as it will be for the full image, so the view,
+        overlays and zoom carry over when it arrives. Nothing can be drawn
+        on a preview.
+        '''
+        with span('setPreviewImage', width=image.width(), height=image.height()):
+            self._previewing = True
+            self.mainPixmapItem.setImage(image)
+            self.mainPixmapItem.setTransform(QTransform.fromScale(
+                fullSize.width() / image.width(), fullSize.height() / image.height()
+            ))
+            self.updateMainImageMemory()
+
+            self.scene.setSceneRect(QRectF(0, 0, fullSize.width(), fullSize.height()))
+
+            if self.minimap is None:
+                self.minimap = QMinimap(self)
+            self.minimap.setImage(image, fullSize)
+            self.updateMinimapVisibility()
+            self.updateVisibleTiles()
+
+    def isPreviewing(self):
+        return self._previewing
+
+    def updateMainImageMemory(self):
+        # the image is normally shared with the tile being edited, which counts it
+        image = self.mainImage()
+        shared = getattr(self.editTarget, 'image', None)
+        unshared = shared is None or shared.cacheKey() != image.cacheKey()
+        memoryAccounting.track(self, 'painter image', imageBytes(image) if unshared else 0, 'painter')
+
+    def visibleSceneRect(self):
+        return self.mapToScene(self.viewport().rect()).boundingRect()
+
+    def updateVisibleTiles(self):
+        self.mainPixmapItem.updateVisibleTiles(self.visibleSceneRect(), self.transform().m11())
+        self.updateMinimap()
+
+    def updateMinimap(self):
+        if self.minimap is not None:
+            self.minimap.update()
+
+    @property
+    def showMinimap(self):
+        return self._showMinimap
+
+    @showMinimap.setter
+    def showMinimap(self, value):
+        self._showMinimap = bool(value)
+        self.showMinimapAct.setChecked(self._showMinimap)
+        self.updateMinimapVisibility()
+
+    def toggleMinimap(self):
+        self.showMinimap = self.showMinimapAct.isChecked()
+
+    def updateMinimapVisibility(self):
+        if self.minimap is not None:
+            self.minimap.setVisible(self.showMinimap and self.minimap.hasImage())
+
+    def setOverlay(self, name, rects, color):
+        '''Replaces the named overlay with outlines of rects, in image coordinates'''
+        group = self._overlays.get(name)
+        if group is None:
+            group = QGraphicsItemGroup()
+            group.setZValue(1)
+            group.setVisible(self._overlayVisible.get(name, True))
+            self.scene.addItem(group)
+            self._overlays[name] = group
+
+        for item in group.childItems():
+            self.scene.removeItem(item)
+
+        # stays the same width on screen at any zoom
+        pen = QPen(QColor(color))
+        pen.setCosmetic(True)
+        pen.setWidth(2)
+
+        for rect in rects:
+            item = QGraphicsRectItem(rect)
+            item.setPen(pen)
+            group.addToGroup(item)
+
+    def clearOverlay(self, name):
+        self.setOverlay(name, [], Qt.transparent)
+
+    def setOverlayVisible(self, name, visible):
+        self._overlayVisible[name] = visible
+        if name in self._overlays:
+            self._overlays[name].setVisible(visible)
+
+    @property
+    def showCandidates(self):
+        return self._showCandidates
+
+    @showCandidates.setter
+    def showCandidates(self, value):
+        self._showCandidates = bool(value)
+        self.showCandidatesAct.setChecked(self._showCandidates)
+        self.setOverlayVisible('candidates', self._showCandidates)
+
+    def toggleCandidates(self):
+        self.showCandidates = self.showCandidatesAct.isChecked()
+
+    @property
+    def showOverlap(self):
+        return self._showOverlap
+
+    @showOverlap.setter
+    def showOverlap(self, value):
+        self._showOverlap = bool(value)
+        self.showOverlapAct.setChecked(self._showOverlap)
+        self.setOverlayVisible('overlap', self._showOverlap)
+
+    def toggleOverlap(self):
+        self.showOverlap = self.showOverlapAct.isChecked()
+
+    def setOverlapRect(self, rect):
+        '''Outlines the part of the image also seen in the previous frame, None for no overlap'''
+        self.setOverlay('overlap', [] if rect is None else [QRectF(rect)], QColor(255, 140, 0))
+
+    def setCandidateBoxes(self, boxes):
+        '''Outlines candidate animals, boxes are (x, y, width, height) in image pixels'''
+        self.setOverlay('candidates', [QRectF(*box) for box in boxes], Qt.yellow)
+
+    def scrollContentsBy(self, dx, dy):
+        super().scrollContentsBy(dx, dy)
+        self.updateVisibleTiles()
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.minimap is not None:
+            self.minimap.reposition()
+        self.updateVisibleTiles()
+
     def saveImage(self, fileName):
         image = self.flattenImage()
-        image.save(fileName)
+        if image is not None:
+            image.save(fileName)
 
     def flattenImageIfDrawnOn(self):
         if not len(self._drawnItems) == 0:
             self.flattenImage()
 
     def flattenImage(self):
+        '''Flattens the drawings into the main image and returns it, or None while previewing'''
+        if self._previewing:
+            # the preview would replace the tile, and the full image would never be swapped in
+            return None
+
+        with span('flatten', items=len(self._drawnItems)):
+            return self._flattenImage()
+
+    def _flattenImage(self):
 
         # get region of scene
         area = self.mainPixmapItem.boundingRect()
 
-        # create a QImage to render to and fix up a QPainter for it
-        image = QImage(area.width(), area.height(), QImage.Format_ARGB32_Premultiplied)
-        painter = QPainter(image)
+        # only the region under the drawings changed
+        changed = QRectF()
+        for item in self._drawnItems:
+            changed |= item.sceneBoundingRect()
+        changed = changed.toAlignedRect() & area.toAlignedRect()
+
+        # start from the current image rather than the tiles, which may not all exist
+        image = self.mainImage().convertToFormat(QImage.Format_ARGB32_Premultiplied)
+
+        if changed.isEmpty():
+            self.clearDrawnItems()
+            self.applyImageEdit(image)
+        else:
+            # render just the drawings in the changed region over the image
+            painter = QPainter(image)
+            hidden = [self.mainPixmapItem] + [g for g in self._overlays.values() if g.isVisible()]
+            for item in hidden:
+                item.setVisible(False)
+            self.scene.render(painter, QRectF(changed), QRectF(changed))
+            for item in hidden:
+                item.setVisible(True)
+            painter.end()
+
+            before = RegionSnapshot.fromImage(self.mainImage(), changed)
+            after = RegionSnapshot.fromImage(image, changed)
+
+            # pushing applies the flattened image and clears the drawings
+            self.history.push(FlattenCommand(self, self._drawnItems, before, after, image))
+
+        # return the flattened image
+        return image
 
-        # render the region of interest to the QImage
-        self.scene.render(painter, QRectF(image.rect()), area)
-        painter.end()
+    def mainImage(self):
+        return self.mainPixmapItem.image()
 
-        # set this flattened image to this view
-        pixmap = self.mainPixmapItem.pixmap()
-        pixmap.convertFromImage(image)
-        self.setMainPixmap(pixmap)
+    def mainImageArray(self, writable=False):
+        '''The (flattened) main image as a NumPy array sharing its memory, see ImageBuffer'''
+        from ImageBuffer import imageToArray
+        return imageToArray(self.mainImage(), writable)
 
-        # clear the drawings from the view
-        self.clearDrawnItems()
+    def applyImageEdit(self, image):
+        # set this image to this view
+        self.setMainImage(image)
 
         # emit flattened image signal
         self.imageFlattened.emit(image)
-
-        # return the flattened image
-        return image
+        self.updateMainImageMemory()
+
+    def drawnItems(self):
+        return self._drawnItems
+
+    def addDrawnItems(self, items):
+        for item in items:
+            if item.scene() is None:
+                self.scene.addItem(item)
+            if item not in self._drawnItems:
+                self._drawnItems.append(item)
+        self.updateDrawnItemsMemory()
+        self.updateMinimap()
+
+    def removeDrawnItems(self, items):
+        for item in items:
+            if item.scene() is not None:
+                self.scene.removeItem(item)
+            if item in self._drawnItems:
+                self._drawnItems.remove(item)
+        self.updateDrawnItemsMemory()
+        self.updateMinimap()
+
+    def updateDrawnItemsMemory(self):
+        # rough estimate, an ellipse item is a few hundred bytes of Qt state
+        memoryAccounting.track(self, 'drawn items', 1024 * len(self._drawnItems), 'painter')
 
     def clearDrawnItems(self):
-        for item in self._drawnItems:
-            self.scene.removeItem(item)
+        # drawings that were never flattened are discarded along with their history
+        while self._drawnItems:
+            command = self.history.nextUndoCommand()
+            if isinstance(command, DrawItemCommand) and command.item in self._drawnItems:
+                command.setObsolete(True)
+                self.history.undo()
+            else:
+                break
 
-        self._drawnItems.clear()
+        self.removeDrawnItems(list(self._drawnItems))
 
-    def removeLastDrawnItem(self):
-        try:
-            item = self._drawnItems.pop()
-        except IndexError:
-            pass
-        else:
-            self.scene.removeItem(item)
+    def clearHistory(self):
+        self.history.clear()
+
+    def undo(self):
+        command = self.history.nextUndoCommand()
+        if command is not None:
+            self.showEditTarget(command)
+            self.history.undo()
+
+    def redo(self):
+        command = self.history.nextRedoCommand()
+        if command is not None:
+            self.showEditTarget(command)
+            self.history.redo()
+
+    def showEditTarget(self, command):
+        if command.target is not None and command.target is not self.editTarget:
+            self.editTargetRequested.emit(command.target)
+
+    def updateHistoryActions(self):
+        self.undoAct.setEnabled(self.history.canUndoFurther())
+        self.redoAct.setEnabled(self.history.canRedo())
+
+    @property
+    def historyMemoryLimit(self):
+        return self.history.memoryLimit
+
+    @historyMemoryLimit.setter
+    def historyMemoryLimit(self, value):
+        self.history.setMemoryLimit(int(value))
+
+    def promptForHistoryMemoryLimit(self):
+        megabytes, okPressed = QInputDialog.getInt(self, 'Undo Memory','Undo history memory limit (MB):', self.historyMemoryLimit // 1024**2, 1, 4096, 1)
+        if okPressed:
+            self.historyMemoryLimit = megabytes * 1024**2
 
     def scaleView(self, scaleFactor):
         # print(f'self.width: {self.width()}')
         # print(f'pixmap.width(): {self.scene.map.mainPixmapItem.boundingRect().width()}')
+        self.beginMotion()
         self.scale(scaleFactor, scaleFactor)
+        self.updateVisibleTiles()
 
     def centerImage(self):
         self.centerOn(self.mainPixmapItem)
+        self.updateVisibleTiles()
 
     def bestFitImage(self):
+        self.beginMotion()
         self.fitInView(self.mainPixmapItem, Qt.KeepAspectRatio)
+        self.updateVisibleTiles()
 
     def keyPressEvent(self, event: QKeyEvent):
         key = event.key()
@@ -300,45 +686,90 @@ class QImagePainter(QSmoothGraphicsView):
 
     def mousePressEvent(self, event):
         self._drawStartPos = None
-        if self.ovalModeAct.isChecked():
+        if self._previewing and (self.ovalModeAct.isChecked() or self.stampModeAct.isChecked()):
+            # drawings would be flattened into the preview
+            event.ignore()
+        elif self.ovalModeAct.isChecked():
             if self.mainPixmapItem.isUnderMouse():
                 self._drawStartPos = self.mapToScene(event.pos())
                 self._dynamicOval = self.scene.addEllipse(
                     QRectF(self._drawStartPos.x(), self._drawStartPos.y(), 1, 1),
                     self._pen
                 )
+        elif self.stampModeAct.isChecked():
+            self.stampOval(event.pos())
         else:
             super().mousePressEvent(event)
 
     def mouseMoveEvent(self, event):
         if self._dynamicOval:
-            pos = self.mapToScene(event.pos())
-            self._dynamicOval.setRect(
-                QRectF(self._drawStartPos.x(), self._drawStartPos.y(),
-                pos.x() - self._drawStartPos.x(), pos.y() - self._drawStartPos.y())
-            )
+            # only remember the latest position while a frame is pending
+            self._pendingMovePos = event.pos()
+            if not self._moveTimer.isActive():
+                self.updateDynamicOval()
         else:
             super().mouseMoveEvent(event)
 
     def mouseReleaseEvent(self, event):
         if self._dynamicOval:
-            self._drawnItems.append(self._dynamicOval)
+            self._pendingMovePos = event.pos()
+            self.updateDynamicOval()
+            self._moveTimer.stop()
+            self.history.push(DrawItemCommand(self, self._dynamicOval, 'Draw Oval'))
             self._dynamicOval = None
         else:
             super().mouseReleaseEvent(event)
 
-    def toggleSelectionMode(self):
-        if self.selectionModeAct.isChecked():
-            self.ovalModeAct.setChecked(False)
+    def updateDynamicOval(self):
+        if self._dynamicOval is None or self._pendingMovePos is None:
+            return
+
+        pos = self.mapToScene(self._pendingMovePos)
+        self._pendingMovePos = None
+
+        self._dynamicOval.setRect(
+            QRectF(self._drawStartPos.x(), self._drawStartPos.y(),
+            pos.x() - self._drawStartPos.x(), pos.y() - self._drawStartPos.y())
+        )
+
+        # the next update waits a whole frame from this one, even after a timeout
+        self._moveTimer.start()
+
+    def stampOval(self, viewPos):
+        '''Draws a fixed size oval centered on the view position, if it is on the image'''
+        center = self.mapToScene(viewPos)
+        if self._previewing or not self.mainPixmapItem.contains(self.mainPixmapItem.mapFromScene(center)):
+            return
+
+        radius = self.stampSize / 2
+        item = self.scene.addEllipse(
+            QRectF(center.x() - radius, center.y() - radius, self.stampSize, self.stampSize),
+            self._pen
+        )
+        self.history.push(DrawItemCommand(self, item, 'Stamp Oval'))
+
+    def tabletEvent(self, event):
+        # in stamp mode the pen tip stamps directly; pressure is ignored.
+        # otherwise let Qt synthesize the usual mouse events
+        if self.stampModeAct.isChecked():
+            if event.type() == QEvent.TabletPress:
+                self.stampOval(event.pos())
+            event.accept()
         else:
-            self.selectionModeAct.setChecked(True)
-        self.updateDragMode()
+            super().tabletEvent(event)
+
+    def toggleSelectionMode(self):
+        self.setToolMode(self.selectionModeAct)
 
     def toggleOvalMode(self):
-        if self.ovalModeAct.isChecked():
-            self.selectionModeAct.setChecked(False)
-        else:
-            self.ovalModeAct.setChecked(True)
+        self.setToolMode(self.ovalModeAct)
+
+    def toggleStampMode(self):
+        self.setToolMode(self.stampModeAct)
+
+    def setToolMode(self, modeAct):
+        for act in (self.selectionModeAct, self.ovalModeAct, self.stampModeAct):
+            act.setChecked(act is modeAct)
         self.updateDragMode()
 
     def updateDragMode(self):
@@ -371,6 +802,11 @@ class QImagePainter(QSmoothGraphicsView):
         if okPressed:
             self.penWidth = width
 
+    def promptForStampSize(self):
+        size, okPressed = QInputDialog.getInt(self, 'Stamp Size','Stamp diameter (px):', self.stampSize, 1, 1000, 1)
+        if okPressed:
+            self.stampSize = size
+
     def setResourcePaths(self):
         if self.appContext is None:
             self.selectionModeFp = './icons/selectIcon.png'
@@ -390,40 +826,60 @@ class QImagePainter(QSmoothGraphicsView):
     def createActions(self):
         self.setResourcePaths()
         
-        self.selectionModeAct = QAction(QIcon(self.selectionModeFp), 'Select (v)', self, checkable=True, checked=True, shortcut=Qt.Key_V, triggered=self.toggleSelectionMode)
-        self.ovalModeAct = QAction(QIcon(self.ovalModeFp), 'Draw &Oval (o)', self, checkable=True, checked=False, shortcut=Qt.Key_O, triggered=self.toggleOvalMode)
-        self.flattenAct = QAction(QIcon(self.flattenFp), 'Save', self, shortcut=QKeySequence.Save, triggered=self.flattenImage)
-        self.undoAct = QAction(QIcon(self.undoFp), 'Undo', self, shortcut=QKeySequence.Undo, triggered=self.removeLastDrawnItem)
+        self.selectionModeAct = QAction(cachedIcon(self.selectionModeFp), 'Select (v)', self, checkable=True, checked=True, shortcut=Qt.Key_V, triggered=self.toggleSelectionMode)
+        self.ovalModeAct = QAction(cachedIcon(self.ovalModeFp), 'Draw &Oval (o)', self, checkable=True, checked=False, shortcut=Qt.Key_O, triggered=self.toggleOvalMode)
+        self.stampModeAct = QAction(cachedIcon(self.ovalModeFp), 'S&tamp Oval (t)', self, checkable=True, checked=False, shortcut=Qt.Key_T, triggered=self.toggleStampMode)
+        self.flattenAct = QAction(cachedIcon(self.flattenFp), 'Save', self, shortcut=QKeySequence.Save, triggered=self.flattenImage)
+        self.undoAct = QAction(cachedIcon(self.undoFp), 'Undo', self, shortcut=QKeySequence.Undo, triggered=self.undo)
+        self.redoAct = QAction('Redo', self, shortcut=QKeySequence.Redo, triggered=self.redo)
+        self.updateHistoryActions()
+
+        self.setHistoryMemoryLimitAct = QAction('Set Undo Memory Limit', self, triggered=self.promptForHistoryMemoryLimit)
 
-        self.setPenWidthAct = QAction(QIcon(self.penWidthFp), 'Set Pen Width', self, triggered=self.promptForPenWidth)
+        self.setPenWidthAct = QAction(cachedIcon(self.penWidthFp), 'Set Pen Width', self, triggered=self.promptForPenWidth)
+        self.setStampSizeAct = QAction(cachedIcon(self.ovalModeFp), 'Set Stamp Size', self, triggered=self.promptForStampSize)
+
+        self.cachedRenderingAct = QAction('Fast Navigation Rendering', self, checkable=True, checked=self.cachedRendering, triggered=self.toggleCachedRendering)
+        self.showMinimapAct = QAction('Show &Minimap', self, checkable=True, checked=self.showMinimap, shortcut=Qt.Key_M, triggered=self.toggleMinimap)
+        self.showOverlapAct = QAction('Show Frame Over&lap', self, checkable=True, checked=self.showOverlap, shortcut=Qt.Key_L, triggered=self.toggleOverlap)
+        self.showCandidatesAct = QAction('Show &Candidates', self, checkable=True, checked=self.showCandidates, shortcut=Qt.Key_C, triggered=self.toggleCandidates)
 
     def addPenToolMenu(self):
         penButton = QToolButton(self)
         penButton.setText('Pen')
-        penButton.setIcon(QIcon(self.penFp))
+        penButton.setIcon(cachedIcon(self.penFp))
         penButton.setPopupMode(QToolButton.InstantPopup)
 
         self.penMenu = QMenu(penButton)
         self.penMenu.addAction(self.setPenWidthAct)
+        self.penMenu.addAction(self.setStampSizeAct)
 
-        self.addPaletteToMenu(self.penMenu)
+        # the color swatches are only built when the menu is first opened
+        self._paletteAdded = False
+        self.penMenu.aboutToShow.connect(self.addPaletteToPenMenu)
 
         penButton.setMenu(self.penMenu)
 
         self.toolbar.addWidget(penButton)
 
     def setPenColor(self, color):
-        qColor = QColor(color)
+        self.penColor = color
+        self.updatePaletteChecks()
+
+    def updatePaletteChecks(self):
         for a in self.penMenu.actions():
-            a.setChecked(False)
             try:
                 actionColor = QColor(a.color)
             except AttributeError:
                 pass
             else:
-                if actionColor == qColor:
-                    a.setChecked(True)
-                    self.penColor = actionColor
+                a.setChecked(actionColor == self.penColor)
+
+    def addPaletteToPenMenu(self):
+        if not self._paletteAdded:
+            self._paletteAdded = True
+            self.addPaletteToMenu(self.penMenu)
+            self.updatePaletteChecks()
 
     def addPaletteToMenu(self, menu):
         for name, color in COLORS.items():
@@ -440,6 +896,7 @@ class QImagePainter(QSmoothGraphicsView):
         # self.toolbar.addSeparator()
         self.toolbar.addAction(self.selectionModeAct)
         self.toolbar.addAction(self.ovalModeAct)
+        self.toolbar.addAction(self.stampModeAct)
         self.addPenToolMenu()
 
 
@@ -0,0 +1,147 @@
+'''Accounts for the memory held by images, pixmaps and scene items.
+
+Owners report what they hold with memoryAccounting.track() and drop it with
+release(). QObject owners are released automatically when destroyed.
+Totals are kept per group (usually an image file name) and per category.
+'''
+
+import sip
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+
+def imageBytes(image):
+    if image is None or image.isNull():
+        return 0
+    return image.byteCount()
+
+
+def pixmapBytes(pixmap):
+    if pixmap is None or pixmap.isNull():
+        return 0
+    return pixmap.width() * pixmap.height() * pixmap.depth() // 8
+
+
+def formatBytes(nbytes):
+    for unit in ('B', 'KB', 'MB'):
+        if abs(nbytes) < 1024:
+            return f'{nbytes:.0f} {unit}'
+        nbytes /= 1024
+    return f'{nbytes:.1f} GB'
+
+
+class QMemoryAccounting(QObject):
+
+    # signals
+    usageChanged = pyqtSignal()
+    thresholdCrossed = pyqtSignal(int)
+
+    # minimum time (ms) between usageChanged signals
+    notifyInterval = 200
+
+    def __init__(self):
+        super().__init__()
+
+        # (owner id, category) -> (group, bytes)
+        self._entries = {}
+        self._watched = set()
+
+        self._threshold = 3 * 1024**3
+        self._overThreshold = False
+
+        # made on first use, once there is an application to run it
+        self._notifyTimer = None
+
+    @property
+    def threshold(self):
+        return self._threshold
+
+    @threshold.setter
+    def threshold(self, value):
+        self._threshold = int(value)
+        self._overThreshold = False
+        self._changed()
+
+    def track(self, owner, category, nbytes, group=None):
+        key = id(owner)
+        self._entries[(key, category)] = (group, nbytes)
+
+        # release everything a QObject held once it is destroyed
+        if isinstance(owner, QObject) and key not in self._watched:
+            self._watched.add(key)
+            owner.destroyed.connect(lambda _=None, key=key: self._releaseKey(key))
+
+        self._changed()
+
+    def release(self, owner, category=None):
+        self._releaseKey(id(owner), category)
+
+    def _releaseKey(self, key, category=None):
+        if category is None:
+            self._watched.discard(key)
+            for entry in [e for e in self._entries if e[0] == key]:
+                del self._entries[entry]
+        else:
+            self._entries.pop((key, category), None)
+        self._changed()
+
+    def total(self):
+        return sum(nbytes for _, nbytes in self._entries.values())
+
+    def byCategory(self):
+        totals = {}
+        for (_, category), (_, nbytes) in self._entries.items():
+            totals[category] = totals.get(category, 0) + nbytes
+        return totals
+
+    def byGroup(self):
+        '''Returns {group: {category: bytes}}'''
+        totals = {}
+        for (_, category), (group, nbytes) in self._entries.items():
+            categories = totals.setdefault(group, {})
+            categories[category] = categories.get(category, 0) + nbytes
+        return totals
+
+    def summary(self):
+        s = f'Total: {formatBytes(self.total())}\n'
+        for category, nbytes in sorted(self.byCategory().items()):
+            s += f'  {category}: {formatBytes(nbytes)}\n'
+        return s
+
+    def summaryHTML(self):
+        s = f'<p><b>Total: {formatBytes(self.total())}</b> (warning at {formatBytes(self.threshold)})</p>'
+        s += '<ul style="margin-top:0;">'
+        for category, nbytes in sorted(self.byCategory().items()):
+            s += f'<li>{category}: {formatBytes(nbytes)}</li>'
+        s += '</ul>'
+        for group, categories in sorted(self.byGroup().items(), key=lambda g: -sum(g[1].values())):
+            s += f'<p style="margin-bottom:0;">{group or "other"}: {formatBytes(sum(categories.values()))}</p>'
+        return s
+
+    def _changed(self):
+        # owners are still destroyed after the application has deleted the
+        # timer (or this object) at teardown, there is nobody left to notify
+        if sip.isdeleted(self) or (self._notifyTimer is not None and sip.isdeleted(self._notifyTimer)):
+            return
+
+        if self._notifyTimer is None:
+            self._notifyTimer = QTimer(self)
+            self._notifyTimer.setSingleShot(True)
+            self._notifyTimer.setInterval(self.notifyInterval)
+            self._notifyTimer.timeout.connect(self._notify)
+
+        if not self._notifyTimer.isActive():
+            self._notifyTimer.start()
+
+    def _notify(self):
+        total = self.total()
+        self.usageChanged.emit()
+
+        # only signal once per crossing, re-arm when usage drops back under
+        if total > self.threshold and not self._overThreshold:
+            self._overThreshold = True
+            self.thresholdCrossed.emit(total)
+        elif total <= self.threshold:
+            self._overThreshold = False
+
+
+memoryAccounting = QMemoryAccounting()
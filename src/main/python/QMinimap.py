@@ -0,0 +1,86 @@
+from PyQt5.QtCore import Qt, QSize, QRectF, QPointF
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QPen, QColor
+from PyQt5.QtWidgets import QWidget
+
+
+class QMinimap(QWidget):
+    '''Overview of the painter's image, with the viewport and marks drawn on it.
+
+    The image is downscaled once when it changes; repaints only draw the
+    cached thumbnail and a few outlines. Clicking or dragging centers the
+    painter on that spot.
+    '''
+
+    maxSize = 200
+    margin = 10
+
+    def __init__(self, painter):
+        super().__init__(painter)
+
+        self.painter = painter
+        self._thumbnail = QPixmap()
+        self._scale = 1.0
+
+        self.setCursor(Qt.PointingHandCursor)
+        self.hide()
+
+    def setImage(self, image: QImage, sceneSize: QSize = None):
+        '''sceneSize is the size the image is shown at in the painter, if it is scaled'''
+        if image.isNull():
+            self._thumbnail = QPixmap()
+            self.hide()
+            return
+
+        # cheap reduction to twice the size, then a smooth pass over the small image
+        size = QSize(self.maxSize, self.maxSize)
+        thumbnail = image.scaled(size * 2, Qt.KeepAspectRatio, Qt.FastTransformation)
+        thumbnail = thumbnail.scaled(size, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+
+        self._thumbnail = QPixmap.fromImage(thumbnail)
+        self._scale = thumbnail.width() / (image.width() if sceneSize is None else sceneSize.width())
+
+        self.resize(self._thumbnail.size())
+        self.reposition()
+        self.update()
+
+    def hasImage(self):
+        return not self._thumbnail.isNull()
+
+    def reposition(self):
+        parent = self.parentWidget()
+        self.move(parent.width() - self.width() - self.margin, self.margin)
+
+    def mapFromScene(self, rect: QRectF):
+        return QRectF(
+            rect.x() * self._scale, rect.y() * self._scale,
+            rect.width() * self._scale, rect.height() * self._scale
+        )
+
+    def mapToScene(self, pos):
+        return QPointF(pos.x() / self._scale, pos.y() / self._scale)
+
+    def paintEvent(self, event):
+        painter = QPainter(self)
+        painter.drawPixmap(0, 0, self._thumbnail)
+
+        # marks that have not been flattened into the image yet
+        painter.setRenderHint(QPainter.Antialiasing)
+        painter.setPen(QPen(self.painter.penColor, 1))
+        for item in self.painter.drawnItems():
+            painter.drawEllipse(self.mapFromScene(item.sceneBoundingRect()))
+
+        # current viewport
+        painter.setPen(QPen(QColor('White'), 2))
+        viewRect = self.mapFromScene(self.painter.visibleSceneRect()) & QRectF(self.rect())
+        painter.drawRect(viewRect.adjusted(1, 1, -1, -1))
+
+        painter.setPen(QPen(QColor('Black'), 1))
+        painter.drawRect(self.rect().adjusted(0, 0, -1, -1))
+        painter.end()
+
+    def mousePressEvent(self, event):
+        self.painter.centerOn(self.mapToScene(event.pos()))
+
+    def mouseMoveEvent(self, event):
+        if event.buttons() & Qt.LeftButton:
+            self.painter.centerOn(self.mapToScene(event.pos()))
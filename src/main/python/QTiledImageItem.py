@@ -0,0 +1,170 @@
+from PyQt5.QtCore import Qt, QRect, QRectF, QPointF
+from PyQt5.QtGui import QImage, QPixmap, QTransform
+from PyQt5.QtWidgets import QGraphicsItem, QGraphicsPixmapItem
+
+from Tracing import span
+from QMemoryAccounting import memoryAccounting, imageBytes, pixmapBytes
+
+
+class QTiledImageItem(QGraphicsItem):
+    '''Displays an image as a grid of fixed size pixmap tiles.
+
+    Tiles are only converted to pixmaps once they come into view and are
+    dropped again once they leave it, so memory and per-frame cost follow
+    the viewport rather than the size of the image.
+
+    Zoomed out, tiles come from a copy of the image downsampled by a power
+    of two, the smallest that still has a pixel per screen pixel. Fitting a
+    whole frame in view then uploads about a screenful of pixels however
+    large the frame is.
+    '''
+
+    tileSize = 1024
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        self._image = QImage()
+
+        # level -> image downsampled 2**level times, made when first shown
+        self._levels = {}
+        self._level = 0
+
+        # (level, row, col) -> pixmap item
+        self._tiles = {}
+
+        self._transformationMode = Qt.FastTransformation
+        self._tileCacheMode = QGraphicsItem.NoCache
+
+    def boundingRect(self):
+        return QRectF(self._image.rect())
+
+    def paint(self, painter, option, widget=None):
+        # the tiles paint themselves
+        pass
+
+    def image(self):
+        return self._image
+
+    def setImage(self, image: QImage):
+        self.prepareGeometryChange()
+        self.clearTiles()
+        self._image = image
+        self._levels = {0: image}
+        self._level = 0
+        memoryAccounting.release(self, 'painter levels')
+
+    def pixmap(self):
+        '''Full size pixmap of the image. Expensive for large images'''
+        return QPixmap.fromImage(self._image)
+
+    def setPixmap(self, pixmap):
+        self.setImage(pixmap.toImage())
+
+    def setTransformationMode(self, mode):
+        self._transformationMode = mode
+        for tile in self._tiles.values():
+            tile.setTransformationMode(mode)
+
+    def setCacheMode(self, mode):
+        self._tileCacheMode = mode
+        for tile in self._tiles.values():
+            tile.setCacheMode(mode)
+
+    def tileCount(self):
+        return len(self._tiles)
+
+    def level(self):
+        '''The level of detail of the tiles shown, 0 is full resolution'''
+        return self._level
+
+    def levelFor(self, scale):
+        '''The level to show at scale screen pixels per image pixel'''
+        level = 0
+        size = max(self._image.width(), self._image.height())
+        # no point downsampling past a single tile
+        while scale * 2 ** (level + 1) <= 1 and size > self.tileSize:
+            level += 1
+            size //= 2
+        return level
+
+    def levelImage(self, level):
+        '''The image downsampled 2**level times, made from the level above it'''
+        if level not in self._levels:
+            above = self.levelImage(level - 1)
+            width, height = max(1, above.width() // 2), max(1, above.height() // 2)
+            with span('downsample', level=level, width=width, height=height):
+                self._levels[level] = above.scaled(width, height, Qt.IgnoreAspectRatio, Qt.SmoothTransformation)
+            memoryAccounting.track(
+                self, 'painter levels',
+                sum(imageBytes(image) for lvl, image in self._levels.items() if lvl > 0), 'painter'
+            )
+        return self._levels[level]
+
+    def tileRects(self, rect: QRectF, level=0):
+        '''Yields (row, col, tile rect) for each tile of a level intersecting rect, in that level's pixels'''
+        imageRect = self.levelImage(level).rect()
+        bounds = rect.toAlignedRect() & imageRect
+        if bounds.isEmpty():
+            return
+
+        size = self.tileSize
+        for row in range(bounds.top() // size, bounds.bottom() // size + 1):
+            for col in range(bounds.left() // size, bounds.right() // size + 1):
+                yield row, col, QRect(col * size, row * size, size, size) & imageRect
+
+    def _levelTransform(self, level):
+        '''Maps a level's pixels to the full image's'''
+        image = self.levelImage(level)
+        return QTransform.fromScale(self._image.width() / image.width(), self._image.height() / image.height())
+
+    def updateVisibleTiles(self, visibleRect: QRectF, viewScale=1.0):
+        '''Creates the tiles that came into view and drops those well outside it.
+
+        visibleRect is in scene coordinates, viewScale is the view's zoom.
+        '''
+        if self._image.isNull():
+            return
+
+        # the item itself is scaled while showing a preview
+        self._level = self.levelFor(viewScale * self.sceneTransform().m11())
+        toLevel = self._levelTransform(self._level).inverted()[0]
+
+        # keep a tile of margin so small pans don't churn tiles
+        margin = self.tileSize
+        wanted = toLevel.mapRect(self.mapRectFromScene(visibleRect)).adjusted(-margin, -margin, margin, margin)
+
+        keys = set()
+        for row, col, rect in self.tileRects(wanted, self._level):
+            key = (self._level, row, col)
+            keys.add(key)
+            if key not in self._tiles:
+                self._tiles[key] = self._createTile(self._level, rect)
+
+        for key in set(self._tiles) - keys:
+            self._removeTile(self._tiles.pop(key))
+
+    def clearTiles(self):
+        for tile in self._tiles.values():
+            self._removeTile(tile)
+        self._tiles.clear()
+
+    def _createTile(self, level, rect: QRect):
+        with span('pixmap upload', level=level, width=rect.width(), height=rect.height()):
+            pixmap = QPixmap.fromImage(self.levelImage(level).copy(rect))
+
+        tile = QGraphicsPixmapItem(pixmap, self)
+        memoryAccounting.track(tile, 'painter tiles', pixmapBytes(pixmap), 'painter')
+        transform = self._levelTransform(level)
+        tile.setTransform(transform)
+        tile.setPos(transform.map(QPointF(rect.topLeft())))
+        tile.setTransformationMode(self._transformationMode)
+        tile.setCacheMode(self._tileCacheMode)
+        return tile
+
+    def _removeTile(self, tile):
+        memoryAccounting.release(tile)
+        if tile.scene() is not None:
+            tile.scene().removeItem(tile)
+        else:
+            tile.setParentItem(None)
@@ -0,0 +1,226 @@
+'''Decoded tiles kept uncompressed in one memory-mapped file per transect.
+
+Reopening a frame from the PNG tile cache (see TileCache.py) still decodes
+every tile. The store instead keeps the tiles of <dir>'s frames as raw
+Format_RGB32 pixels in <dir>/.gamecounter-tiles/tiles.raw, each tile
+starting on a page boundary, with tiles.json indexing where they are. The
+file is memory-mapped and tiles are QImages over the mapped pages, so a
+reopened frame costs no decode and the OS page cache decides what stays
+resident.
+
+The mapping is copy-on-write: inking a tile copies its pages privately and
+never reaches the file. A frame's tiles are dropped when its source file
+changes, and the file is rewritten without dead tiles once they outweigh
+the live ones.
+'''
+
+import ctypes
+import json
+import mmap
+import os
+import threading
+from pathlib import Path
+
+import sip
+from PyQt5.QtGui import QImage
+
+import TileCache
+from Tracing import span
+
+storeName = 'tiles.raw'
+indexName = 'tiles.json'
+
+tileFormat = QImage.Format_RGB32
+
+
+def _align(offset):
+    return -(-offset // mmap.ALLOCATIONGRANULARITY) * mmap.ALLOCATIONGRANULARITY
+
+
+def mapImage(mapped, offset, width, height, bytesPerLine, fmt=tileFormat):
+    '''Returns a QImage over the pixels at offset in a writable (e.g. copy-on-write) mmap.
+
+    The mapping stays open as long as the returned wrapper does, and no
+    longer: Qt's own copies of the image (QImage(image), a QImage signal
+    argument) share its pixels without keeping the mapping. Keep the wrapper
+    itself, or image.copy() what outlives it.
+    '''
+    buffer = (ctypes.c_char * (height * bytesPerLine)).from_buffer(mapped, offset)
+    image = QImage(sip.voidptr(ctypes.addressof(buffer)), width, height, bytesPerLine, fmt)
+
+    # the image has no claim on the mapping, the buffer holds it open
+    image._buffer = buffer
+    return image
+
+
+class TileStore:
+    '''The raw tiles of the frames in one directory'''
+
+    def __init__(self, directory):
+        self.directory = Path(directory) / TileCache.cacheDirName
+        self.storeFile = self.directory / storeName
+        self.indexFile = self.directory / indexName
+
+        # writes come from the thread pool
+        self._lock = threading.Lock()
+        self._map = None
+        self._index = self._readIndex()
+
+    def _readIndex(self):
+        try:
+            with open(self.indexFile) as f:
+                index = json.load(f)
+            size = self.storeFile.stat().st_size
+        except (OSError, ValueError):
+            return {}
+
+        # interrupted while the store was written, its frames are redone
+        if index.get('size') != size:
+            return {}
+        return index['frames']
+
+    def _writeIndex(self):
+        tmp = self.indexFile.with_name(indexName + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump({'size': self.storeFile.stat().st_size, 'frames': self._index}, f)
+        os.replace(str(tmp), str(self.indexFile))
+
+    def _mapped(self, end):
+        '''The file mapped at least up to end, remapped if it has grown since'''
+        if self._map is None or len(self._map) < end:
+            with open(self.storeFile, 'rb') as f:
+                # images over an earlier mapping keep it alive
+                self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+        return self._map
+
+    def isStored(self, imgPath, rows, cols):
+        entry = self._index.get(Path(imgPath).name)
+        return (
+            entry is not None
+            and entry['stamp'] == TileCache.fileStamp(imgPath)
+            and entry['rows'] == rows
+            and entry['cols'] == cols
+        )
+
+    def readTiles(self, imgPath, rows, cols):
+        '''Returns the stored tiles as a rows x cols list of lists, or None'''
+        with self._lock:
+            if not self.isStored(imgPath, rows, cols):
+                return None
+
+            entry = self._index[Path(imgPath).name]
+            end = max(offset + height * bytesPerLine for offset, _, height, bytesPerLine in entry['tiles'])
+            try:
+                mapped = self._mapped(end)
+            except (OSError, ValueError):
+                return None
+            if len(mapped) < end:
+                return None
+
+            tiles = []
+            for row in range(rows):
+                imageRow = []
+                for col in range(cols):
+                    imageRow.append(mapImage(mapped, *entry['tiles'][row * cols + col]))
+                tiles.append(imageRow)
+            return tiles
+
+    def writeTiles(self, imgPath, tiles, stamp):
+        '''Appends a frame's tiles, stamp is its source's TileCache.fileStamp when they were read'''
+        tiles = [[tile.convertToFormat(tileFormat) for tile in imgRow] for imgRow in tiles]
+
+        with self._lock:
+            self.directory.mkdir(parents=True, exist_ok=True)
+
+            placed = []
+            with open(self.storeFile, 'ab') as f:
+                offset = f.tell()
+                for imgRow in tiles:
+                    for tile in imgRow:
+                        start = _align(offset)
+                        f.write(b'\0' * (start - offset))
+                        f.write(tile.constBits().asstring(tile.byteCount()))
+                        placed.append([start, tile.width(), tile.height(), tile.bytesPerLine()])
+                        offset = start + tile.byteCount()
+
+            # the index goes last, so a half written frame is never read
+            self._index[Path(imgPath).name] = {
+                'stamp': stamp,
+                'rows': len(tiles),
+                'cols': len(tiles[0]),
+                'tiles': placed,
+            }
+            self._writeIndex()
+
+            if self._deadBytes() > self._liveBytes():
+                self._compact()
+
+    def _liveBytes(self):
+        return sum(
+            _align(height * bytesPerLine)
+            for entry in self._index.values()
+            for _, _, height, bytesPerLine in entry['tiles']
+        )
+
+    def _deadBytes(self):
+        try:
+            return self.storeFile.stat().st_size - self._liveBytes()
+        except OSError:
+            return 0
+
+    def _compact(self):
+        '''Rewrites the store with only the tiles of current frames'''
+        index = {}
+
+        tmp = self.storeFile.with_name(storeName + '.tmp')
+        with open(self.storeFile, 'rb') as src, open(tmp, 'wb') as dst:
+            for name, entry in self._index.items():
+                if entry['stamp'] != TileCache.fileStamp(self.directory.parent / name):
+                    continue
+
+                placed = []
+                for offset, width, height, bytesPerLine in entry['tiles']:
+                    start = _align(dst.tell())
+                    dst.write(b'\0' * (start - dst.tell()))
+                    src.seek(offset)
+                    dst.write(src.read(height * bytesPerLine))
+                    placed.append([start, width, height, bytesPerLine])
+                index[name] = dict(entry, tiles=placed)
+
+        # the old file stays mapped until its last tile is gone
+        try:
+            os.replace(str(tmp), str(self.storeFile))
+        except OSError:
+            # e.g. on Windows while it is mapped, try again next time
+            os.remove(str(tmp))
+            return
+
+        self._map = None
+        self._index = index
+        self._writeIndex()
+
+
+_stores = {}
+_storesLock = threading.Lock()
+
+
+def store(imgPath):
+    '''The store of the transect imgPath is part of'''
+    directory = Path(imgPath).parent
+    with _storesLock:
+        if directory not in _stores:
+            _stores[directory] = TileStore(directory)
+        return _stores[directory]
+
+
+def readTiles(imgPath, rows, cols):
+    return store(imgPath).readTiles(imgPath, rows, cols)
+
+
+def writeTiles(imgPath, tiles, stamp):
+    try:
+        with span('tile store write', path=str(imgPath)):
+            store(imgPath).writeTiles(imgPath, tiles, stamp)
+    except OSError:
+        # a read only or full disk just isn't stored
+        pass
@@ -0,0 +1,53 @@
+'''Caches resources read from disk or painted at runtime, so each is only built once'''
+
+from PyQt5.QtCore import QFile, QTextStream
+from PyQt5.QtGui import QIcon, QPixmap, QColor
+
+_styleSheets = {}
+_icons = {}
+_palettePixmaps = {}
+
+
+def cachedStyleSheet(fp):
+    '''Returns the text of the style sheet at fp, reading the file only once'''
+    fp = str(fp)
+    try:
+        return _styleSheets[fp]
+    except KeyError:
+        f = QFile(fp)
+        f.open(QFile.ReadOnly | QFile.Text)
+        stream = QTextStream(f)
+        styleSheet = stream.readAll()
+        f.close()
+
+        _styleSheets[fp] = styleSheet
+        return styleSheet
+
+
+def cachedIcon(fp):
+    '''Returns the icon at fp, loading it only once'''
+    fp = str(fp)
+    try:
+        return _icons[fp]
+    except KeyError:
+        icon = QIcon(fp)
+        _icons[fp] = icon
+        return icon
+
+
+def cachedPalettePixmap(color, size=100):
+    '''Returns a square pixmap filled with color, painting it only once'''
+    key = (QColor(color).name(), size)
+    try:
+        return _palettePixmaps[key]
+    except KeyError:
+        pixmap = QPixmap(size, size)
+        pixmap.fill(QColor(color))
+        _palettePixmaps[key] = pixmap
+        return pixmap
+
+
+def clearResourceCache():
+    _styleSheets.clear()
+    _icons.clear()
+    _palettePixmaps.clear()
@@ -0,0 +1,34 @@
+'''Measures how long the application takes to show its first window.
+
+Import this module first so the clock starts before the heavy imports.
+Set GAMECOUNTER_STARTUP_REPORT=1 to print the report on startup.
+'''
+
+import os
+import time
+
+_start = time.perf_counter()
+_marks = []
+
+
+def enabled():
+    return os.environ.get('GAMECOUNTER_STARTUP_REPORT', '') not in ('', '0')
+
+
+def mark(name):
+    _marks.append((name, time.perf_counter()))
+
+
+def report():
+    s = 'Startup timing\n'
+    previous = _start
+    for name, t in _marks:
+        s += f'  {name:<24} +{1000 * (t - previous):7.1f} ms  {1000 * (t - _start):7.1f} ms\n'
+        previous = t
+    return s
+
+
+def firstWindowShown():
+    mark('first window shown')
+    if enabled():
+        print(report())
@@ -0,0 +1,110 @@
+'''Background analysis of grid tiles as they are loaded.
+
+Each tile of a loaded grid is run through CandidateDetector and
+TileStatistics on the thread pool. Results are kept per tile, keyed by (image path, row, col), so they
+survive grids being reordered or removed and reopened.
+'''
+
+from PyQt5.QtCore import QObject, QThreadPool, pyqtSignal, pyqtSlot
+
+from QWorker import Worker
+from Tracing import span
+
+
+def tileKey(grid, row, col):
+    return str(grid.imgPath), row, col
+
+
+# brightness spread, in grey levels, under which a tile with few edges is featureless
+featurelessSpread = 40.0
+
+
+def analyzeTile(key, array):
+    # imported here so numpy loads with the first tile, not at startup
+    import CandidateDetector
+    import TileStatistics
+
+    with span('detect candidates', path=key[0], row=key[1], col=key[2]):
+        candidates = CandidateDetector.detect(array)
+
+    with span('tile statistics', path=key[0], row=key[1], col=key[2]):
+        stats = TileStatistics.compute(array)
+
+    return key, candidates, stats
+
+
+def isFeatureless(stats, threshold):
+    '''Whether a tile with these TileStats has less than threshold percent edge pixels and little contrast'''
+    return stats.edgeDensity < threshold and stats.histogramSpread < featurelessSpread
+
+
+class QTileAnalysis(QObject):
+
+    # signals
+    tileAnalyzed = pyqtSignal(object) # tile key
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+
+        # tile key -> Candidates, TileStats
+        self._candidates = {}
+        self._stats = {}
+        self._pending = set()
+
+        self.threadPool = QThreadPool.globalInstance()
+
+    def analyzeGrid(self, grid):
+        for row, arrayRow in enumerate(grid.tileArrays()):
+            for col, array in enumerate(arrayRow):
+                key = tileKey(grid, row, col)
+                if key in self._candidates or key in self._pending:
+                    continue
+
+                self._pending.add(key)
+                worker = Worker(analyzeTile, key, array)
+                worker.signals.result.connect(self._tileAnalyzed)
+                # a tile whose analysis failed is tried again the next time its grid loads
+                worker.signals.error.connect(lambda error, key=key: self._pending.discard(key))
+                self.threadPool.start(worker)
+
+    @pyqtSlot(object)
+    def _tileAnalyzed(self, result):
+        key, candidates, stats = result
+        if key not in self._pending:
+            # forgotten while it was being analyzed
+            return
+
+        self._pending.discard(key)
+        self._candidates[key] = candidates
+        self._stats[key] = stats
+        self.tileAnalyzed.emit(key)
+
+    def forgetGrid(self, grid):
+        path = str(grid.imgPath)
+        for key in [k for k in self._candidates if k[0] == path]:
+            del self._candidates[key]
+            del self._stats[key]
+        self._pending = {k for k in self._pending if k[0] != path}
+
+    def candidates(self, key):
+        '''Returns the Candidates found in a tile, or None if it hasn't been analyzed'''
+        return self._candidates.get(key)
+
+    def score(self, key):
+        candidates = self._candidates.get(key)
+        return None if candidates is None else candidates.score
+
+    def stats(self, key):
+        '''Returns the TileStats of a tile, or None if it hasn't been analyzed'''
+        return self._stats.get(key)
+
+    def isFeatureless(self, key, threshold):
+        stats = self._stats.get(key)
+        return stats is not None and isFeatureless(stats, threshold)
+
+    def analyzedKeys(self):
+        return list(self._stats)
+
+    def ranking(self):
+        '''Analyzed tile keys, most likely to hold animals first'''
+        return sorted(self._candidates, key=lambda k: (-self._candidates[k].score, k))
@@ -0,0 +1,200 @@
+'''Images pre-cut into grid tiles and thumbnails, cached on disk.
+
+The tiles of <dir>/<name> live in <dir>/.gamecounter-tiles/<name>/ next to a
+manifest.json recording the grid shape and the size and modification time of
+the source image. A cache whose source has changed since is ignored.
+
+Nothing here needs widgets or an application, so it can run in worker
+processes (see pretile.py).
+'''
+
+import json
+import os
+from pathlib import Path
+
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+import ExifReader
+
+cacheDirName = '.gamecounter-tiles'
+manifestName = 'manifest.json'
+
+# tiles are lossless so saving an inked image doesn't compound JPEG loss,
+# a high quality means light, fast PNG compression
+tileFormat = 'PNG'
+tileQuality = 80
+
+thumbnailName = 'thumbnail.jpg'
+thumbnailSize = 512
+thumbnailQuality = 85
+
+
+def splitImage(img, rows, cols):
+    '''Crops img into a rows x cols list of lists of tiles, in one of pixelFormats'''
+    img = toPixelFormat(img)
+
+    width = img.width()
+    height = img.height()
+
+    segmentWidth = width / cols
+    segmentHeight = height / rows
+
+    # hold list of image labels
+    splitImageList = []
+    imageRow = []
+
+    # crop image into AxB
+    for row in range(rows):
+        for col in range(cols):
+
+            x = width - (cols - col) * segmentWidth
+            y = height - (rows - row) * segmentHeight
+
+            cropped = img.copy(x, y, segmentWidth, segmentHeight)
+            imageRow.append(cropped)
+
+        splitImageList.append(imageRow.copy())
+        imageRow.clear()
+
+    return splitImageList
+
+
+# formats tiles are kept in, which analysis (see ImageBuffer) reads as colors
+pixelFormats = (QImage.Format_RGB32, QImage.Format_ARGB32, QImage.Format_ARGB32_Premultiplied)
+
+
+def toPixelFormat(img):
+    '''img in RGB32, or ARGB32 if it has alpha. Converts 1-bit, indexed, 16-bit and other formats'''
+    if img.isNull() or img.format() in pixelFormats:
+        return img
+    return img.convertToFormat(QImage.Format_ARGB32 if img.hasAlphaChannel() else QImage.Format_RGB32)
+
+
+def cacheDirectory(imgPath):
+    imgPath = Path(imgPath)
+    return imgPath.parent / cacheDirName / imgPath.name
+
+
+def tileName(row, col):
+    return f'r{row}c{col}.{tileFormat.lower()}'
+
+
+def _sourceStamp(imgPath):
+    stat = Path(imgPath).stat()
+    return {'mtime': stat.st_mtime_ns, 'size': stat.st_size}
+
+
+def fileStamp(fp):
+    '''[mtime, size] of a file, to tell whether it changed since, or None if it is missing'''
+    try:
+        stat = Path(fp).stat()
+    except OSError:
+        return None
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def _currentManifest(imgPath):
+    '''Returns the manifest if the source hasn't changed since it was cached, otherwise None'''
+    try:
+        with open(cacheDirectory(imgPath) / manifestName) as f:
+            manifest = json.load(f)
+        stamp = _sourceStamp(imgPath)
+    except (OSError, ValueError):
+        return None
+
+    return manifest if manifest.get('source') == stamp else None
+
+
+def readManifest(imgPath, rows, cols):
+    '''Returns the manifest if the cache is current for this grid shape, otherwise None'''
+    manifest = _currentManifest(imgPath)
+    if manifest is None or manifest.get('rows') != rows or manifest.get('cols') != cols:
+        return None
+    return manifest
+
+
+def isCached(imgPath, rows, cols):
+    return readManifest(imgPath, rows, cols) is not None
+
+
+def readTiles(imgPath, rows, cols):
+    '''Returns the cached tiles as a rows x cols list of lists, or None'''
+    manifest = readManifest(imgPath, rows, cols)
+    if manifest is None:
+        return None
+
+    directory = cacheDirectory(imgPath)
+    tiles = []
+    for row in range(rows):
+        imageRow = []
+        for col in range(cols):
+            tile = QImage(str(directory / tileName(row, col)))
+            if tile.isNull():
+                return None
+            imageRow.append(toPixelFormat(tile))
+        tiles.append(imageRow)
+    return tiles
+
+
+def readThumbnail(imgPath):
+    '''Returns the cached thumbnail, or None if there is none or its source has changed'''
+    if _currentManifest(imgPath) is None:
+        return None
+
+    directory = cacheDirectory(imgPath)
+    thumbnail = QImage(str(directory / thumbnailName))
+    return None if thumbnail.isNull() else thumbnail
+
+
+def readAnyThumbnail(imgPath):
+    '''Returns the cached thumbnail, else the one embedded in the EXIF, else None'''
+    thumbnail = readThumbnail(imgPath)
+    if thumbnail is not None:
+        return thumbnail
+
+    try:
+        data = ExifReader.readThumbnail(imgPath)
+    except OSError:
+        return None
+    thumbnail = None if data is None else QImage.fromData(data)
+    return None if thumbnail is None or thumbnail.isNull() else thumbnail
+
+
+def writeTiles(imgPath, rows, cols, img=None):
+    '''Cuts the image at imgPath into tiles and a thumbnail and caches them.
+
+    img is the already decoded image, if there is one. Returns the manifest,
+    or None if the image can't be read.
+    '''
+    stamp = _sourceStamp(imgPath)
+    if img is None:
+        img = QImage(str(imgPath))
+    if img.isNull():
+        return None
+
+    directory = cacheDirectory(imgPath)
+    directory.mkdir(parents=True, exist_ok=True)
+
+    for row, imgRow in enumerate(splitImage(img, rows, cols)):
+        for col, tile in enumerate(imgRow):
+            tile.save(str(directory / tileName(row, col)), tileFormat, tileQuality)
+
+    thumbnail = img.scaled(thumbnailSize, thumbnailSize, Qt.KeepAspectRatio, Qt.SmoothTransformation)
+    thumbnail.save(str(directory / thumbnailName), 'JPG', thumbnailQuality)
+
+    manifest = {
+        'source': stamp,
+        'rows': rows,
+        'cols': cols,
+        'width': img.width(),
+        'height': img.height(),
+    }
+
+    # the manifest goes last, so a half written cache is never read
+    tmp = directory / (manifestName + '.tmp')
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f)
+    os.replace(str(tmp), str(directory / manifestName))
+
+    return manifest
@@ -0,0 +1,37 @@
+'''Cheap texture statistics of a tile, used to tell featureless tiles apart.
+
+Water, sky and uniform sand have few edges and a narrow range of
+brightness; anything an annotator needs to look at has more of both.
+'''
+
+from collections import namedtuple
+
+import numpy as np
+
+from CandidateDetector import blockMean, luminance, downsample
+
+# variance of the brightness, percent of edge pixels, and the spread
+# (5th to 95th percentile) of the brightness histogram in grey levels
+TileStats = namedtuple('TileStats', 'variance edgeDensity histogramSpread')
+
+# gradient, in grey levels per downsampled pixel, of an edge pixel
+edgeThreshold = 12.0
+
+
+def compute(array):
+    '''Statistics of a uint8 tile array, see ImageBuffer.imageToArray'''
+    gray = blockMean(luminance(array), downsample)
+    if gray.size == 0:
+        return TileStats(0.0, 0.0, 0.0)
+
+    dy = np.abs(np.diff(gray, axis=0))[:, :-1]
+    dx = np.abs(np.diff(gray, axis=1))[:-1, :]
+    edges = np.maximum(dx, dy) > edgeThreshold
+
+    low, high = np.percentile(gray, (5, 95))
+
+    return TileStats(
+        float(gray.var()),
+        100 * float(edges.mean()) if edges.size else 0.0,
+        float(high - low),
+    )
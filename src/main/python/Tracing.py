@@ -0,0 +1,144 @@
+'''Lightweight tracing of hot paths, exported in the Chrome/Perfetto trace format.
+
+Wrap work in a span:
+
+    with span('split', path=str(path)):
+        ...
+
+Tracing is off by default, and a disabled span costs one flag check.
+Set GAMECOUNTER_TRACE=1 to start with tracing on, or GAMECOUNTER_TRACE=<file.json>
+to also write the trace to that file on exit. Traces open in chrome://tracing
+or https://ui.perfetto.dev.
+'''
+
+import atexit
+import json
+import os
+import threading
+import time
+
+# stop recording past this many events, so a forgotten trace can't eat memory
+maxEvents = 1000000
+
+_enabled = False
+_events = []
+_lock = threading.Lock()
+_epoch = time.perf_counter()
+_pid = os.getpid()
+
+
+class _NullSpan:
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_nullSpan = _NullSpan()
+
+
+class _Span:
+
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name, args):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        _record({
+            'name': self.name,
+            'cat': 'app',
+            'ph': 'X',
+            'ts': (self.start - _epoch) * 1e6,
+            'dur': (end - self.start) * 1e6,
+            'pid': _pid,
+            'tid': threading.get_ident(),
+            'args': self.args,
+        })
+        return False
+
+
+def _record(event):
+    with _lock:
+        if len(_events) < maxEvents:
+            _events.append(event)
+
+
+def span(name, **args):
+    '''Context manager timing the enclosed block as a named span'''
+    if not _enabled:
+        return _nullSpan
+    return _Span(name, args)
+
+
+def instant(name, **args):
+    '''Records a single point in time'''
+    if _enabled:
+        _record({
+            'name': name,
+            'cat': 'app',
+            'ph': 'i',
+            's': 't',
+            'ts': (time.perf_counter() - _epoch) * 1e6,
+            'pid': _pid,
+            'tid': threading.get_ident(),
+            'args': args,
+        })
+
+
+def isEnabled():
+    return _enabled
+
+
+def setEnabled(enabled):
+    global _enabled
+    _enabled = bool(enabled)
+
+
+def clear():
+    with _lock:
+        _events.clear()
+
+
+def eventCount():
+    return len(_events)
+
+
+def events():
+    with _lock:
+        return list(_events)
+
+
+def export(fp):
+    '''Writes the recorded events to fp as Chrome trace JSON'''
+    threadNames = {t.ident: t.name for t in threading.enumerate()}
+
+    recorded = events()
+    metadata = [
+        {'name': 'thread_name', 'ph': 'M', 'pid': _pid, 'tid': tid, 'args': {'name': threadNames.get(tid, str(tid))}}
+        for tid in {e['tid'] for e in recorded}
+    ]
+
+    with open(fp, 'w') as f:
+        json.dump({'traceEvents': metadata + recorded, 'displayTimeUnit': 'ms'}, f, default=str)
+
+
+def _initFromEnvironment():
+    value = os.environ.get('GAMECOUNTER_TRACE', '')
+    if value in ('', '0'):
+        return
+
+    setEnabled(True)
+    if value != '1':
+        atexit.register(export, value)
+
+
+_initFromEnvironment()
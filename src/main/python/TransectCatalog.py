@@ -0,0 +1,126 @@
+'''Catalog of a transect's frames built from file headers only.
+
+Dimensions, capture time, GPS position, altitude and camera come from
+ExifReader, read for many files at once on a thread pool. The catalog is
+cached in catalog.json in the tile cache folder of each transect, so
+reopening a transect reads no image files at all.
+
+Inked frames are saved without EXIF, so they take their capture time and
+position from the frame they were inked from.
+'''
+
+import json
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+import ExifReader
+import TileCache
+from Tracing import span
+
+catalogName = 'catalog.json'
+
+
+def _catalogFile(directory):
+    return Path(directory) / TileCache.cacheDirName / catalogName
+
+
+def _basePath(fp):
+    match = re.match('(.*)_Inked$', fp.stem)
+    return None if match is None else fp.parent / (match.group(1) + fp.suffix)
+
+
+def _readEntry(fp):
+    stamp = TileCache.fileStamp(fp)
+    try:
+        metadata = ExifReader.readMetadata(fp)
+    except Exception:
+        # an unreadable or damaged header only costs the frame its metadata
+        metadata = dict.fromkeys(ExifReader.fields)
+    return fp, {'stamp': stamp, 'metadata': metadata}
+
+
+def readCatalog(paths, jobs=None):
+    '''Returns {path: metadata} for the image paths, see ExifReader.fields'''
+    paths = [Path(fp) for fp in paths]
+
+    byDirectory = {}
+    for fp in paths:
+        byDirectory.setdefault(fp.parent, []).append(fp)
+
+    catalog = {}
+    with span('catalog', files=len(paths)):
+        for directory, directoryPaths in byDirectory.items():
+            entries = _loadEntries(directory)
+
+            # inked frames need their base frame's entry too
+            wanted = set(directoryPaths)
+            for fp in directoryPaths:
+                base = _basePath(fp)
+                if base is not None and base.exists():
+                    wanted.add(base)
+
+            stale = [fp for fp in wanted if entries.get(fp.name, {}).get('stamp') != TileCache.fileStamp(fp)]
+            if stale:
+                with ThreadPoolExecutor(jobs or min(32, 4 * (os.cpu_count() or 1))) as pool:
+                    for fp, entry in pool.map(_readEntry, stale):
+                        entries[fp.name] = entry
+                _saveEntries(directory, entries)
+
+            for fp in directoryPaths:
+                metadata = dict(entries[fp.name]['metadata'])
+                base = _basePath(fp)
+                if base is not None and base.name in entries and metadata['captureTime'] is None:
+                    baseMetadata = entries[base.name]['metadata']
+                    for field in ('captureTime', 'latitude', 'longitude', 'altitude', 'make', 'model'):
+                        metadata[field] = baseMetadata[field]
+                catalog[fp] = metadata
+
+    return catalog
+
+
+def _loadEntries(directory):
+    try:
+        with open(_catalogFile(directory)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _saveEntries(directory, entries):
+    fp = _catalogFile(directory)
+    try:
+        fp.parent.mkdir(parents=True, exist_ok=True)
+        with open(fp, 'w') as f:
+            json.dump(entries, f)
+    except OSError:
+        # a read only survey just isn't cached
+        pass
+
+
+def sortByCaptureTime(paths, catalog):
+    '''Frames in the order they were taken, those without a time last by name'''
+    def key(fp):
+        captureTime = catalog.get(Path(fp), {}).get('captureTime')
+        return captureTime is None, captureTime or '', Path(fp).name
+
+    return sorted(paths, key=key)
+
+
+def describe(metadata, flightIndex=None):
+    '''One line summary of a frame's metadata, for tool tips'''
+    parts = []
+    if flightIndex is not None:
+        parts.append(f'#{flightIndex + 1}')
+    if metadata.get('captureTime'):
+        parts.append(metadata['captureTime'].replace('T', ' '))
+    if metadata.get('latitude') is not None and metadata.get('longitude') is not None:
+        parts.append(f'{metadata["latitude"]:.5f}, {metadata["longitude"]:.5f}')
+    if metadata.get('altitude') is not None:
+        parts.append(f'{metadata["altitude"]:.0f} m')
+    if metadata.get('make') or metadata.get('model'):
+        parts.append(' '.join(p for p in (metadata.get('make'), metadata.get('model')) if p))
+    if metadata.get('width'):
+        parts.append(f'{metadata["width"]} x {metadata["height"]}')
+    return '  '.join(parts)
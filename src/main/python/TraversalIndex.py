@@ -0,0 +1,105 @@
+'''Flat index of every tile of a transect in the order next/previous visit them.
+
+Within a grid tiles are visited in serpentine order: left to right along
+even rows and right to left along odd ones, so each step is to a
+neighbouring tile. The last tile of a grid is followed by the first of the
+next grid.
+
+Tiles are numbered from 0 across the whole transect. Looking up a tile by
+number or a number by tile is a list or dict access, and so is finding the
+tile above, below or beside one. The index is rebuilt
+lazily after grids are inserted or removed, which is rare next to
+navigating.
+'''
+
+
+def serpentine(rows, cols):
+    '''Yields (row, col) of a rows x cols grid in serpentine order'''
+    for row in range(rows):
+        colRange = range(cols) if row % 2 == 0 else range(cols - 1, -1, -1)
+        for col in colRange:
+            yield row, col
+
+
+class TraversalIndex:
+
+    def __init__(self):
+        # (rows, cols) of each grid, in transect order
+        self._shapes = []
+
+        # built from the shapes when first needed
+        self._tiles = None
+        self._numbers = None
+
+    def insert(self, index, rows, cols):
+        '''Adds a grid of rows x cols tiles at index, shifting the grids after it'''
+        self._shapes.insert(index, (rows, cols))
+        self._invalidate()
+
+    def remove(self, index):
+        del self._shapes[index]
+        self._invalidate()
+
+    def clear(self):
+        self._shapes.clear()
+        self._invalidate()
+
+    def _invalidate(self):
+        self._tiles = None
+        self._numbers = None
+
+    def _build(self):
+        self._tiles = [
+            (index, row, col)
+            for index, (rows, cols) in enumerate(self._shapes)
+            for row, col in serpentine(rows, cols)
+        ]
+        self._numbers = {tile: n for n, tile in enumerate(self._tiles)}
+
+    def __len__(self):
+        if self._tiles is None:
+            self._build()
+        return len(self._tiles)
+
+    def tile(self, n):
+        '''(grid index, row, col) of tile number n'''
+        if self._tiles is None:
+            self._build()
+        return self._tiles[n]
+
+    def number(self, index, row, col):
+        '''The number of a tile, or None if there is no such tile'''
+        if self._numbers is None:
+            self._build()
+        return self._numbers.get((index, row, col))
+
+    def step(self, n, step):
+        '''The number step tiles on from n, or None past either end'''
+        n += step
+        return n if 0 <= n < len(self) else None
+
+    def neighbour(self, n, rowStep, colStep):
+        '''The number of the tile rowStep rows and colStep columns from n, or None.
+
+        Moving off the top or bottom of a grid carries on into the same column
+        of the grid before or after it, moving off its sides goes nowhere.
+        '''
+        index, row, col = self.tile(n)
+        row += rowStep
+        col += colStep
+
+        if row < 0 and index > 0:
+            index -= 1
+            row = self._shapes[index][0] - 1
+        elif row >= self._shapes[index][0] and index < len(self._shapes) - 1:
+            index += 1
+            row = 0
+
+        return self.number(index, row, col)
+
+    def atFraction(self, fraction):
+        '''The number of the tile fraction (0 to 1) of the way through the transect'''
+        if len(self) == 0:
+            return None
+        fraction = min(max(fraction, 0.0), 1.0)
+        return min(int(fraction * len(self)), len(self) - 1)
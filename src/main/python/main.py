@@ -1,19 +1,30 @@
+import StartupTiming
+
 from fbs_runtime.application_context import ApplicationContext
-from PyQt5.QtWidgets import QMainWindow
+from PyQt5.QtCore import QTimer
 
+import multiprocessing
 import sys
 
 from QGameCounter import QGameCounter
 
+StartupTiming.mark('imports')
+
 class AppContext(ApplicationContext):
     def run(self):
-        window = QGameCounter()
-        window.appContext = self
+        StartupTiming.mark('application context')
+        window = QGameCounter(self)
         window.version = self.build_settings['version']
+        StartupTiming.mark('main window built')
         window.show()
+
+        # runs once the event loop has painted the window
+        QTimer.singleShot(0, StartupTiming.firstWindowShown)
         return self.app.exec_()
 
 if __name__ == '__main__':
+    # the decode pool's processes start from the frozen executable too
+    multiprocessing.freeze_support()
     appctxt = AppContext()
     exit_code = appctxt.run()
-    sys.exit(exit_code)
\ No newline at end of file
+    sys.exit(exit_code)
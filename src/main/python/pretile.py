@@ -0,0 +1,93 @@
+'''Pre-cuts every image of a survey into grid tiles and thumbnails.
+
+    python src/main/python/pretile.py SURVEY_DIR --rows 2 --cols 2
+
+Walks SURVEY_DIR and writes each image's tiles into the tile cache the grid
+viewer reads (see TileCache.py), one image per worker process. Images whose
+cache is already current are skipped, so it can be re-run as images arrive.
+Where an inked version exists only that is tiled, as it is what gets opened.
+'''
+
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+from pathlib import Path
+
+import TileCache
+
+imageSuffixes = ('.png', '.jpeg', '.jpg', '.bmp', '.gif')
+
+
+def inkPath(basePath):
+    return basePath.parent / f'{basePath.stem}_Inked{basePath.suffix}'
+
+
+def findImages(directory, recursive=True):
+    '''Yields the images the grid viewer would open, in file name order'''
+    for root, dirs, files in os.walk(str(directory)):
+        dirs[:] = sorted(d for d in dirs if d != TileCache.cacheDirName) if recursive else []
+
+        paths = [Path(root) / name for name in sorted(files)]
+        names = set(files)
+        for fp in paths:
+            if fp.suffix.lower() in imageSuffixes and inkPath(fp).name not in names:
+                yield fp
+
+
+def _initWorker():
+    # image format plugins are found through the application
+    from PyQt5.QtCore import QCoreApplication
+    if QCoreApplication.instance() is None:
+        _initWorker.app = QCoreApplication([])
+
+
+def tileImage(job):
+    imgPath, rows, cols, force = job
+
+    if not force and TileCache.isCached(imgPath, rows, cols):
+        return imgPath, 'cached', 0.0
+
+    t = time.perf_counter()
+    manifest = TileCache.writeTiles(imgPath, rows, cols)
+    status = 'failed' if manifest is None else 'tiled'
+    return imgPath, status, time.perf_counter() - t
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('survey', help='directory of survey images')
+    parser.add_argument('--rows', type=int, default=2)
+    parser.add_argument('--cols', type=int, default=2)
+    parser.add_argument('--jobs', type=int, default=os.cpu_count(), help='worker processes (default: all cores)')
+    parser.add_argument('--force', action='store_true', help='re-tile images that are already cached')
+    parser.add_argument('--no-recursive', dest='recursive', action='store_false', help='only tile the top directory')
+    args = parser.parse_args(argv)
+
+    survey = Path(args.survey)
+    if not survey.is_dir():
+        parser.error(f'{survey} is not a directory')
+
+    jobs = [(fp, args.rows, args.cols, args.force) for fp in findImages(survey, args.recursive)]
+    if not jobs:
+        print(f'No images found in {survey}')
+        return 0
+
+    counts = {'tiled': 0, 'cached': 0, 'failed': 0}
+    start = time.perf_counter()
+
+    with multiprocessing.Pool(max(1, args.jobs), initializer=_initWorker) as pool:
+        for n, (imgPath, status, seconds) in enumerate(pool.imap_unordered(tileImage, jobs), 1):
+            counts[status] += 1
+            print(f'[{n}/{len(jobs)}] {status:<6} {imgPath} ({seconds:.2f}s)')
+
+    print(
+        f'{counts["tiled"]} tiled, {counts["cached"]} already cached, {counts["failed"]} failed '
+        f'in {time.perf_counter() - start:.1f}s with {args.jobs} processes'
+    )
+    return 1 if counts['failed'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
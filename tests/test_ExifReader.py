@@ -0,0 +1,76 @@
+import struct
+
+import ExifReader
+
+
+def tiff(entries, extra=b''):
+    '''Little endian TIFF with one directory of (tag, kind, items, value or offset) entries'''
+    header = b'II*\x00' + struct.pack('<I', 8)
+    directory = struct.pack('<H', len(entries))
+    for tag, kind, items, value in entries:
+        directory += struct.pack('<HHI', tag, kind, items) + value
+    return header + directory + struct.pack('<I', 0) + extra
+
+
+def jpeg(tiffData):
+    exif = b'Exif\x00\x00' + tiffData
+    return b'\xff\xd8' + b'\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif + b'\xff\xda'
+
+
+def read(data):
+    metadata = dict.fromkeys(ExifReader.fields)
+    ExifReader._readJPEG(data, metadata)
+    return metadata
+
+
+def test_reads_camera_make():
+    # the directory is 2 + 12 + 4 bytes from offset 8, so the text starts at 26
+    data = tiff([(ExifReader._make, 2, 6, struct.pack('<I', 26))], b'Canon\x00')
+
+    assert read(jpeg(data))['make'] == 'Canon'
+
+
+def test_value_past_the_end_is_skipped():
+    # two entries, so the text starts at 8 + 2 + 24 + 4
+    data = tiff([
+        (ExifReader._make, 2, 6, struct.pack('<I', 38)),
+        (ExifReader._model, 2, 1000, struct.pack('<I', 38)),
+    ], b'Canon\x00')
+
+    metadata = read(jpeg(data))
+
+    assert metadata['make'] == 'Canon'
+    assert metadata['model'] is None
+
+
+def test_short_numbers_are_not_read_as_text():
+    data = tiff([(ExifReader._dateTime, 3, 2, struct.pack('<HH', 2019, 7))])
+
+    assert read(jpeg(data))['captureTime'] is None
+
+
+def test_truncated_directory_keeps_what_was_read():
+    data = tiff([
+        (ExifReader._make, 2, 4, b'DJI\x00'),
+        (ExifReader._model, 2, 4, b'FC6\x00'),
+    ])
+    # cut the second entry in half
+    data = data[:8 + 2 + 12 + 6]
+
+    metadata = read(jpeg(data))
+
+    assert metadata['make'] == 'DJI'
+    assert metadata['model'] is None
+
+
+def test_garbage_exif_gives_empty_metadata():
+    data = jpeg(b'XX\x00\x00' + bytes(range(40)))
+
+    assert read(data) == dict.fromkeys(ExifReader.fields)
+
+
+def test_damaged_file_header_gives_empty_metadata(tmp_path):
+    fp = tmp_path / 'frame.jpg'
+    fp.write_bytes(jpeg(tiff([(ExifReader._exifPointer, 4, 1, struct.pack('<I', 5000))])))
+
+    assert ExifReader.readMetadata(fp) == dict.fromkeys(ExifReader.fields)
@@ -0,0 +1,17 @@
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from ImageEncoder import pngQuality
+
+
+def qtPngLevel(quality):
+    # qpnghandler.cpp, QPNGImageWriter::writeImage
+    return (100 - min(quality, 100)) * 9 // 91
+
+
+@pytest.mark.parametrize('level', range(10))
+def test_png_quality_round_trips_every_compression_level(level):
+    quality = pngQuality(level)
+    assert 0 <= quality <= 100
+    assert qtPngLevel(quality) == level
@@ -0,0 +1,33 @@
+from PerceptualHash import BKTree, hamming
+
+
+def test_hamming_counts_differing_bits():
+    assert hamming(0b1011, 0b1011) == 0
+    assert hamming(0b1011, 0b0010) == 2
+    assert hamming(0, (1 << 64) - 1) == 64
+
+
+def test_search_finds_hashes_within_distance_closest_first():
+    tree = BKTree()
+    query = 0xF0F0_F0F0_F0F0_F0F0
+    tree.add(query ^ 0b111, 'three')
+    tree.add(query, 'same')
+    tree.add(query ^ 0b1, 'one')
+    tree.add(query ^ 0xFF_FF00, 'sixteen')
+
+    assert tree.search(query, 3) == [(0, 'same'), (1, 'one'), (3, 'three')]
+    assert tree.search(query, 0) == [(0, 'same')]
+    assert [item for _, item in tree.search(query, 16)][-1] == 'sixteen'
+
+
+def test_equal_hashes_share_a_node():
+    tree = BKTree()
+    tree.add(42, 'a.jpg')
+    tree.add(42, 'b.jpg')
+
+    assert len(tree) == 2
+    assert sorted(item for _, item in tree.search(42, 0)) == ['a.jpg', 'b.jpg']
+
+
+def test_empty_tree_finds_nothing():
+    assert BKTree().search(0, 64) == []
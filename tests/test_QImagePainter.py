@@ -0,0 +1,37 @@
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtCore import QSize
+from PyQt5.QtGui import QColor, QImage
+
+from QImagePainter import QImagePainter
+
+
+def filledImage(width, height, color):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(color))
+    return image
+
+
+def test_flatten_is_refused_while_previewing(app):
+    painter = QImagePainter()
+    flattened = []
+    painter.imageFlattened.connect(flattened.append)
+
+    painter.setPreviewImage(filledImage(16, 12, 'red'), QSize(160, 120))
+
+    assert painter.flattenImage() is None
+    assert painter.isPreviewing()
+    assert flattened == []
+
+
+def test_flatten_works_once_the_full_image_is_shown(app):
+    painter = QImagePainter()
+    painter.setPreviewImage(filledImage(16, 12, 'red'), QSize(160, 120))
+    painter.setMainImage(filledImage(160, 120, 'blue'))
+
+    image = painter.flattenImage()
+
+    assert not painter.isPreviewing()
+    assert image.size() == QSize(160, 120)
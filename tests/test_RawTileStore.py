@@ -0,0 +1,52 @@
+import pytest
+
+pytest.importorskip('PyQt5')
+
+from PyQt5.QtGui import QColor, QImage
+
+import RawTileStore
+import TileCache
+
+
+def filledImage(width, height, color):
+    image = QImage(width, height, QImage.Format_RGB32)
+    image.fill(QColor(color))
+    return image
+
+
+@pytest.fixture
+def source(tmp_path):
+    fp = tmp_path / 'frame.jpg'
+    fp.write_bytes(b'original')
+    return fp
+
+
+def test_tiles_round_trip(source):
+    tiles = [[filledImage(8, 6, 'red'), filledImage(8, 6, 'green')]]
+    RawTileStore.TileStore(source.parent).writeTiles(source, tiles, TileCache.fileStamp(source))
+
+    # a fresh store reads what the last one wrote
+    store = RawTileStore.TileStore(source.parent)
+    read = store.readTiles(source, 1, 2)
+
+    assert store.isStored(source, 1, 2)
+    assert [[tile.size() for tile in row] for row in read] == [[tiles[0][0].size(), tiles[0][1].size()]]
+    assert QColor(read[0][0].pixel(3, 2)) == QColor('red')
+    assert QColor(read[0][1].pixel(3, 2)) == QColor('green')
+
+
+def test_other_grid_shape_is_not_read(source):
+    store = RawTileStore.TileStore(source.parent)
+    store.writeTiles(source, [[filledImage(8, 6, 'red')]], TileCache.fileStamp(source))
+
+    assert store.readTiles(source, 2, 2) is None
+
+
+def test_changed_source_invalidates_its_tiles(source):
+    store = RawTileStore.TileStore(source.parent)
+    store.writeTiles(source, [[filledImage(8, 6, 'red')]], TileCache.fileStamp(source))
+
+    source.write_bytes(b'edited in place')
+
+    assert not store.isStored(source, 1, 1)
+    assert store.readTiles(source, 1, 1) is None
@@ -0,0 +1,66 @@
+import os
+import struct
+
+import pytest
+
+pytest.importorskip('PyQt5')
+
+import ExifReader
+import TransectCatalog
+
+
+def jpegTakenAt(captureTime):
+    '''JPEG header with an EXIF DateTime and no pixels'''
+    text = captureTime.encode('ascii') + b'\x00'
+    # the text follows the header, the one entry directory and its next pointer
+    directory = struct.pack('<H', 1) + struct.pack('<HHII', ExifReader._dateTime, 2, len(text), 26)
+    tiff = b'II*\x00' + struct.pack('<I', 8) + directory + struct.pack('<I', 0) + text
+    exif = b'Exif\x00\x00' + tiff
+    return b'\xff\xd8\xff\xe1' + struct.pack('>H', len(exif) + 2) + exif + b'\xff\xda'
+
+
+def test_sort_by_capture_time_puts_untimed_frames_last_by_name(tmp_path):
+    paths = [tmp_path / name for name in ('c.jpg', 'b.jpg', 'a.jpg', 'd.jpg')]
+    catalog = {
+        tmp_path / 'c.jpg': {'captureTime': '2019-07-01T10:00:02'},
+        tmp_path / 'a.jpg': {'captureTime': '2019-07-01T10:00:05'},
+        tmp_path / 'd.jpg': {'captureTime': None},
+    }
+
+    ordered = TransectCatalog.sortByCaptureTime(paths, catalog)
+
+    assert [fp.name for fp in ordered] == ['c.jpg', 'a.jpg', 'b.jpg', 'd.jpg']
+
+
+def test_inked_frame_takes_its_base_frames_capture_time(tmp_path):
+    base = tmp_path / 'DJI_0001.JPG'
+    base.write_bytes(jpegTakenAt('2019:07:01 10:00:02'))
+    # inked frames are saved without EXIF
+    inked = tmp_path / 'DJI_0001_Inked.JPG'
+    inked.write_bytes(b'\xff\xd8\xff\xda')
+
+    catalog = TransectCatalog.readCatalog([inked], jobs=1)
+
+    assert catalog[inked]['captureTime'] == '2019-07-01T10:00:02'
+
+
+def test_damaged_header_gives_empty_metadata(tmp_path):
+    fp = tmp_path / 'frame.jpg'
+    fp.write_bytes(b'\xff\xd8\xff\xe1\x00\x10Exif\x00\x00MM\x00*\xff\xff')
+
+    catalog = TransectCatalog.readCatalog([fp], jobs=1)
+
+    assert catalog[fp] == dict.fromkeys(ExifReader.fields)
+
+
+def test_catalog_is_cached_until_a_frame_changes(tmp_path):
+    fp = tmp_path / 'frame.jpg'
+    fp.write_bytes(jpegTakenAt('2019:07:01 10:00:02'))
+    TransectCatalog.readCatalog([fp], jobs=1)
+
+    fp.write_bytes(jpegTakenAt('2019:07:01 11:30:00'))
+    # same size, so make sure the modification time moves on too
+    stat = fp.stat()
+    os.utime(str(fp), ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+
+    assert TransectCatalog.readCatalog([fp], jobs=1)[fp]['captureTime'] == '2019-07-01T11:30:00'
@@ -0,0 +1,36 @@
+from TraversalIndex import TraversalIndex
+
+
+def transect(*shapes):
+    traversal = TraversalIndex()
+    for index, (rows, cols) in enumerate(shapes):
+        traversal.insert(index, rows, cols)
+    return traversal
+
+
+def neighbour(traversal, tile, rowStep, colStep):
+    n = traversal.neighbour(traversal.number(*tile), rowStep, colStep)
+    return None if n is None else traversal.tile(n)
+
+
+def test_next_is_serpentine_across_grids():
+    traversal = transect((2, 2), (1, 2))
+    assert [traversal.tile(n) for n in range(len(traversal))] == [
+        (0, 0, 0), (0, 0, 1), (0, 1, 1), (0, 1, 0), (1, 0, 0), (1, 0, 1),
+    ]
+
+
+def test_moving_down_and_up_crosses_into_the_same_column_of_the_next_grid():
+    traversal = transect((2, 3), (2, 3))
+    assert neighbour(traversal, (0, 1, 2), 1, 0) == (1, 0, 2)
+    assert neighbour(traversal, (1, 0, 2), -1, 0) == (0, 1, 2)
+
+
+def test_moving_off_the_transect_or_a_grid_side_goes_nowhere():
+    traversal = transect((2, 3), (2, 2))
+    assert neighbour(traversal, (0, 0, 0), -1, 0) is None
+    assert neighbour(traversal, (1, 1, 0), 1, 0) is None
+    assert neighbour(traversal, (0, 0, 2), 0, 1) is None
+    assert neighbour(traversal, (0, 0, 0), 0, -1) is None
+    # the grid below has no third column
+    assert neighbour(traversal, (0, 1, 2), 1, 0) is None